@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+''' Micro-benchmark of ordering inventory lines on the main window:
+sorting the whole inventory on each redraw versus cached InventoryOrder
+(unchanged inventory, single item added/removed, everything changed).
+
+Usage: python3 benchmarks/inventory_order.py [-n NUMBER] [SIZE...]
+'''
+import os, sys
+import copy
+import random
+import timeit
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pygod.windows.main_window import InventoryOrder, item_priority, item_line
+
+def sorted_lines(inventory):
+    ''' Ordering without cache (as it was done before InventoryOrder). '''
+    item_list = sorted(inventory.items(), key=lambda pair: pair[1]['pos'])
+    item_list.sort(key=lambda pair: item_priority(pair[1]), reverse=True)
+    return [item_line(name, item) for name, item in item_list]
+
+def synthetic_inventory(size, rng):
+    inventory = {}
+    for pos in range(size):
+        item = {'pos': pos, 'cnt': rng.choice([1, 1, 1, 2, 5]), 'price': rng.choice([0, 0, 10, 100])}
+        if rng.random() < 0.1:
+            item['type'] = 'heal_potion'
+        if rng.random() < 0.05:
+            item['activate_by_user'] = True
+        inventory['item {0}'.format(pos)] = item
+    return inventory
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of inventory ordering.')
+    parser.add_argument('sizes', nargs='*', type=int, default=[100, 1000, 5000], help='numbers of items')
+    parser.add_argument('-n', '--number', type=int, default=100, help='number of iterations')
+    args = parser.parse_args()
+    rng = random.Random(0)
+    for size in args.sizes:
+        inventory = synthetic_inventory(size, rng)
+        # Each fetch produces new inventory dict, even if it is equal to the previous one.
+        same = copy.deepcopy(inventory)
+        added = dict(inventory, **{'new item': {'pos': size, 'cnt': 1, 'price': 10}})
+        reordered = {name: dict(item, pos=size - item['pos']) for name, item in inventory.items()}
+        order = InventoryOrder()
+        assert order.lines(inventory) == sorted_lines(inventory)
+        assert order.lines(added) == sorted_lines(added)
+        assert order.lines(reordered) == sorted_lines(reordered)
+
+        def alternate(first, second):
+            states = [first, second]
+            def run():
+                states.reverse()
+                order.lines(states[0])
+            return run
+        cases = [
+                ('full sort', lambda: sorted_lines(same)),
+                ('cached, same dict', alternate(inventory, inventory)),
+                ('cached, equal dict', alternate(inventory, same)),
+                ('cached, 1 item added/removed', alternate(inventory, added)),
+                ('cached, all items moved', alternate(inventory, reordered)),
+                ]
+        print('Inventory of {0} items:'.format(size))
+        for title, func in cases:
+            order.lines(inventory)
+            spent = min(timeit.repeat(func, number=args.number, repeat=3))
+            print('  {0:<30} {1:10.1f} us/redraw'.format(title, spent * 1000000 / args.number))
+
+if __name__ == '__main__':
+    main()
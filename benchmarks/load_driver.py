@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+''' Load test of state fetching: end-to-end load_hero_state() calls
+(engine, connection pool, conditional requests, parsing) against a server,
+usually local mock server (benchmarks/mock_server.py).
+
+Each god has its own engine instance (as in monitor) and is fetched by one worker at a time;
+workers fetch gods round-robin until duration is over.
+Reports throughput, latency percentiles and outcomes (changed, not modified, errors by type).
+Requests rejected by circuit breaker (host is considered down or asked to retry later)
+are not sent to the server, so they are counted separately and worker waits until breaker allows requests.
+
+Usage: python3 benchmarks/load_driver.py [--server http://127.0.0.1:8000] [--engine godvillenet] [--gods 1000] [-c 16] [-d 30]
+'''
+import os, sys
+import time
+import queue
+import logging
+import argparse
+import tempfile
+import threading
+import collections
+import urllib.error
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+def percentile(sorted_values, percent):
+    ''' Nearest-rank percentile of already sorted values. '''
+    if not sorted_values:
+        return float('nan')
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def outcome_of(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return 'HTTP {0}'.format(error.code)
+    return type(error).__name__
+
+class LoadDriver:
+    def __init__(self, sessions, concurrency, duration):
+        self.sessions = queue.Queue()
+        for session in sessions:
+            self.sessions.put(session)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.latencies = [] # Seconds, for all fetches that reached the server.
+        self.outcomes = collections.Counter()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def worker(self, deadline):
+        from pygod.pygod import load_hero_state
+        from pygod.engine.resilience import CircuitOpenError
+        while time.monotonic() < deadline:
+            engine, godname, token = self.sessions.get()
+            started = time.perf_counter()
+            try:
+                outcome = 'not modified' if load_hero_state(engine, godname, token) is None else 'changed'
+            except CircuitOpenError as e:
+                self.sessions.put((engine, godname, token))
+                with self._lock:
+                    self.rejected += 1
+                time.sleep(max(0, min(e.retry_in, deadline - time.monotonic())))
+                continue
+            except Exception as e:
+                outcome = outcome_of(e)
+            spent = time.perf_counter() - started
+            self.sessions.put((engine, godname, token))
+            with self._lock:
+                self.latencies.append(spent)
+                self.outcomes[outcome] += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        started = time.monotonic()
+        threads = [threading.Thread(target=self.worker, args=(deadline,), daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - started
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        lines = [
+                'Fetches: {0} in {1:.1f} s, {2:.1f} fetches/s'.format(len(latencies), elapsed, len(latencies) / elapsed),
+                'Latency, ms: p50={0:.1f} p90={1:.1f} p99={2:.1f} p99.9={3:.1f} max={4:.1f}'.format(
+                    *(percentile(latencies, percent) * 1000 for percent in (50, 90, 99, 99.9, 100))),
+                'Outcomes: {0}'.format(', '.join('{0}={1}'.format(name, count) for name, count in self.outcomes.most_common())),
+                'Rejected by circuit breaker: {0}'.format(self.rejected),
+                ]
+        return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of state fetching.')
+    parser.add_argument('--server', default='http://127.0.0.1:8000', help='root URL of the server (default is local mock server)')
+    parser.add_argument('-e', '--engine', default='godvillenet', help='game engine (default is godvillenet)')
+    parser.add_argument('--gods', type=int, default=1000, help='number of gods to fetch (default is 1000)')
+    parser.add_argument('--prefix', default='god', help='prefix of god names, as in mock server (default is "god")')
+    parser.add_argument('--token', help='secret token for Godville API (otherwise public API is used)')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='number of simultaneous fetches (default is 16)')
+    parser.add_argument('-d', '--duration', type=float, default=30, help='duration of the test, seconds (default is 30)')
+    parser.add_argument('--rate', type=float, default=0, help='rate limit of The Tale requests per second (default is 0, no limit)')
+    parser.add_argument('--failure-threshold', type=int, default=0, help='consequent failures that open circuit breaker (default is 0, only Retry-After opens it)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print warnings and errors of engines')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.CRITICAL)
+
+    # The Tale engine stores session cookies, they should not mix with real ones.
+    os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp(prefix='pygod-load-')
+    from pygod import engine as pygod_engine
+    from pygod.engine import http_pool, resilience
+    engine_class = pygod_engine.get_engine(args.engine)
+    if args.engine == 'thetale':
+        from pygod.engine import thetale
+        thetale.API.rate_limiter = resilience.RateLimiter(rate=args.rate or 10**9, capacity=max(1, args.concurrency))
+    http_pool.shared_pool.failure_threshold = args.failure_threshold or 10**9
+
+    sessions = [(engine_class(root=args.server), '{0}{1}'.format(args.prefix, number), args.token) for number in range(args.gods)]
+    driver = LoadDriver(sessions, args.concurrency, args.duration)
+    print('Fetching {0} gods from {1} by {2} workers for {3:.0f} s...'.format(args.gods, args.server, args.concurrency, args.duration), flush=True)
+    elapsed = driver.run()
+    print(driver.report(elapsed))
+    print('Connection pool: {0}'.format(', '.join('{0}={1}'.format(name, value) for name, value in sorted(http_pool.shared_pool.stats.items()))))
+
+if __name__ == '__main__':
+    main()
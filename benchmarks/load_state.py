@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+''' Micro-benchmark of passing hero state from engine to Monitor:
+JSON text round-trip (engine serializes dict, monitor parses it back)
+versus already parsed mapping returned by the engine.
+
+Usage: python3 benchmarks/load_state.py [state.json] [-n NUMBER]
+Without state file uses synthetic state of The Tale engine (with raw API blobs embedded).
+'''
+import os, sys
+import json
+import timeit
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pygod.pygod import parse_hero_state
+
+def synthetic_state():
+    hero_info = {
+            'base' : {'name': 'Hero', 'level': 42, 'health': 500, 'max_health': 700, 'money': 12345},
+            'messages' : [[1500000000 + i, '12:{0:02}'.format(i % 60), 'Message number {0} '.format(i) * 3, 1, []] for i in range(100)],
+            'bag' : {str(i): {'name': 'item {0}'.format(i), 'power': [i, i + 1], 'integrity': [50, 100]} for i in range(30)},
+            'equipment' : {str(i): {'name': 'artifact {0}'.format(i), 'power': [i * 10, i * 11], 'rarity': 2} for i in range(12)},
+            'quests' : {'quests': [{'line': [{'type': 'quest', 'name': 'quest {0}'.format(i), 'actors': [['actor', 1, {}]]} for i in range(5)]}]},
+            }
+    card_info = {'cards': [{'name': 'card {0}'.format(i % 20), 'in_storage': bool(i % 3), 'uid': i} for i in range(200)]}
+    account_info = {'name': 'God', 'clan': {'name': 'Clan', 'abbr': 'CLN'}, 'might': 1234.5, 'places_history': list(range(50))}
+    state = {
+            '_hero_info' : hero_info,
+            '_account_info' : account_info,
+            '_card_info' : card_info,
+            'godname' : 'God',
+            'name' : 'Hero',
+            'level' : 42,
+            'health' : 500,
+            'max_health' : 700,
+            'diary_last' : 'Message number 99',
+            'activatables' : ['card {0} (x3)'.format(i) for i in range(20)],
+            }
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of state loading.')
+    parser.add_argument('state', nargs='?', help='state dump (JSON), default is synthetic The Tale state')
+    parser.add_argument('-n', '--number', type=int, default=2000, help='number of iterations')
+    args = parser.parse_args()
+    if args.state:
+        with open(args.state, 'rb') as f:
+            state = json.loads(f.read())
+    else:
+        state = synthetic_state()
+    raw = json.dumps(state).encode('utf-8')
+
+    cases = [
+            ('dict -> json.dumps -> json.loads', lambda: parse_hero_state(json.dumps(state))),
+            ('bytes -> json.loads', lambda: parse_hero_state(raw)),
+            ('dict -> shallow copy', lambda: parse_hero_state(state)),
+            ]
+    print('State: {0} top-level keys, {1} bytes of JSON'.format(len(state), len(raw)))
+    for title, func in cases:
+        spent = min(timeit.repeat(func, number=args.number, repeat=3))
+        print('{0:<34} {1:10.2f} us/state'.format(title, spent * 1000000 / args.number))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+''' Local stand-in for game servers, for load tests and debugging without real API.
+
+Imitates Godville API (/gods/api/<name>[/<token>] and legacy /gods/api/<name>.json)
+and The Tale API (/game/api/info, account info, cards and third-party authorisation).
+Serves synthetic states for gods named <prefix>0 .. <prefix>N-1 (state is changed every --turn seconds)
+and states recorded with `pygod --dump` (files <god name>.json in --states directory).
+
+Faults are injected into each request: latency (constant plus exponentially distributed tail),
+dropped connections, server errors (500/503), rate limiting (429 with Retry-After)
+and 404 on the new Godville API URL for a fraction of gods (so clients fall back to legacy URL).
+
+Usage: python3 benchmarks/mock_server.py [--port 8000] [--gods 1000] [--latency 50 --jitter 20] [--error-rate 0.01] ...
+Then point pygod to it: pygod --server http://127.0.0.1:8000 god0
+(or use benchmarks/load_driver.py).
+'''
+import os, sys
+import json
+import time
+import zlib
+import random
+import signal
+import socket
+import hashlib
+import argparse
+import threading
+import collections
+import http.server
+import urllib.parse
+
+# Keys that are not available via public Godville API (without token).
+PRIVATE_KEYS = ('health', 'max_health', 'exp_progress', 'distance', 'inventory_num', 'inventory',
+        'quest', 'quest_progress', 'diary_last', 'godpower', 'gold_approx', 'town_name')
+
+def fraction(name, salt):
+    ''' Returns stable pseudo-random number in [0, 1) for the given name. '''
+    return zlib.crc32('{0}:{1}'.format(salt, name).encode('utf-8')) / 2**32
+
+def godville_state(godname, turn):
+    ''' Returns synthetic Godville state of the god at the given game turn. '''
+    rng = random.Random('{0}:{1}'.format(godname, turn))
+    max_health = 100 + zlib.crc32(godname.encode('utf-8')) % 400
+    inventory = {'item {0}'.format(i): {'cnt': rng.randint(1, 3), 'price': rng.randint(0, 100), 'pos': i}
+            for i in range(rng.randint(0, 20))}
+    return {
+            'name' : 'Hero of {0}'.format(godname),
+            'godname' : godname,
+            'gender' : 'male',
+            'level' : 10 + turn // 1000 % 90,
+            'max_health' : max_health,
+            'health' : rng.randint(1, max_health),
+            'inventory_max_num' : 25,
+            'inventory_num' : len(inventory),
+            'inventory' : inventory,
+            'motto' : 'Load test',
+            'clan' : 'Mock',
+            'clan_position' : 'member',
+            'alignment' : 'neutral',
+            'bricks_cnt' : 1000,
+            'wood_cnt' : 100,
+            'temple_completed_at' : '2020-01-01',
+            'pet' : {'pet_name': 'Mock', 'pet_class': 'cat', 'pet_level': 5},
+            'ark_completed_at' : None,
+            'savings_completed_at' : None,
+            'ark_f' : 0,
+            'ark_m' : 0,
+            'arena_won' : 3,
+            'arena_lost' : 1,
+            'savings' : '10',
+            't_level' : None,
+            'shop_name' : None,
+            'boss_name' : None,
+            'boss_power' : None,
+            'quest' : 'mock quest #{0}'.format(turn // 100),
+            'quest_progress' : turn % 100,
+            'exp_progress' : turn // 10 % 100,
+            'godpower' : rng.randint(0, 100),
+            'gold_approx' : 'about {0}'.format(rng.randint(1, 10) * 100),
+            'diary_last' : 'Turn {0}: {1} met a mock monster number {2}.'.format(turn, godname, rng.randint(1, 1000)),
+            'town_name' : '',
+            'distance' : turn % 50,
+            'arena_fight' : False,
+            }
+
+def tale_hero(godname, turn):
+    ''' Returns synthetic hero info of The Tale API at the given game turn. '''
+    rng = random.Random('{0}:{1}'.format(godname, turn))
+    max_health = 500 + zlib.crc32(godname.encode('utf-8')) % 1000
+    return {
+            'base' : {
+                'name' : 'Hero of {0}'.format(godname),
+                'gender' : 0,
+                'level' : 10 + turn // 1000 % 90,
+                'health' : rng.randint(1, max_health),
+                'max_health' : max_health,
+                'experience' : turn % 100,
+                'experience_to_level' : 100,
+                'money' : rng.randint(0, 10000),
+                },
+            'secondary' : {'max_bag_size' : 12},
+            'habits' : {
+                'honor' : {'verbose' : 'honest'},
+                'peacefulness' : {'verbose' : 'peaceful'},
+                },
+            'companion' : {'name' : 'mock', 'experience' : 10},
+            'quests' : {'quests' : [
+                {'line' : [{'type' : 'quest', 'name' : 'mock quest #{0}'.format(turn // 100)}] * 4},
+                ]},
+            'messages' : [[time.time(), '', 'Turn {0}: {1} met a mock monster number {2}.'.format(turn, godname, rng.randint(1, 1000))]],
+            'action' : {'type' : 0, 'data' : None, 'description' : 'fighting'},
+            'bag' : {str(i): {'name' : 'item {0}'.format(i)} for i in range(rng.randint(0, 12))},
+            }
+
+class MockGame:
+    ''' States of all gods and fault injection settings. '''
+    def __init__(self, args):
+        self.args = args
+        self.recorded = {}
+        if args.states:
+            for filename in sorted(os.listdir(args.states)):
+                if filename.endswith('.json'):
+                    with open(os.path.join(args.states, filename), 'rb') as f:
+                        self.recorded[filename[:-len('.json')]] = f.read()
+        self.gods = list(self.recorded) + ['{0}{1}'.format(args.prefix, number) for number in range(args.gods)]
+        self.known_gods = set(self.gods)
+        self.accounts = {} # sessionid: account id (1-based index of god)
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def turn(self):
+        return int(time.time() / self.args.turn)
+
+    def godville_body(self, godname, public=False):
+        ''' Returns pair (body, etag) or None if god is unknown. '''
+        if godname not in self.known_gods:
+            return None
+        if godname in self.recorded:
+            body = self.recorded[godname]
+            if public:
+                state = json.loads(body)
+                body = json.dumps({key: value for key, value in state.items() if key not in PRIVATE_KEYS}).encode('utf-8')
+        else:
+            state = godville_state(godname, self.turn())
+            if public:
+                state = {key: value for key, value in state.items() if key not in PRIVATE_KEYS}
+            body = json.dumps(state, ensure_ascii=False).encode('utf-8')
+        return body, '"{0}"'.format(hashlib.sha1(body).hexdigest())
+
+    def account(self, sessionid):
+        ''' Returns pair (account id, new sessionid or None). '''
+        with self._lock:
+            if sessionid in self.accounts:
+                return self.accounts[sessionid], None
+            sessionid = os.urandom(16).hex()
+            self.accounts[sessionid] = len(self.accounts) % len(self.gods) + 1
+            return self.accounts[sessionid], sessionid
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockGame/1.0'
+
+    @property
+    def game(self):
+        return self.server.game
+
+    def setup(self):
+        super(MockHandler, self).setup()
+        # Headers and body are written separately, Nagle's algorithm would delay the body.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        if self.game.args.verbose:
+            super(MockHandler, self).log_message(format, *args)
+
+    def send_body(self, code, body, content_type='application/json', headers=()):
+        self.game.count(code)
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, headers=()):
+        self.send_body(200, json.dumps({'status' : 'ok', 'data' : data}, ensure_ascii=False).encode('utf-8'), headers=headers)
+
+    def send_not_found(self):
+        self.send_body(404, json.dumps({'status' : 'error', 'code' : 'not_found', 'error' : 'Not found'}).encode('utf-8'))
+
+    def inject_faults(self):
+        ''' Returns True if request was already answered with a fault. '''
+        args = self.game.args
+        delay = args.latency / 1000.0
+        if args.jitter:
+            delay += random.expovariate(1000.0 / args.jitter)
+        if delay:
+            time.sleep(delay)
+        roll = random.random()
+        if roll < args.drop_rate:
+            self.game.count('dropped')
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return True
+        roll -= args.drop_rate
+        if roll < args.error_rate:
+            self.send_body(random.choice((500, 503)), b'Server error', content_type='text/plain')
+            return True
+        roll -= args.error_rate
+        if roll < args.throttle_rate:
+            self.send_body(429, b'Too many requests', content_type='text/plain',
+                    headers=[('Retry-After', str(args.retry_after))])
+            return True
+        return False
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.handle_request()
+
+    def handle_request(self):
+        if self.inject_faults():
+            return
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.rstrip('/')
+        query = urllib.parse.parse_qs(url.query)
+        if path.startswith('/gods/api/'):
+            self.handle_godville(path[len('/gods/api/'):])
+        elif path == '/accounts/third-party/tokens/api/authorisation-state':
+            account_id, sessionid = self.tale_account()
+            self.send_json({'account_id' : account_id, 'state' : 2, 'session_expire_at' : time.time() + 3600},
+                    headers=[('Set-Cookie', 'sessionid={0}; Path=/'.format(sessionid))] if sessionid else ())
+        elif path == '/accounts/third-party/tokens/api/request-authorisation':
+            self.send_json({'authorisation_page' : '/accounts/third-party/tokens/{0}'.format(os.urandom(8).hex())})
+        elif path == '/game/api/info':
+            account_id = int(query.get('account', [self.tale_account()[0]])[0])
+            godname = self.game.gods[(account_id - 1) % len(self.game.gods)]
+            turn = self.game.turn()
+            self.send_json({
+                'mode' : 'pve',
+                'turn' : {'number' : turn, 'verbose_date' : '', 'verbose_time' : ''},
+                'game_state' : 1,
+                'account' : {'id' : account_id, 'is_own' : True, 'hero' : tale_hero(godname, turn)},
+                'enemy' : None,
+                })
+        elif path.startswith('/accounts/') and path.endswith('/api/show'):
+            try:
+                account_id = int(path.split('/')[2])
+            except ValueError:
+                return self.send_not_found()
+            self.send_json({
+                'id' : account_id,
+                'name' : self.game.gods[(account_id - 1) % len(self.game.gods)],
+                'clan' : {'id' : 1, 'abbr' : 'MCK', 'name' : 'Mock'},
+                })
+        elif path == '/game/cards/api/get-cards':
+            self.send_json({'cards' : [{'name' : 'card {0}'.format(i % 5), 'in_storage' : i % 3 == 0, 'uid' : i} for i in range(10)]})
+        else:
+            self.send_not_found()
+
+    def tale_account(self):
+        sessionid = None
+        for cookie in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == 'sessionid' and value and value != 'None':
+                sessionid = value
+        return self.game.account(sessionid)
+
+    def handle_godville(self, path):
+        legacy = path.endswith('.json')
+        if legacy:
+            godname, token = path[:-len('.json')], None
+        else:
+            godname, _, token = path.partition('/')
+        godname = urllib.parse.unquote_plus(godname)
+        if not legacy and fraction(godname, 'legacy') < self.game.args.legacy_fraction:
+            return self.send_not_found() # Only old API is available for this god.
+        result = self.game.godville_body(godname, public=not token and not legacy)
+        if result is None:
+            return self.send_not_found()
+        body, etag = result
+        if self.headers.get('If-None-Match') == etag:
+            self.game.count(304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(200, body, headers=[('ETag', etag)])
+
+class MockServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, game):
+        self.game = game
+        super(MockServer, self).__init__(address, MockHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock game server with fault injection.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen at (default is 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen at (default is 8000)')
+    parser.add_argument('--gods', type=int, default=1000, help='number of gods with synthetic states (default is 1000)')
+    parser.add_argument('--prefix', default='god', help='prefix of synthetic god names (default is "god": god0, god1...)')
+    parser.add_argument('--states', help='directory with recorded states (<god name>.json, e.g. from pygod --dump)')
+    parser.add_argument('--turn', type=float, default=10, help='synthetic states are changed every TURN seconds (default is 10)')
+    parser.add_argument('--latency', type=float, default=0, help='constant delay of each response, ms')
+    parser.add_argument('--jitter', type=float, default=0, help='mean of additional exponentially distributed delay, ms (gives long tail)')
+    parser.add_argument('--drop-rate', type=float, default=0, help='fraction of connections that are closed without response')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests that fail with 500 or 503')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='fraction of requests that fail with 429')
+    parser.add_argument('--retry-after', type=int, default=5, help='Retry-After of 429 responses, seconds (default is 5)')
+    parser.add_argument('--legacy-fraction', type=float, default=0, help='fraction of gods for which new API URL returns 404 and legacy .json URL should be used')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log each request')
+    args = parser.parse_args()
+
+    game = MockGame(args)
+    server = MockServer((args.host, args.port), game)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('Serving {0} gods at http://{1}:{2}'.format(len(game.gods), args.host, server.server_port), flush=True)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        print('Responses: {0}'.format(', '.join('{0}={1}'.format(name, count) for name, count in sorted(game.stats.items(), key=str))))
+
+if __name__ == '__main__':
+    main()
@@ -2,4 +2,5 @@ from .core import Colors
 from .core import WarningWindow
 from .core import utils
 from .windows import MainWindow
+from .windows import SummaryWindow
 from .status_processing import Rule
@@ -1,5 +1,17 @@
 from .warning_window import WarningWindow
 from .monitor_window import MonitorWindowBase
+from .compositor import Compositor
+from .compositor import default_compositor
+from .wrap_cache import default_wrap_cache
+from .metrics import default_metrics
+from .trace import default_tracer
 
 from .text_entry import TextEntry
 from .text_entry import Colors
+from .history import StateHistory
+from .events import Events
+from .events import StateDiff
+from .events import EventStream
+from .scheduler import PollingScheduler
+from .notifier import NotificationDispatcher
+from .diary import Diary
@@ -0,0 +1,53 @@
+import curses
+
+class CursesBackend:
+    ''' Module-level curses functions used by windows. '''
+    def newwin(self, height, width, y, x):
+        return curses.newwin(height, width, y, x)
+
+    def color_pair(self, color):
+        return curses.color_pair(color)
+
+    def doupdate(self):
+        curses.doupdate()
+
+class NullWindow:
+    '''
+    Window that accepts all drawing calls but renders nothing.
+    Used to run windows without terminal (replays, benchmarks).
+    '''
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def subwin(self, height, width, y, x):
+        return NullWindow(height, width)
+
+    def getkey(self):
+        raise curses.error('no input')
+
+    def _ignore(self, *args):
+        pass
+
+    box = erase = clear = addstr = addnstr = bkgd = _ignore
+    refresh = noutrefresh = touchwin = untouchwin = nodelay = _ignore
+
+class NullBackend:
+    ''' Backend for headless mode: no terminal output at all. '''
+    def newwin(self, height, width, y, x):
+        return NullWindow(height, width)
+
+    def color_pair(self, color):
+        return 0
+
+    def doupdate(self):
+        pass
+
+current = CursesBackend()
+
+def use_null_backend():
+    global current
+    current = NullBackend()
@@ -0,0 +1,62 @@
+import time
+from . import backend
+from .trace import default_tracer as tracer
+
+class Compositor:
+    '''
+    Collects changes of all windows and flushes them to the terminal
+    with a single doupdate() per frame.
+
+    Windows stage their content via stage() (which calls noutrefresh()),
+    main loop calls present() to produce frame.
+    Frames are limited by max_fps: if previous frame was too recent,
+    staged changes are kept until next_frame_time().
+    '''
+    def __init__(self, max_fps=10):
+        self.max_fps = max_fps
+        self.frames = 0
+        self.windows_staged = 0
+        # Size of text written by windows. Actual terminal output may be smaller,
+        # as curses sends only cells that differ from what is already on the screen.
+        self.bytes_staged = 0
+        self._pending = False
+        self._last_frame_time = None
+
+    def stage(self, window, written_bytes=0):
+        window.noutrefresh()
+        self._pending = True
+        self.windows_staged += 1
+        self.bytes_staged += written_bytes
+
+    def _frame_interval(self):
+        return 1.0 / self.max_fps if self.max_fps > 0 else 0
+
+    def next_frame_time(self):
+        ''' Returns monotonic time when pending frame should be presented,
+        or None if there is nothing to present.
+        '''
+        if not self._pending:
+            return None
+        if self._last_frame_time is None:
+            return 0
+        return self._last_frame_time + self._frame_interval()
+
+    def present(self, force=False):
+        ''' Flushes staged changes to the terminal if frame budget allows it.
+        Returns True if frame was presented.
+        '''
+        if not self._pending:
+            return False
+        now = time.monotonic()
+        if not force and now < self.next_frame_time():
+            return False
+        backend.current.doupdate()
+        self._pending = False
+        self._last_frame_time = now
+        self.frames += 1
+        if tracer.enabled:
+            tracer.record('frame', self.frames, self.windows_staged, self.bytes_staged)
+        return True
+
+# Compositor shared by all windows.
+default_compositor = Compositor()
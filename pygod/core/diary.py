@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import contextlib
+import collections
+import urllib.parse
+try:
+    import fcntl
+except ImportError: # Not available on Windows.
+    fcntl = None
+
+WORD = re.compile(r'\w+')
+
+def words(text):
+    ''' Returns set of lowercase words of the text (used for indexing and search). '''
+    return set(WORD.findall(text.lower()))
+
+class Diary:
+    '''
+    Ring buffer of the latest diary entries of the hero (up to size entries, from MIN_SIZE to MAX_SIZE).
+
+    If filename is specified, diary is loaded from the file at start
+    and each new entry is appended to it as a line of JSON: [timestamp, text].
+    File is compacted (rewritten with only the latest size entries)
+    when it grows twice as large as the buffer.
+
+    Several processes could write the same diary (e.g. two monitors of the same god):
+    writes and compaction are done under lock of filename + '.lock',
+    and file is reopened if it was compacted (replaced) by another process.
+
+    Entries are indexed by words (inverted index), so search does not scan the whole diary;
+    indexed words are also kept sorted, so words that start with the incomplete word are found by bisect.
+    '''
+    MIN_SIZE, MAX_SIZE = 10, 100000
+
+    def __init__(self, filename=None, size=1000):
+        self.filename = filename
+        self.lockfile = filename + '.lock' if filename else None
+        self.size = min(max(size, self.MIN_SIZE), self.MAX_SIZE)
+        # Entries (timestamp, text) are numbered sequentially, entry number N is at _entries[N - _base].
+        # Dropped entries are removed from the head of the list in batches.
+        self._entries = []
+        self._base = 0
+        self._start = 0 # Position of the oldest entry in the list.
+        self._index = collections.defaultdict(set) # word: set of entry numbers
+        self._words = [] # Sorted indexed words.
+        self._file = None
+        self._file_lines = 0
+        if filename:
+            with self._file_lock():
+                self._load()
+                self._file = open(self.filename, 'a', encoding='utf-8')
+
+    @classmethod
+    def for_god(cls, root_dir, engine_id, godname, **kwargs):
+        ''' Creates diary in the standard location: <root_dir>/diary/<engine>/<godname>. '''
+        diary_dir = os.path.join(root_dir, 'diary', engine_id)
+        os.makedirs(diary_dir, exist_ok=True)
+        return cls(os.path.join(diary_dir, urllib.parse.quote(godname, safe='')), **kwargs)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self._entries) - self._start
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lockfile, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        corrupted = 0
+        with open(self.filename, encoding='utf-8') as f:
+            for line in f:
+                self._file_lines += 1
+                try:
+                    timestamp, text = json.loads(line)
+                except ValueError:
+                    # Usually the last line that was not written completely.
+                    corrupted += 1
+                    continue
+                self._add(timestamp, text)
+        if corrupted:
+            logging.warning('%s: skipped %s corrupted lines of diary %s',
+                            self._load.__name__,
+                            corrupted, self.filename)
+        if corrupted or self._file_lines >= 2 * self.size:
+            self._compact()
+
+    def _add(self, timestamp, text):
+        number = self._base + len(self._entries)
+        self._entries.append((timestamp, text))
+        for word in words(text):
+            if word not in self._index:
+                bisect.insort(self._words, word)
+            self._index[word].add(number)
+        while len(self) > self.size:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        number = self._base + self._start
+        _, text = self._entries[self._start]
+        self._entries[self._start] = None
+        self._start += 1
+        for word in words(text):
+            numbers = self._index[word]
+            numbers.discard(number)
+            if not numbers:
+                del self._index[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+        if self._start >= self.size:
+            del self._entries[:self._start]
+            self._base += self._start
+            self._start = 0
+
+    @staticmethod
+    def _is_valid(line):
+        try:
+            timestamp, text = json.loads(line)
+        except ValueError:
+            return False
+        return line.endswith('\n')
+
+    def _compact(self):
+        # Keeps the latest lines of the file rather than entries in memory:
+        # file could have entries appended by another process.
+        with open(self.filename, encoding='utf-8') as f:
+            lines = collections.deque((line for line in f if self._is_valid(line)), maxlen=self.size)
+        tmpname = self.filename + '.tmp'
+        with open(tmpname, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmpname, self.filename)
+        if self._file is not None:
+            self._file = open(self.filename, 'a', encoding='utf-8')
+        self._file_lines = len(lines)
+
+    def _reopen_if_replaced(self):
+        ''' File could be compacted by another process, then entries should go to the new file. '''
+        try:
+            replaced = os.stat(self.filename).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            self._file.close()
+            self._file = open(self.filename, 'a', encoding='utf-8')
+            self._file_lines = len(self)
+
+    def append(self, text, timestamp=None):
+        ''' Adds new entry. Returns False if it repeats the last one and was skipped. '''
+        if len(self) and self._entries[-1][1] == text:
+            return False
+        timestamp = timestamp or time.time()
+        self._add(timestamp, text)
+        if self._file is not None:
+            try:
+                with self._file_lock():
+                    self._reopen_if_replaced()
+                    self._file.write(json.dumps([timestamp, text], ensure_ascii=False) + '\n')
+                    self._file.flush()
+                    self._file_lines += 1
+                    if self._file_lines >= 2 * self.size:
+                        self._compact()
+            except OSError as e:
+                logging.error('%s: failed to write diary %s: %s',
+                              self.append.__name__,
+                              self.filename, str(e))
+        return True
+
+    def _entry(self, number):
+        return self._entries[number - self._base]
+
+    def latest(self, count=None):
+        ''' Returns list of the latest entries (timestamp, text), the most recent first. '''
+        first = self._start if count is None else max(self._start, len(self._entries) - count)
+        return self._entries[:first - 1 if first else None:-1]
+
+    def search(self, query, limit=None):
+        ''' Returns list of entries (timestamp, text) that contain all words of the query
+        (last word of the query could be incomplete), the most recent first.
+        '''
+        query = WORD.findall(query.lower())
+        if not query:
+            return self.latest(limit)
+        matches = None
+        for position, word in enumerate(query):
+            if position == len(query) - 1:
+                found = set()
+                for pos in range(bisect.bisect_left(self._words, word), len(self._words)):
+                    if not self._words[pos].startswith(word):
+                        break
+                    found |= self._index[self._words[pos]]
+            else:
+                found = self._index.get(word, set())
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        numbers = sorted(matches, reverse=True)
+        if limit is not None:
+            numbers = numbers[:limit]
+        return [self._entry(number) for number in numbers]
@@ -0,0 +1,181 @@
+import logging
+import collections
+import collections.abc
+
+class Events:
+    ''' Kinds of events produced by StateDiff. '''
+    CHANGED         = 'changed' # Any top-level key of the state; old and new are values of the key.
+    LEVEL_UP        = 'level_up'
+    DEATH           = 'death'
+    QUEST_COMPLETED = 'quest_completed'
+    ITEM_ADDED      = 'item_added'
+    ITEM_REMOVED    = 'item_removed'
+    ARENA_ENTERED   = 'arena_entered'
+    DIARY_ENTRY     = 'diary_entry'
+
+StateEvent = collections.namedtuple('StateEvent', 'kind path old new')
+
+class TrackingState(collections.abc.Mapping):
+    '''
+    Read-only view of state dictionary that records which keys were read.
+    Any iteration over the whole state marks all keys as read.
+    '''
+    def __init__(self, state):
+        self._state = state
+        self.keys_read = set()
+        self.read_all = False
+
+    def __getitem__(self, key):
+        self.keys_read.add(key)
+        return self._state[key]
+
+    def __contains__(self, key):
+        self.keys_read.add(key)
+        return key in self._state
+
+    def get(self, key, default=None):
+        self.keys_read.add(key)
+        return self._state.get(key, default)
+
+    def __iter__(self):
+        self.read_all = True
+        return iter(self._state)
+
+    def __len__(self):
+        self.read_all = True
+        return len(self._state)
+
+    def dependencies(self):
+        ''' Returns set of keys that were read or None if the whole state was read. '''
+        return None if self.read_all else self.keys_read
+
+def diff_paths(old_value, new_value, path=()):
+    ''' Yields paths (tuples of keys) of all values that differ in two nested dicts.
+    Lists and other values are compared as a whole.
+    '''
+    missing = object()
+    for key, value in new_value.items():
+        old = old_value.get(key, missing)
+        if old is value:
+            continue
+        if isinstance(old, dict) and isinstance(value, dict):
+            yield from diff_paths(old, value, path + (key,))
+        elif old != value:
+            yield path + (key,)
+    for key in old_value:
+        if key not in new_value:
+            yield path + (key,)
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+def _level_up(old_state, new_state):
+    old_level, new_level = _number(old_state.get('level')), _number(new_state.get('level'))
+    if old_level is not None and new_level is not None and new_level > old_level:
+        yield StateEvent(Events.LEVEL_UP, ('level',), old_level, new_level)
+
+def _death(old_state, new_state):
+    old_health, new_health = _number(old_state.get('health')), _number(new_state.get('health'))
+    if old_health and new_health == 0:
+        yield StateEvent(Events.DEATH, ('health',), old_health, new_health)
+
+def _quest_completed(old_state, new_state):
+    # Hero takes the next quest right after the previous one is completed.
+    old_quest, new_quest = old_state.get('quest'), new_state.get('quest')
+    if old_quest and new_quest and old_quest != new_quest:
+        yield StateEvent(Events.QUEST_COMPLETED, ('quest',), old_quest, new_quest)
+
+def _item_names(state):
+    # New api replaced inventory with 'activatables' list.
+    if 'activatables' in state:
+        return 'activatables', set(state['activatables'])
+    inventory = state.get('inventory')
+    return 'inventory', set(inventory) if isinstance(inventory, dict) else set()
+
+def _inventory_changes(old_state, new_state):
+    key, old_items = _item_names(old_state)
+    new_key, new_items = _item_names(new_state)
+    if key != new_key:
+        return
+    for item in sorted(new_items - old_items):
+        yield StateEvent(Events.ITEM_ADDED, (key, item), None, item)
+    for item in sorted(old_items - new_items):
+        yield StateEvent(Events.ITEM_REMOVED, (key, item), item, None)
+
+def _arena_entered(old_state, new_state):
+    if not old_state.get('arena_fight') and new_state.get('arena_fight'):
+        yield StateEvent(Events.ARENA_ENTERED, ('arena_fight',), None, new_state.get('fight_type'))
+
+# Detectors of high-level events: functions (old_state, new_state) yielding StateEvents.
+# Called only when some keys are changed.
+EVENT_DETECTORS = [
+        _level_up,
+        _death,
+        _quest_completed,
+        _inventory_changes,
+        _arena_entered,
+        ]
+
+class StateDiff:
+    '''
+    Difference between two consequent states of the hero,
+    computed once per fetch and shared by all consumers.
+
+    paths        - list of changed key paths (tuples);
+    changed_keys - set of changed top-level keys or None for the first state
+                   (which means that everything should be considered changed);
+    events       - list of StateEvents: CHANGED for each changed top-level key
+                   followed by high-level events.
+    '''
+    def __init__(self, old_state, new_state):
+        self.old = old_state
+        self.new = new_state
+        self.events = []
+        if old_state is None:
+            self.paths = [(key,) for key in new_state]
+            self.changed_keys = None
+            if new_state.get('diary_last'):
+                self.events.append(StateEvent(Events.DIARY_ENTRY, ('diary_last',), None, new_state['diary_last']))
+            return
+        self.paths = [] if old_state is new_state else list(diff_paths(old_state, new_state))
+        self.changed_keys = {path[0] for path in self.paths}
+        if not self.paths:
+            return
+        for key in sorted(self.changed_keys, key=str):
+            self.events.append(StateEvent(Events.CHANGED, (key,), old_state.get(key), new_state.get(key)))
+        for detector in EVENT_DETECTORS:
+            self.events.extend(detector(old_state, new_state))
+        if 'diary_last' in self.changed_keys and new_state.get('diary_last'):
+            self.events.append(StateEvent(Events.DIARY_ENTRY, ('diary_last',), old_state.get('diary_last'), new_state['diary_last']))
+
+    def __bool__(self):
+        return bool(self.paths)
+
+    def add_change(self, key, old_value, new_value):
+        ''' Registers change that happened in place (so it could not be detected by comparison). '''
+        self.paths.append((key,))
+        if self.changed_keys is not None:
+            self.changed_keys.add(key)
+        self.events.append(StateEvent(Events.CHANGED, (key,), old_value, new_value))
+
+class EventStream:
+    '''
+    Dispatches events of state diffs to subscribers.
+    Subscriber is a callable (source, event), where source is an object that owns the state (e.g. god session).
+    Subscribers for kind None receive all events.
+    '''
+    def __init__(self):
+        self._subscribers = collections.defaultdict(list)
+
+    def subscribe(self, kind, callback):
+        self._subscribers[kind].append(callback)
+
+    def publish(self, source, diff):
+        for event in diff.events:
+            for callback in self._subscribers.get(event.kind, []) + self._subscribers.get(None, []):
+                try:
+                    callback(source, event)
+                except Exception as e:
+                    logging.exception('%s: exception in subscriber for %s: %s',
+                                      self.publish.__name__,
+                                      event.kind, str(e))
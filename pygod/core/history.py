@@ -0,0 +1,271 @@
+import os
+import copy
+import json
+import mmap
+import time
+import struct
+import logging
+import contextlib
+import urllib.parse
+try:
+    import fcntl
+except ImportError: # Not available on Windows.
+    fcntl = None
+
+def make_delta(old_state, new_state):
+    ''' Returns difference between top-level keys of two states:
+    {'set': {key: new_value}, 'del': [removed_key, ...]}
+    or None if states are equal.
+    '''
+    changed = {key: value for key, value in new_state.items() if key not in old_state or old_state[key] != value}
+    removed = [key for key in old_state if key not in new_state]
+    if not changed and not removed:
+        return None
+    return {'set': changed, 'del': removed}
+
+def without_raw_data(state):
+    ''' Returns copy of the state without raw data of engines (keys that start with '_',
+    e.g. The Tale's '_hero_info'): its fields are already in the state
+    and it would be put into every delta as a whole.
+    '''
+    return {key: value for key, value in state.items() if not key.startswith('_')}
+
+def apply_delta(state, delta):
+    ''' Applies delta produced by make_delta() to the state in place. '''
+    state.update(delta['set'])
+    for key in delta['del']:
+        state.pop(key, None)
+    return state
+
+class StateHistory:
+    '''
+    Append-only on-disk history of hero states.
+
+    Data file contains records: header (kind, timestamp, payload size) and JSON payload.
+    Each record is either full snapshot of a state or delta from the previous one;
+    full snapshot is written every snapshot_interval records,
+    so any state could be restored by reading at most snapshot_interval records.
+
+    Index file contains fixed-size entries (timestamp, record offset, snapshot record number)
+    for each record, so record for any moment is found by binary search.
+    Both files are read via mmap.
+
+    History opened as read-only could be safely read while another process appends to it:
+    index entry is written only after its record is complete.
+    Several processes could append to the same history (e.g. two monitors of the same god):
+    each append and recovery is done under exclusive lock of the data file.
+    '''
+    FULL, DELTA = b'F', b'D'
+    RECORD_HEADER = struct.Struct('<cdI') # kind, timestamp, payload size
+    INDEX_ENTRY = struct.Struct('<dQQ') # timestamp, record offset, number of snapshot record
+
+    def __init__(self, filename, snapshot_interval=100, readonly=False):
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.readonly = readonly
+        self._maps = {}
+        self._last_state = None
+        self._last_snapshot = None
+        self._records = 0 # Number of records this instance knows about.
+        if readonly:
+            return
+        self._data = open(self.filename, 'ab')
+        with self._file_lock():
+            self._recover()
+            self._index = open(self.index_filename, 'ab')
+            self._sync()
+
+    @classmethod
+    def for_god(cls, root_dir, engine_id, godname, **kwargs):
+        ''' Creates history in the standard location: <root_dir>/history/<engine>/<godname>. '''
+        history_dir = os.path.join(root_dir, 'history', engine_id)
+        os.makedirs(history_dir, exist_ok=True)
+        return cls(os.path.join(history_dir, urllib.parse.quote(godname, safe='')), **kwargs)
+
+    def close(self):
+        for size, mapped in self._maps.values():
+            if size:
+                mapped.close()
+        self._maps = {}
+        if not self.readonly:
+            self._data.close()
+            self._index.close()
+
+    def __len__(self):
+        if not os.path.exists(self.index_filename):
+            return 0
+        return os.path.getsize(self.index_filename) // self.INDEX_ENTRY.size
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._data, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._data, fcntl.LOCK_UN)
+
+    def _sync(self):
+        ''' Re-reads the last state if history was appended by another process. '''
+        records = len(self)
+        if records == self._records:
+            return
+        self._records = records
+        self._last_state, self._last_snapshot = None, None
+        if records:
+            self._last_snapshot = self._index_entry(records - 1)[2]
+            self._last_state = self.state_at_record(records - 1)
+
+    def _read_index(self, f):
+        ''' Yields index entries from the file, reading it by chunks. '''
+        entry_size = self.INDEX_ENTRY.size
+        for chunk in iter(lambda: f.read(entry_size * 4096), b''):
+            yield from self.INDEX_ENTRY.iter_unpack(chunk[:len(chunk) - len(chunk) % entry_size])
+
+    def _recover(self):
+        ''' Brings data and index files in sync after possible crash:
+        drops incomplete tail record and index entries for missing records,
+        indexes records that were written to data file but not to the index.
+        '''
+        data_size = os.fstat(self._data.fileno()).st_size
+        entry_size = self.INDEX_ENTRY.size
+        valid, last_entry = 0, None # Index entries that point inside of data file.
+        with open(self.index_filename, 'a+b') as f:
+            index_size = f.tell()
+            f.seek(0)
+            for entry in self._read_index(f):
+                if entry[1] >= data_size:
+                    break
+                valid, last_entry = valid + 1, entry
+        # Last indexed record is re-checked too, as it could be written partially.
+        kept = max(0, valid - 1)
+        offset, snapshot = (last_entry[1], last_entry[2]) if last_entry else (0, 0)
+        entries = []
+        with open(self.filename, 'rb') as f:
+            while offset + self.RECORD_HEADER.size <= data_size:
+                f.seek(offset)
+                kind, timestamp, size = self.RECORD_HEADER.unpack(f.read(self.RECORD_HEADER.size))
+                if offset + self.RECORD_HEADER.size + size > data_size:
+                    break
+                if kind == self.FULL:
+                    snapshot = kept + len(entries)
+                entries.append((timestamp, offset, snapshot))
+                offset += self.RECORD_HEADER.size + size
+        if offset != data_size or (kept + len(entries)) * entry_size != index_size:
+            logging.warning('History %s was not closed properly, recovered %s records',
+                            self.filename, kept + len(entries))
+            self._data.truncate(offset)
+            with open(self.index_filename, 'r+b') as f:
+                f.truncate(kept * entry_size)
+                f.seek(0, os.SEEK_END)
+                f.write(b''.join(self.INDEX_ENTRY.pack(*entry) for entry in entries))
+
+    def append(self, state, timestamp=None):
+        ''' Appends new state to the history.
+        Raw data of engines is not recorded (see without_raw_data()).
+        Returns False if state is the same as the last one and nothing was written.
+        '''
+        state = without_raw_data(state)
+        timestamp = timestamp or time.time()
+        with self._file_lock():
+            # Deltas are made against the actual last record, even if it was written by another process.
+            self._sync()
+            record_number = self._records
+            if self._last_state is None or record_number - self._last_snapshot >= self.snapshot_interval:
+                kind, payload = self.FULL, state
+                snapshot = record_number
+            else:
+                payload = make_delta(self._last_state, state)
+                if payload is None:
+                    return False
+                kind, snapshot = self.DELTA, self._last_snapshot
+            payload = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            offset = os.fstat(self._data.fileno()).st_size
+            self._data.write(self.RECORD_HEADER.pack(kind, timestamp, len(payload)) + payload)
+            self._data.flush()
+            self._index.write(self.INDEX_ENTRY.pack(timestamp, offset, snapshot))
+            self._index.flush()
+            self._records = record_number + 1
+            self._last_snapshot = snapshot
+            # Private copy, so later changes in the original state do not affect deltas.
+            self._last_state = copy.deepcopy(state)
+        return True
+
+    def _map(self, filename):
+        ''' Returns read-only memory map of the file, remapped if file has grown. '''
+        size = os.path.getsize(filename)
+        mapped_size, mapped = self._maps.get(filename, (0, None))
+        if mapped_size != size or mapped is None:
+            if mapped_size:
+                mapped.close()
+            with open(filename, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            self._maps[filename] = (size, mapped)
+        return mapped
+
+    def _index_entry(self, record_number):
+        return self.INDEX_ENTRY.unpack_from(self._map(self.index_filename), record_number * self.INDEX_ENTRY.size)
+
+    def timestamp(self, record_number):
+        return self._index_entry(record_number)[0]
+
+    def find(self, timestamp):
+        ''' Returns number of the last record made at or before given moment,
+        or None if history starts later.
+        '''
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1 if lo > 0 else None
+
+    def _read_record(self, record_number):
+        offset = self._index_entry(record_number)[1]
+        data = self._map(self.filename)
+        kind, timestamp, size = self.RECORD_HEADER.unpack_from(data, offset)
+        start = offset + self.RECORD_HEADER.size
+        return kind, timestamp, json.loads(data[start:start + size].decode('utf-8'))
+
+    def state_at_record(self, record_number):
+        snapshot = self._index_entry(record_number)[2]
+        kind, timestamp, state = self._read_record(snapshot)
+        for number in range(snapshot + 1, record_number + 1):
+            apply_delta(state, self._read_record(number)[2])
+        return state
+
+    def state_at(self, timestamp):
+        ''' Returns state of the hero at given moment or None if history starts later. '''
+        record_number = self.find(timestamp)
+        if record_number is None:
+            return None
+        return self.state_at_record(record_number)
+
+    def iter_states(self, start=None, end=None):
+        ''' Yields pairs (timestamp, state) for all records within given time range. '''
+        first = 0
+        if start is not None:
+            first = self.find(start)
+            if first is None:
+                first = 0
+            elif self.timestamp(first) < start:
+                first += 1
+        state = None
+        for number in range(first, len(self)):
+            kind, timestamp, payload = self._read_record(number)
+            if end is not None and timestamp > end:
+                break
+            if kind == self.FULL:
+                state = payload
+            elif state is None:
+                state = self.state_at_record(number)
+            else:
+                # Deltas replace only top-level values, so shallow copy is enough
+                # to keep previously yielded states intact.
+                state = apply_delta(dict(state), payload)
+            yield timestamp, state
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+import collections
+
+class Timing:
+    '''
+    Durations of a single processing phase (seconds):
+    the last one, exponentially weighted moving average, max, total and count.
+    Percentiles are computed over the latest SAMPLES durations.
+    '''
+    SAMPLES = 256
+    ALPHA = 0.2 # Weight of the new value in EWMA.
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.ewma = None
+        self.max = 0.0
+        self._samples = collections.deque(maxlen=self.SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.ewma = seconds if self.ewma is None else self.ewma + self.ALPHA * (seconds - self.ewma)
+        self.max = max(self.max, seconds)
+        self._samples.append(seconds)
+
+    def percentile(self, percent):
+        ''' Nearest-rank percentile of the latest durations. '''
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)
+        index = max(0, min(len(samples) - 1, int(round(percent / 100.0 * len(samples))) - 1))
+        return samples[index]
+
+class _PhaseTimer:
+    __slots__ = ('metrics', 'phase', 'started')
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.phase, time.perf_counter() - self.started)
+        return False
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    '''
+    Timings of processing phases, counters of events (fetched bytes, errors, fired rules)
+    and stats of other components (sources are callables that return dict name: number).
+
+    Thread-safe: fetches are measured in worker threads.
+    Could be written in Prometheus text format (e.g. for node exporter's textfile collector).
+    '''
+    def __init__(self):
+        self.timings = {} # phase: Timing
+        self.counters = collections.Counter()
+        self.sources = {} # name: callable
+        self._lock = threading.Lock()
+
+    def timer(self, phase):
+        ''' Context manager that measures duration of the phase. '''
+        return _PhaseTimer(self, phase)
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            timing = self.timings.get(phase)
+            if timing is None:
+                timing = self.timings[phase] = Timing()
+            timing.add(seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def add_source(self, name, stats):
+        self.sources[name] = stats
+
+    def source_stats(self):
+        ''' Returns list of pairs (source name, sorted list of (stat name, value)). '''
+        result = []
+        for name, stats in self.sources.items():
+            values = sorted((key, value) for key, value in stats().items() if isinstance(value, (int, float)))
+            if values:
+                result.append((name, values))
+        return result
+
+    def report_lines(self):
+        ''' Returns list of lines with human-readable stats (durations in ms). '''
+        lines = ['{0:<24}{1:>8}{2:>8}{3:>8}{4:>8}{5:>8}{6:>8}'.format('Phase, ms', 'last', 'ewma', 'p50', 'p95', 'max', 'count')]
+        with self._lock:
+            timings = sorted(self.timings.items())
+            counters = sorted(self.counters.items())
+            for phase, timing in timings:
+                lines.append('{0:<24.24}{1:>8.2f}{2:>8.2f}{3:>8.2f}{4:>8.2f}{5:>8.2f}{6:>8}'.format(phase,
+                    timing.last * 1000, timing.ewma * 1000,
+                    timing.percentile(50) * 1000, timing.percentile(95) * 1000,
+                    timing.max * 1000, timing.count,
+                    ))
+        lines.append('')
+        lines.append('Counters: ' + ', '.join('{0}={1}'.format(name, value) for name, value in counters))
+        for name, values in self.source_stats():
+            lines.append('{0}: {1}'.format(name, ', '.join('{0}={1:g}'.format(key, value) for key, value in values)))
+        return lines
+
+    def prometheus_text(self, prefix='pygod'):
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP {0}_{1} {2}'.format(prefix, name, help_text))
+            lines.append('# TYPE {0}_{1} {2}'.format(prefix, name, kind))
+            for suffix, labels, value in samples:
+                labels = ','.join('{0}="{1}"'.format(key, _escape_label(label)) for key, label in labels)
+                lines.append('{0}_{1}{2}{{{3}}} {4!r}'.format(prefix, name, suffix, labels, float(value)))
+        with self._lock:
+            timings = sorted(self.timings.items())
+            counters = sorted(self.counters.items())
+            metric('phase_seconds', 'summary', 'Duration of processing phases (quantiles over the latest samples).',
+                    [('', [('phase', phase), ('quantile', quantile)], timing.percentile(percent))
+                        for phase, timing in timings for quantile, percent in (('0.5', 50), ('0.95', 95))]
+                    + [('_sum', [('phase', phase)], timing.total) for phase, timing in timings]
+                    + [('_count', [('phase', phase)], timing.count) for phase, timing in timings])
+            for name, attr, help_text in (
+                    ('last', 'last', 'Duration of the last run of the phase.'),
+                    ('ewma', 'ewma', 'Exponentially weighted moving average of the phase duration.'),
+                    ('max', 'max', 'Max duration of the phase.'),
+                    ):
+                metric('phase_{0}_seconds'.format(name), 'gauge', help_text,
+                        [('', [('phase', phase)], getattr(timing, attr)) for phase, timing in timings])
+        metric('events_total', 'counter', 'Number of events (fetched bytes, errors, fired rules etc).',
+                [('', [('event', name)], value) for name, value in counters])
+        metric('component_stat', 'gauge', 'Stats of components (connection pool, compositor, caches etc).',
+                [('', [('component', name), ('stat', key)], value)
+                    for name, values in self.source_stats() for key, value in values])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename):
+        ''' Writes metrics to the file atomically, so scraper never reads partial file. '''
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmpname, filename)
+
+# Metrics shared by the whole application.
+default_metrics = Metrics()
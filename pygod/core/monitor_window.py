@@ -1,15 +1,29 @@
 from .text_entry import TextEntry
 from .text_entry import ListEntry
 from .text_entry import Colors
+from .compositor import default_compositor
+from .wrap_cache import default_wrap_cache
+from .metrics import default_metrics
+from .trace import default_tracer as tracer
+from . import backend
 import logging
 import curses
-import textwrap
 
 class MonitorWindowBase:
     '''
     Base class for all windows of the Godville Monitor
 
+    Keeps lines that are currently rendered on the window,
+    so on update only changed lines are rewritten
+    and window without changes is not refreshed at all.
+
+    Windows do not refresh the terminal themselves,
+    changes are staged to compositor and flushed once per frame.
     '''
+    # Overlay windows (like pop-ups) get their own buffer instead of sharing it with parent,
+    # so they do not corrupt content of underlying windows.
+    OVERLAY = False
+
     def __init__(self, parent_window, title, x=0, y=0, width=None, height=None):
         self.title        = title
         self.text_entries = []
@@ -20,11 +34,21 @@ class MonitorWindowBase:
         self.y           = y
         self.width       = width if width else parent_width - x
         self.height      = height if height else parent_height - y
-        self.window      = parent_window.subwin(self.height,
-                                                 self.width,
-                                                 self.y,
-                                                 self.x)
+        if self.OVERLAY:
+            self.window  = backend.current.newwin(self.height,
+                                                  self.width,
+                                                  self.y,
+                                                  self.x)
+        else:
+            self.window  = parent_window.subwin(self.height,
+                                                self.width,
+                                                self.y,
+                                                self.x)
         self.window.box()
+        self._rendered_lines = None # None means that window should be fully repainted.
+        self._rendered_title = None
+        self._written_bytes = 0
+        self._update_phase = 'update:{0}'.format(title or type(self).__name__)
         self.init_text_entries()
 
     def add_text_entry(self, entry, key=None, width=None, color=None):
@@ -35,63 +59,105 @@ class MonitorWindowBase:
                 width if width is not None else self.width,
                 color if color is not None else Colors.STANDART))
 
-    def add_list_entry(self, list_generator, width=None, color=None):
+    def add_list_entry(self, list_generator, width=None, color=None, depends_on=()):
         self.text_entries.append(ListEntry(list_generator,
             width if width is not None else self.width,
-            color if color is not None else Colors.STANDART))
-
-    def update(self, state):
-        logging.debug('%s: Updating window \'%s\'',
-                      self.update.__name__,
-                      self.title)
-
-        self.window.erase()
-        self.window.box()
-        self.window.addstr(0, 2, self.title)
-
-        for entry in self.text_entries:
-            entry.update(state)
-
-        self.write_text(self.text_entries)
-        self.window.refresh()
+            color if color is not None else Colors.STANDART,
+            depends_on))
+
+    def invalidate(self):
+        ''' Forces full repaint on the next update. '''
+        self._rendered_lines = None
+
+    def show(self):
+        ''' Puts current content of the window on the screen again (e.g. after overlapping window was removed). '''
+        self.window.touchwin()
+        self.stage()
+
+    def stage(self):
+        default_compositor.stage(self.window, self._written_bytes)
+        self._written_bytes = 0
+
+    def update(self, state, changed_keys=None):
+        ''' Updates entries and repaints changed lines.
+        If set of state keys changed since the previous update is specified,
+        only entries that depend on those keys are updated.
+        Returns True if anything was repainted.
+        '''
+        if tracer.enabled:
+            tracer.record('window.update', self.title, None if changed_keys is None else len(changed_keys))
+
+        with default_metrics.timer(self._update_phase):
+            for entry in self.text_entries:
+                entry.update(state, changed_keys=changed_keys)
+
+            if self._rendered_lines is None:
+                self.window.erase()
+                self._rendered_lines = []
+                self._rendered_title = None
+            elif self._rendered_title == self.title and not any(entry.changed for entry in self.text_entries):
+                return False
+
+            if self._rendered_title != self.title:
+                self.window.box()
+                self.window.addstr(0, 2, self.title)
+                self._rendered_title = self.title
+
+            self.write_text(self.text_entries)
+            self.stage()
+            return True
 
     def init_text_entries(self):
         pass
 
     def split_text(self, text, length):
-        if not text:
-            return ['']
-        return textwrap.wrap(text, length)
-
-    def write_text_chunks(self, chunks, color, start_line):
-        for i, chunk in enumerate(chunks):
-            try:
-                self.window.addnstr(start_line + i,
-                                    1,
-                                    chunk,
-                                    self.width - 2,
-                                    curses.color_pair(color))
-            except curses.error as e:
-                if 'addnwstr() returned ERR' in str(e):
-                    self.window.box()
-                    self.window.addstr(0, 2, self.title)
-                    self.window.addnstr(self.height - 2, self.width - 7, '[...]', 5, curses.color_pair(Colors.ATTENTION))
-
-
-    def write_text(self, entries):
-        offset = 1 # Offset for correcting line number for splitted text
+        return default_wrap_cache.wrap(text, length)
 
-        for i, entry in enumerate(entries):
+    def layout_text(self, entries):
+        ''' Returns list of pairs (line, color) with text of all entries split to fit window. '''
+        lines = []
+        for entry in entries:
             if isinstance(entry.text, str):
-                logging.debug('%s: Writting text \'%s\'',
-                              self.write_text.__name__,
-                              entry.text)
+                if tracer.enabled:
+                    tracer.record('window.text', self.title, entry.text)
                 chunks = self.split_text(entry.text, self.width - 2)
-                self.write_text_chunks(chunks, entry.color, i + offset)
-                offset += len(chunks) - 1
+                lines.extend((chunk, entry.color) for chunk in chunks)
             else:
                 for line, color in entry.text:
                     chunks = self.split_text(line, self.width - 2)
-                    self.write_text_chunks(chunks, color, i + offset)
-                    offset += len(chunks) - 1
-                    offset += 1
+                    lines.extend((chunk, color) for chunk in chunks)
+                # List occupies one extra line after its items.
+                lines.append(('', entry.color))
+        return lines
+
+    def write_line(self, line_number, text, color):
+        text = text.ljust(self.width - 2)[:self.width - 2]
+        self._written_bytes += len(text.encode('utf-8'))
+        try:
+            self.window.addnstr(line_number,
+                                1,
+                                text,
+                                self.width - 2,
+                                backend.current.color_pair(color))
+        except curses.error as e:
+            logging.error('%s: failed to write line %s: %s',
+                          self.write_line.__name__,
+                          line_number, e)
+
+    def write_text(self, entries):
+        lines = self.layout_text(entries)
+        max_lines = self.height - 2
+        visible_lines = lines[:max_lines]
+
+        for i, line in enumerate(visible_lines):
+            if i < len(self._rendered_lines) and self._rendered_lines[i] == line:
+                continue
+            self.write_line(i + 1, *line)
+        for i in range(len(visible_lines), len(self._rendered_lines)):
+            self.write_line(i + 1, '', Colors.STANDART)
+
+        if visible_lines and any(text for text, color in lines[max_lines:]):
+            self.window.addnstr(self.height - 2, self.width - 7, '[...]', 5, backend.current.color_pair(Colors.ATTENTION))
+            # Last line is partially covered by the mark, so it should be rewritten next time.
+            visible_lines[-1] = (None, None)
+        self._rendered_lines = visible_lines
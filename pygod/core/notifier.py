@@ -0,0 +1,135 @@
+import time
+import queue
+import shlex
+import logging
+import threading
+import collections
+
+class NotificationDispatcher:
+    '''
+    Runs notification command for warning messages in background workers,
+    so slow notifier does not block UI.
+
+    Command is a template that is split into arguments (shell-like quoting) before substitution,
+    each argument is formatted separately and command is executed without shell,
+    so message text cannot inject anything into the command line.
+    Placeholders: {0} or {message}, plus any keyword parameters passed to post().
+
+    Identical commands within coalesce_window seconds are merged into one.
+    No more than max_per_minute commands are started per minute,
+    and no more than queue_size commands could wait for a free worker; the rest are dropped.
+    Command that runs longer than timeout seconds is killed.
+    '''
+    def __init__(self, command, timeout=10, coalesce_window=60, max_per_minute=6, queue_size=16, workers=1):
+        self.argv = None
+        if command:
+            try:
+                self.argv = shlex.split(command)
+            except ValueError as e:
+                logging.error('%s: invalid notification command %s: %s',
+                              self.__init__.__name__,
+                              repr(command), str(e))
+        self.timeout = timeout
+        self.coalesce_window = coalesce_window
+        self.max_per_minute = max_per_minute
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._last_sent = {} # Command: monotonic time when it was queued.
+        self._recent = collections.deque() # Monotonic times of commands queued within the last minute.
+        self.stats = {
+                'sent' : 0,
+                'coalesced' : 0,
+                'rate_limited' : 0,
+                'dropped' : 0,
+                'failed' : 0,
+                'timeouts' : 0,
+                }
+
+    def __bool__(self):
+        return bool(self.argv)
+
+    def format_command(self, message, **params):
+        return tuple(arg.format(message, message=message, **params) for arg in self.argv)
+
+    def post(self, message, **params):
+        ''' Queues notification. Returns True if command will be executed. '''
+        if not self.argv:
+            return False
+        command = self.format_command(message, **params)
+        now = time.monotonic()
+        last_sent = self._last_sent.get(command)
+        if last_sent is not None and now - last_sent < self.coalesce_window:
+            self.stats['coalesced'] += 1
+            logging.debug('%s: same notification was sent %.1f s ago, skipped',
+                          self.post.__name__,
+                          now - last_sent)
+            return False
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if self.max_per_minute and len(self._recent) >= self.max_per_minute:
+            self.stats['rate_limited'] += 1
+            logging.warning('%s: more than %s notifications per minute, skipped: %s',
+                            self.post.__name__,
+                            self.max_per_minute, message)
+            return False
+        try:
+            self._queue.put_nowait(command)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            logging.warning('%s: notification queue is full, skipped: %s',
+                            self.post.__name__,
+                            message)
+            return False
+        self._recent.append(now)
+        self._last_sent = {key: sent for key, sent in self._last_sent.items() if now - sent < self.coalesce_window}
+        self._last_sent[command] = now
+        self._start_workers()
+        return True
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command is None:
+                return
+            self._execute(command)
+
+    def _execute(self, command):
+        import subprocess
+        try:
+            result = subprocess.run(command, timeout=self.timeout,
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except subprocess.TimeoutExpired:
+            self.stats['timeouts'] += 1
+            logging.warning('%s: notification command did not finish in %s s and was killed: %s',
+                            self._execute.__name__,
+                            self.timeout, command[0])
+            return
+        except OSError as e:
+            self.stats['failed'] += 1
+            logging.error('%s: failed to run notification command: %s',
+                          self._execute.__name__,
+                          str(e))
+            return
+        if result.returncode != 0:
+            self.stats['failed'] += 1
+            logging.error('%s: notification command exited with code %s: %s',
+                          self._execute.__name__,
+                          result.returncode, result.stderr.decode('utf-8', 'replace').strip())
+            return
+        self.stats['sent'] += 1
+
+    def close(self):
+        ''' Stops workers after already queued notifications. Does not wait for them. '''
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        self._threads = []
@@ -0,0 +1,128 @@
+import time
+import random
+import logging
+import datetime
+from ..engine.resilience import Backoff
+
+def parse_cron_window(value):
+    ''' Parses "start-end" range of minutes within an hour (e.g. "58-2").
+    Returns pair of minutes or None for empty value.
+    '''
+    if not value:
+        return None
+    start, end = (int(part) for part in value.split('-', 1))
+    return start, end
+
+class PollingScheduler:
+    '''
+    Decides when state of each session should be fetched next.
+
+    Interval depends on hero's activity:
+    - fast_interval during fights, dungeons and when health is below low_health (ratio of max health);
+    - slow_interval when session is expired or state has not changed for stable_after fetches;
+    - interval otherwise.
+    Each interval is randomized by +/- jitter seconds.
+
+    Sessions are also checked once per hour, as game sessions usually expire hourly.
+    Time of hourly check is shifted by a random offset (chosen once per client within hourly_jitter seconds),
+    so clients do not hit the server at the same second.
+    Fetches that fall into engine's cron window (engine.CRON_WINDOW, minutes within an hour)
+    are postponed until the window ends.
+
+    After failed fetches next attempt is delayed exponentially (from backoff_base up to backoff_max seconds),
+    but not earlier than server (Retry-After) or circuit breaker of the host allow.
+    '''
+    def __init__(self, interval=61, fast_interval=20, slow_interval=300,
+                 low_health=0.3, stable_after=10,
+                 jitter=5, hourly_jitter=120, cron_window=None,
+                 backoff_base=15, backoff_max=900, rng=None):
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.low_health = low_health
+        self.stable_after = stable_after
+        self.jitter = jitter
+        self.cron_window = cron_window # Overrides windows of engines: (start minute, end minute).
+        self.rng = rng or random.Random()
+        self.hourly_offset = self.rng.uniform(0, hourly_jitter)
+        self.backoff = Backoff(base=backoff_base, max_delay=backoff_max, rng=self.rng)
+        self.stats = {
+                'fast' : 0,
+                'normal' : 0,
+                'slow' : 0,
+                'hourly' : 0,
+                'cron_skipped' : 0,
+                'backoff' : 0,
+                }
+
+    def _base_interval(self, session):
+        ''' Returns pair (interval, reason). '''
+        state = session.state or {}
+        if state.get('expired'):
+            return self.slow_interval, 'slow'
+        if state.get('arena_fight'):
+            return self.fast_interval, 'fast'
+        health, max_health = state.get('health'), state.get('max_health')
+        if isinstance(health, (int, float)) and isinstance(max_health, (int, float)) and max_health > 0:
+            if 0 < health < self.low_health * max_health:
+                return self.fast_interval, 'fast'
+        if session.stable_fetches >= self.stable_after:
+            return self.slow_interval, 'slow'
+        return self.interval, 'normal'
+
+    def _local_seconds(self, wall_time):
+        ''' Returns number of seconds since the beginning of the hour in local time. '''
+        moment = datetime.datetime.fromtimestamp(wall_time)
+        return moment.minute * 60 + moment.second + moment.microsecond / 1000000.0
+
+    def _seconds_until_hourly_check(self, seconds_in_hour):
+        delay = self.hourly_offset - seconds_in_hour
+        return delay if delay > 0 else delay + 3600
+
+    def _cron_delay(self, engine, seconds_in_hour):
+        ''' Returns number of seconds until the end of cron window or 0 if moment is outside of it. '''
+        window = self.cron_window or getattr(engine, 'CRON_WINDOW', None)
+        if window is None:
+            return 0
+        start, end = (minute * 60 % 3600 for minute in window)
+        if start <= end:
+            inside = start <= seconds_in_hour < end
+        else:
+            inside = seconds_in_hour >= start or seconds_in_hour < end
+        if not inside:
+            return 0
+        return (end - seconds_in_hour) % 3600
+
+    def _retry_interval(self, session):
+        interval = max(self.backoff.delay(session.failures), session.retry_after or 0)
+        if session.breaker is not None:
+            interval = max(interval, session.breaker.retry_in())
+        return interval
+
+    def schedule(self, session, now=None):
+        ''' Returns monotonic time of the next fetch for the session. '''
+        now = time.monotonic() if now is None else now
+        if session.failures:
+            interval = self._retry_interval(session)
+            self.stats['backoff'] += 1
+            logging.debug('%s: fetch for %s failed %s times, next attempt in %.1f s',
+                          self.schedule.__name__,
+                          session.godname, session.failures, interval)
+            session.poll_interval = interval
+            return now + interval
+        wall_now = time.time()
+        interval, reason = self._base_interval(session)
+        interval = max(1, interval + self.rng.uniform(-self.jitter, self.jitter))
+        hourly = self._seconds_until_hourly_check(self._local_seconds(wall_now))
+        if hourly < interval:
+            interval, reason = hourly, 'hourly'
+        cron_delay = self._cron_delay(session.engine, self._local_seconds(wall_now + interval))
+        if cron_delay:
+            interval += cron_delay + self.rng.uniform(0, self.jitter)
+            self.stats['cron_skipped'] += 1
+        self.stats[reason] += 1
+        logging.debug('%s: next fetch for %s in %.1f s (%s)',
+                      self.schedule.__name__,
+                      session.godname, interval, reason)
+        session.poll_interval = interval
+        return now + interval
@@ -1,5 +1,7 @@
 import logging
 from ..core.utils import tr
+from .events import TrackingState
+from .trace import default_tracer as tracer
 
 class Colors:
     STANDART        = 1
@@ -19,19 +21,33 @@ class TextEntry:
         self.color_by_state  = color if callable(color) else None
         self.attribute       = None
         self.text            = ''
+        self.changed         = True
+        self._dependencies   = None # Keys of state that text depends on, None means any key.
 
-    def update(self, state, attribute = None):
-        logging.debug('%s: Updating entry \'%s\'',
-                       self.update.__name__,
-                       self.predefined_text)
+    def update(self, state, attribute = None, changed_keys = None):
+        ''' If set of keys changed since the previous update is specified,
+        text is formatted again only when it depends on any of them.
+        '''
+        if changed_keys is not None and self._dependencies is not None and self._dependencies.isdisjoint(changed_keys):
+            self.changed = False
+            return
+
+        if tracer.enabled:
+            tracer.record('entry.update', self.predefined_text, self.key if isinstance(self.key, str) else None)
 
+        rendered = (self.text, self.color)
+        tracking_state = TrackingState(state)
+        self.text = self._format_text(tracking_state)
+        self._dependencies = tracking_state.dependencies()
+        self.changed = (self.text, self.color) != rendered
+
+    def _format_text(self, state):
         key_width   = self.width - len(self.predefined_text) - 2
         custom_text = ''
         text_format = '{0}{1:>{2}}'
 
         if isinstance(self.key, str) and self.key == '' and self.predefined_text == '':
-            self.text = ''
-            return
+            return ''
 
         # In case of empty predefined text use center alignment
         if self.predefined_text == '':
@@ -53,26 +69,37 @@ class TextEntry:
                 custom_text = tr('N/A')
 
         if key_width < 0:
-            self.text = tr("{0} text doesn't fit").format(self.key)
-            return
+            return tr("{0} text doesn't fit").format(self.key)
 
         if self.color_by_state:
             self.color = self.color_by_state(state) or Colors.STANDART
-        self.text = text_format.format(self.predefined_text,
-                                        custom_text,
-                                        key_width)
+        return text_format.format(self.predefined_text,
+                                  custom_text,
+                                  key_width)
 
 class ListEntry:
-    def __init__(self, list_generator, width, color = Colors.STANDART):
+    def __init__(self, list_generator, width, color = Colors.STANDART, depends_on = ()):
         self.generator = list_generator
         self.width           = width
         self.color           = color
+        self.depends_on      = depends_on # Keys that list depends on besides the ones generator reads.
         self.text            = []
+        self.changed         = True
+        self._dependencies   = None
+
+    def update(self, state, changed_keys = None):
+        if changed_keys is not None and self._dependencies is not None and self._dependencies.isdisjoint(changed_keys):
+            self.changed = False
+            return
 
-    def update(self, state):
+        rendered = self.text
         self.text = []
-        for item, color in self.generator(state):
+        tracking_state = TrackingState(state)
+        tracking_state.keys_read.update(self.depends_on)
+        for item, color in self.generator(tracking_state):
             if color is None:
                 color = Colors.STANDART
             self.text.append( (item, color) )
+        self._dependencies = tracking_state.dependencies()
+        self.changed = self.text != rendered
 
@@ -0,0 +1,85 @@
+import sys
+import time
+import signal
+import logging
+import datetime
+import traceback
+import collections
+
+class Tracer:
+    '''
+    In-memory ring buffer of the latest trace events (used in render hot path instead of debug logs).
+
+    Event is a tuple (time, name, args): nothing is formatted or written until buffer is dumped
+    (on demand or on crash), so recording costs a single append.
+    Call sites check plain attribute before recording:
+
+        if tracer.enabled:
+            tracer.record('entry.update', text)
+
+    so disabled tracing costs one attribute lookup.
+    '''
+    def __init__(self, size=10000):
+        self.enabled = False
+        self.events = collections.deque(maxlen=size)
+        self.filename = None
+        self._prev_excepthook = None
+
+    def enable(self, filename, size=None):
+        ''' Starts recording. Buffer is dumped to filename by dump() and on unhandled exception. '''
+        if size is not None and size != self.events.maxlen:
+            self.events = collections.deque(self.events, maxlen=max(1, size))
+        self.filename = filename
+        self.enabled = True
+        if self._prev_excepthook is None:
+            self._prev_excepthook = sys.excepthook
+            sys.excepthook = self._excepthook
+
+    def disable(self):
+        self.enabled = False
+        if self._prev_excepthook is not None:
+            sys.excepthook = self._prev_excepthook
+            self._prev_excepthook = None
+
+    def record(self, name, *args):
+        self.events.append((time.perf_counter(), name, args))
+
+    def format_events(self):
+        ''' Yields lines with events, the oldest first. '''
+        # Event times are on performance counter, converted to wall time only for output.
+        offset = time.time() - time.perf_counter()
+        for timestamp, name, args in list(self.events):
+            yield '{0} {1} {2}\n'.format(
+                    datetime.datetime.fromtimestamp(timestamp + offset).strftime('%Y-%m-%d %H:%M:%S.%f'),
+                    name, ' '.join(map(repr, args)))
+
+    def dump(self, reason=None):
+        ''' Writes all recorded events to the file. Returns name of the file. '''
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            if reason:
+                f.write('# {0}\n'.format(reason))
+            f.writelines(self.format_events())
+        return self.filename
+
+    def dump_on_signal(self, signum):
+        ''' Dumps events when process receives the signal (e.g. SIGUSR1). '''
+        signal.signal(signum, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        try:
+            self.dump('Dumped on signal {0}'.format(signum))
+        except OSError as e:
+            logging.error('%s: failed to dump trace: %s',
+                          self._on_signal.__name__,
+                          e)
+
+    def _excepthook(self, exc_type, exc_value, exc_traceback):
+        if self.enabled:
+            try:
+                self.dump(''.join(traceback.format_exception_only(exc_type, exc_value)).strip())
+            except OSError:
+                pass
+        self._prev_excepthook(exc_type, exc_value, exc_traceback)
+
+# Tracer shared by the whole application.
+default_tracer = Tracer()
@@ -1,5 +1,4 @@
 import os
-import gettext
 
 def get_config_file(*args, engine=None):
     xdg_config_dir = os.environ.get('XDG_CONFIG_HOME')
@@ -42,6 +41,15 @@ def unquote_string(string):
     return bytes(string, "utf-8").decode('unicode_escape').encode("latin1").decode("utf-8")
 
 # I18N
-translate = gettext.translation('pygod', get_data_dir(), fallback=True)
-tr = translate.gettext # this function should be used to mark all translatable strings.
-translate.install()
+_translation = None
+def translation():
+    ''' Translation catalog, loaded on the first use. '''
+    global _translation
+    if _translation is None:
+        import gettext
+        _translation = gettext.translation('pygod', get_data_dir(), fallback=True)
+        _translation.install()
+    return _translation
+
+def tr(message): # this function should be used to mark all translatable strings.
+    return translation().gettext(message)
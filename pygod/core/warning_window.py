@@ -1,15 +1,18 @@
 import logging
-import curses
 from .text_entry import TextEntry
 from .text_entry import Colors
 from .monitor_window import MonitorWindowBase
+from . import backend
 from ..core.utils import tr
 
 class WarningWindow(MonitorWindowBase):
+    OVERLAY = True
+
     def __init__(self,
                  parent_window,
                  text):
 
+        self.message = text
         self._text = [' ' + line + ' ' for line in text.splitlines()]
         self._last_line = tr('Press SPACE...')
 
@@ -34,7 +37,7 @@ class WarningWindow(MonitorWindowBase):
 
         super(WarningWindow, self).__init__(parent_window, tr('Warning'), x, y, width, height)
 
-        self.window.bkgd(' ', curses.color_pair(Colors.ATTENTION))
+        self.window.bkgd(' ', backend.current.color_pair(Colors.ATTENTION))
 
     def init_text_entries(self):
         for line in self._text:
@@ -0,0 +1,53 @@
+import textwrap
+import collections
+
+class WrapCache:
+    '''
+    Bounded LRU cache of wrapped text: (text, width) -> list of lines.
+    Most of displayed text (diary, quest, captions) is the same between updates,
+    so it is wrapped only once.
+    '''
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lines = collections.OrderedDict()
+        self.stats = {
+                'hits' : 0,
+                'misses' : 0,
+                'evictions' : 0,
+                }
+
+    def __len__(self):
+        return len(self._lines)
+
+    def hit_rate(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0
+
+    def wrap(self, text, width):
+        ''' Returns list of lines as textwrap.wrap() (but at least one line). Result should not be modified. '''
+        key = (text, width)
+        lines = self._lines.get(key)
+        if lines is not None:
+            self._lines.move_to_end(key)
+            self.stats['hits'] += 1
+            return lines
+        self.stats['misses'] += 1
+        lines = textwrap.wrap(text, width) if text else ['']
+        self._lines[key] = lines
+        if len(self._lines) > self.maxsize:
+            self._lines.popitem(last=False)
+            self.stats['evictions'] += 1
+        return lines
+
+    def clear(self):
+        ''' Drops all cached text (e.g. when windows are resized and old widths are not used anymore). '''
+        self._lines.clear()
+
+    def report(self):
+        return 'size={0}/{1}, hit rate={2:.1%}, {3}'.format(
+                len(self), self.maxsize, self.hit_rate(),
+                ', '.join('{0}={1}'.format(name, value) for name, value in sorted(self.stats.items())),
+                )
+
+# Cache shared by all windows.
+default_wrap_cache = WrapCache()
@@ -0,0 +1,275 @@
+''' Shared state for several frontends.
+
+Daemon fetches states, checks rules and sends notifications once per god
+and publishes results over Unix domain socket, so any number of monitors
+could attach to it and only render states, without sending requests to the game server.
+
+Protocol: daemon sends newline-delimited JSON messages, clients send nothing.
+- {"type": "hello", "engine": engine_id, "gods": [godname, ...]} - first message after connect;
+- {"type": "state", "god": godname, "state": {...}} - full state (right after hello);
+- {"type": "diary", "god": godname, "entries": [[timestamp, text], ...]} - diary backlog, the oldest first (right after states);
+- {"type": "delta", "god": godname, "delta": {"set": {...}, "del": [...]}} - changes since the previous message (see make_delta());
+- {"type": "warning", "god": godname, "message": text} - warning from rules or connection errors.
+'''
+import os
+import json
+import stat
+import socket
+import logging
+import selectors
+import tempfile
+from .core import backend
+from .core.history import make_delta, without_raw_data
+
+def default_socket_path(engine_id):
+    ''' Returns $XDG_RUNTIME_DIR/pygod-<uid>/<engine>.sock (or in system temp dir). '''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, 'pygod-{0}'.format(os.getuid()), '{0}.sock'.format(engine_id))
+
+def encode_message(message):
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+class StateServer:
+    '''
+    Publishes states of sessions to all connected clients.
+    Each message is encoded once and the same bytes are sent to every client.
+    Sockets are non-blocking and served from the main loop selector;
+    clients that do not read their data (more than max_buffer bytes pending) are disconnected.
+    '''
+    def __init__(self, path, engine_id, sessions, max_buffer=16 * 1024 * 1024):
+        self.path = path
+        self.engine_id = engine_id
+        self.sessions = sessions
+        self.max_buffer = max_buffer
+        self.selector = None
+        self._clients = {} # socket: pending output (bytearray)
+        self._published = {} # godname: copy of the last published state
+        self.stats = {
+                'clients' : 0,
+                'messages' : 0,
+                'bytes' : 0,
+                'dropped_clients' : 0,
+                }
+        self._check_socket_dir(os.path.dirname(path) or '.')
+        self._remove_stale_socket()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        os.chmod(path, 0o600)
+        self.sock.listen()
+        self.sock.setblocking(False)
+
+    @staticmethod
+    def _check_socket_dir(dirname):
+        ''' Socket directory (e.g. in shared /tmp) could be created beforehand by another user
+        to intercept states, so only directory that is owned by the current user
+        and could not be modified by others is accepted. Missing directory is created as private one.
+        '''
+        os.makedirs(dirname, mode=0o700, exist_ok=True)
+        info = os.lstat(dirname)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise RuntimeError('Directory {0} should be owned by the current user, not be writable by others and not be a symlink'.format(dirname))
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path) # Left by daemon that was killed.
+            return
+        finally:
+            probe.close()
+        raise RuntimeError('Daemon is already running')
+
+    def register(self, selector):
+        self.selector = selector
+        selector.register(self.sock, selectors.EVENT_READ, self.accept)
+
+    def close(self):
+        for client in list(self._clients):
+            self._disconnect(client)
+        if self.selector is not None:
+            try:
+                self.selector.unregister(self.sock)
+            except (KeyError, ValueError):
+                pass
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def accept(self):
+        try:
+            client, _ = self.sock.accept()
+        except BlockingIOError:
+            return
+        client.setblocking(False)
+        self._clients[client] = bytearray()
+        self.stats['clients'] += 1
+        logging.debug('%s: client connected, %s clients total',
+                      self.accept.__name__,
+                      len(self._clients))
+        self._send(client, encode_message({
+                'type' : 'hello',
+                'engine' : self.engine_id,
+                'gods' : [session.godname for session in self.sessions],
+                }))
+        for godname, state in self._published.items():
+            self._send(client, encode_message({
+                    'type' : 'state',
+                    'god' : godname,
+                    'state' : state,
+                    }))
+        # New entries are sent as changes of 'diary_last', but diary could be restored at start
+        # or recorded before client is connected.
+        for session in self.sessions:
+            if client not in self._clients:
+                return # Disconnected.
+            if len(session.diary):
+                self._send(client, encode_message({
+                        'type' : 'diary',
+                        'god' : session.godname,
+                        'entries' : list(reversed(session.diary.latest())),
+                        }))
+
+    def publish(self, session):
+        ''' Sends changes of session state since the previous call (if any).
+        Raw data of engines is not sent (see without_raw_data()).
+        '''
+        state = without_raw_data(session.state)
+        last_state = self._published.get(session.godname)
+        if last_state is None:
+            message = {'type' : 'state', 'god' : session.godname, 'state' : state}
+        else:
+            delta = make_delta(last_state, state)
+            if delta is None:
+                return
+            message = {'type' : 'delta', 'god' : session.godname, 'delta' : delta}
+        # Copy, as state of the session is modified in place later.
+        self._published[session.godname] = state
+        self.broadcast(message)
+
+    def publish_warning(self, session, message):
+        self.broadcast({
+                'type' : 'warning',
+                'god' : session.godname,
+                'message' : message,
+                })
+
+    def broadcast(self, message):
+        if not self._clients:
+            return
+        data = encode_message(message)
+        self.stats['messages'] += 1
+        for client in list(self._clients):
+            self._send(client, data)
+
+    def _send(self, client, data):
+        pending = self._clients[client]
+        was_empty = not pending
+        pending += data
+        if len(pending) > self.max_buffer:
+            self.stats['dropped_clients'] += 1
+            logging.warning('%s: client does not read states, disconnected',
+                            self._send.__name__)
+            self._disconnect(client)
+            return
+        if was_empty:
+            self._flush(client)
+
+    def _flush(self, client):
+        pending = self._clients[client]
+        try:
+            sent = client.send(pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._disconnect(client)
+            return
+        self.stats['bytes'] += sent
+        del pending[:sent]
+        if self.selector is None:
+            return
+        # Rest of data is sent when client's socket becomes writable.
+        registered = self._is_registered(client)
+        if pending and not registered:
+            self.selector.register(client, selectors.EVENT_WRITE, lambda client=client: self._flush(client))
+        elif not pending and registered:
+            self.selector.unregister(client)
+
+    def _is_registered(self, client):
+        try:
+            self.selector.get_key(client)
+        except KeyError:
+            return False
+        return True
+
+    def _disconnect(self, client):
+        del self._clients[client]
+        if self.selector is not None and self._is_registered(client):
+            self.selector.unregister(client)
+        client.close()
+        logging.debug('%s: client disconnected, %s clients left',
+                      self._disconnect.__name__,
+                      len(self._clients))
+
+class StateClient:
+    ''' Connection to the daemon. Reads hello message at connect, the rest are read via read(). '''
+    def __init__(self, path):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._buffer = b''
+        self.hello = None
+        while self.hello is None:
+            messages = self._receive()
+            if messages:
+                self.hello, self._pending = messages[0], messages[1:]
+        if self.hello.get('type') != 'hello':
+            raise ConnectionError('Unexpected message from daemon: {0}'.format(self.hello.get('type')))
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def _receive(self):
+        data = self.sock.recv(256 * 1024)
+        if not data:
+            raise ConnectionError('Daemon closed connection')
+        lines = (self._buffer + data).split(b'\n')
+        self._buffer = lines.pop()
+        return [json.loads(line.decode('utf-8')) for line in lines if line]
+
+    def read(self):
+        ''' Returns list of received messages.
+        Raises ConnectionError when daemon is stopped.
+        '''
+        messages, self._pending = self._pending, []
+        try:
+            messages += self._receive()
+        except BlockingIOError:
+            pass
+        return messages
+
+def run(sessions, server, args, height=40, width=120):
+    ''' Runs headless monitor that publishes states via server until terminated. '''
+    from .pygod import Monitor
+    import signal
+    backend.use_null_backend()
+    monitor = Monitor(sessions, args, stdscr=backend.NullWindow(height, width))
+    monitor.server = server
+    # Graceful exit on kill, so socket file is removed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: monitor.quit())
+    try:
+        monitor.init_event_sources(read_keys=False)
+        monitor.server.register(monitor.selector)
+        monitor.init_status_checkers()
+        logging.info('Daemon is listening at %s', args.socket)
+        monitor.main_loop()
+    finally:
+        monitor.finalize()
@@ -1,3 +1,43 @@
-from . import godvillenet
-from . import godvillegame
-from . import thetale
+""" Game engines.
+
+Engines are registered by id and their modules are imported only when engine is requested,
+so startup does not pay for engines that are not used.
+Third-party engines could be registered via entry points of group 'pygod.engines':
+name is engine id, value is 'module:Class'.
+"""
+import importlib
+
+ENTRY_POINT_GROUP = 'pygod.engines'
+
+# Engine id: 'module:Class' (module name is relative to this package).
+BUILTIN_ENGINES = {
+	'godvillenet' : '.godvillenet:GodvilleNet',
+	'godvillemirror' : '.godvillenet:GodvilleNetMirror',
+	'godvillegame' : '.godvillegame:GodvilleGameCom',
+	'thetale' : '.thetale:TheTale',
+	}
+
+def _entry_points():
+	""" Returns dict of engines registered by installed packages: {id: entry point}. """
+	try:
+		from importlib.metadata import entry_points
+	except ImportError:
+		return {}
+	try:
+		engines = entry_points(group=ENTRY_POINT_GROUP)
+	except TypeError: # Python < 3.10
+		engines = entry_points().get(ENTRY_POINT_GROUP, [])
+	return {entry_point.name: entry_point for entry_point in engines}
+
+def engine_ids():
+	""" Returns sorted list of ids of all known engines. """
+	return sorted(set(BUILTIN_ENGINES) | set(_entry_points()))
+
+def get_engine(engine_id):
+	""" Returns engine class by id, importing its module on demand.
+	Raises KeyError for unknown engine.
+	"""
+	if engine_id in BUILTIN_ENGINES:
+		module_name, class_name = BUILTIN_ENGINES[engine_id].split(':')
+		return getattr(importlib.import_module(module_name, __name__), class_name)
+	return _entry_points()[engine_id].load()
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import atexit
+import logging
+import tempfile
+import threading
+import contextlib
+try:
+	import fcntl
+except ImportError: # Not available on Windows.
+	fcntl = None
+
+class CookieStore:
+	""" Session cookies persisted in JSON file.
+
+	Only changed cookies are written and writes are done in background:
+	file is flushed after flush_delay seconds since the last change,
+	but not later than max_staleness seconds since the first unsaved change.
+	Pending changes are also flushed at exit.
+
+	File is replaced atomically (temp file + rename), so crash could not corrupt it.
+	Several processes could share the same file: writers are serialized by lock file (where fcntl is available),
+	and each flush merges own changes into the current content of the file,
+	so cookies written by other processes are picked up instead of being overwritten.
+	"""
+	FLUSH_DELAY = 2.0 # seconds
+	MAX_STALENESS = 10.0 # seconds
+
+	def __init__(self, filename, defaults=None, flush_delay=None, max_staleness=None):
+		self.filename = filename
+		self.lockfile = filename + '.lock'
+		self.flush_delay = self.FLUSH_DELAY if flush_delay is None else flush_delay
+		self.max_staleness = self.MAX_STALENESS if max_staleness is None else max_staleness
+		self.writes = 0
+		self._lock = threading.Condition()
+		self._changed = set() # Names of cookies that are not saved yet.
+		self._dirty_since = None # Monotonic time of the first unsaved change.
+		self._flush_at = None
+		self._thread = None
+		self._cookies = {}
+		try:
+			with self._file_lock():
+				self._cookies = self._read()
+		except OSError:
+			logging.exception('Failed to load cookies from {0}'.format(self.filename))
+		self.update({name: value for name, value in (defaults or {}).items() if name not in self._cookies})
+		atexit.register(self.flush)
+
+	def __getitem__(self, name):
+		with self._lock:
+			return self._cookies[name]
+	def get(self, name, default=None):
+		with self._lock:
+			return self._cookies.get(name, default)
+	def items(self):
+		with self._lock:
+			return list(self._cookies.items())
+
+	def update(self, cookies):
+		""" Sets new values of cookies and schedules flush if anything is changed.
+		Returns True if there were changes.
+		"""
+		with self._lock:
+			changed = [name for name, value in cookies.items() if name not in self._cookies or self._cookies[name] != value]
+			if not changed:
+				return False
+			for name in changed:
+				self._cookies[name] = cookies[name]
+			self._changed.update(changed)
+			now = time.monotonic()
+			if self._dirty_since is None:
+				self._dirty_since = now
+			self._flush_at = min(now + self.flush_delay, self._dirty_since + self.max_staleness)
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name='cookie-flush', daemon=True)
+				self._thread.start()
+			self._lock.notify()
+			return True
+
+	def _run(self):
+		while True:
+			with self._lock:
+				while not self._changed or time.monotonic() < self._flush_at:
+					self._lock.wait(None if not self._changed else self._flush_at - time.monotonic())
+			self.flush()
+
+	@contextlib.contextmanager
+	def _file_lock(self):
+		if fcntl is None:
+			yield
+			return
+		os.makedirs(os.path.dirname(self.lockfile) or '.', exist_ok=True)
+		with open(self.lockfile, 'a') as f:
+			fcntl.flock(f, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(f, fcntl.LOCK_UN)
+
+	def _read(self):
+		if not os.path.exists(self.filename):
+			return {}
+		with open(self.filename) as f:
+			try:
+				cookies = json.loads(f.read())
+			except ValueError:
+				logging.warning('Cookie file {0} is corrupted, ignored'.format(self.filename))
+				return {}
+		return cookies if isinstance(cookies, dict) else {}
+
+	def _write(self, cookies):
+		dirname = os.path.dirname(self.filename) or '.'
+		os.makedirs(dirname, exist_ok=True)
+		fd, tmpname = tempfile.mkstemp(prefix='.pygod.cookie.', dir=dirname)
+		try:
+			with os.fdopen(fd, 'w') as f:
+				f.write(json.dumps(cookies))
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmpname, self.filename)
+		except:
+			os.unlink(tmpname)
+			raise
+
+	def flush(self):
+		""" Writes unsaved changes immediately. Returns True if file was written. """
+		with self._lock:
+			if not self._changed:
+				return False
+			changed = {name: self._cookies[name] for name in self._changed}
+			self._changed = set()
+			self._dirty_since = self._flush_at = None
+		try:
+			with self._file_lock():
+				cookies = self._read()
+				cookies.update(changed)
+				self._write(cookies)
+		except Exception:
+			logging.exception('Failed to dump cookies to {0}'.format(self.filename))
+			with self._lock:
+				# Values changed meanwhile are already marked.
+				self._changed.update(name for name in changed if self._cookies.get(name) == changed[name])
+				now = time.monotonic()
+				self._dirty_since = self._dirty_since or now
+				self._flush_at = now + self.max_staleness
+			return False
+		with self._lock:
+			self.writes += 1
+			# Pick up cookies updated by other processes.
+			for name, value in cookies.items():
+				if name not in self._changed:
+					self._cookies[name] = value
+		logging.debug('Dumped {0} changed cookies to {1}'.format(len(changed), self.filename))
+		return True
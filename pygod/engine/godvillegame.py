@@ -1,5 +1,4 @@
 from urllib.parse import quote
-from urllib.request import urlopen
 from . import godvillenet
 
 class GodvilleGameCom(godvillenet.GodvilleNet):
@@ -17,5 +16,4 @@ class GodvilleGameCom(godvillenet.GodvilleNet):
 
 	def fetch_state(self, godname, token=None, custom_url=None):
 		url = custom_url or self.get_api_url(godname)
-		connection = urlopen(url)
-		return connection.read().decode('utf-8')
+		return self._fetch_if_modified(url)
@@ -1,9 +1,17 @@
 from urllib.parse import quote_plus
-from urllib.request import urlopen
+import urllib.error
+import hashlib
 import logging
+from . import http_pool
 
 class GodvilleNet:
 	ROOT = 'https://godville.net'
+	def __init__(self, root=None):
+		""" Root URL of the server could be overridden (e.g. for local mock server). """
+		if root:
+			self.ROOT = root.rstrip('/')
+		self.http = http_pool.shared_pool
+		self._validators = {} # url: (etag, last_modified, body_digest, body_size)
 	def id(self):
 		return 'godvillenet'
 	def name(self):
@@ -21,17 +29,44 @@ class GodvilleNet:
 	def get_token_generation_url(self):
 		return self.ROOT + '/user/profile'
 
+	def _fetch_if_modified(self, url, timeout=5):
+		""" Returns response body or None if it was not changed since the previous fetch.
+		Uses conditional request (ETag/Last-Modified) if server supports it,
+		otherwise compares digest of the body.
+		"""
+		etag, last_modified, digest, size = self._validators.get(url, (None, None, None, 0))
+		headers = {}
+		if etag:
+			headers['If-None-Match'] = etag
+		if last_modified:
+			headers['If-Modified-Since'] = last_modified
+		response = self.http.request(url, headers=headers, timeout=timeout)
+		if response.getcode() == 304:
+			logging.debug('{0}: not modified, saved {1} bytes of download'.format(url, size))
+			return None
+		body = response.read()
+		new_digest = hashlib.sha1(body).digest()
+		self._validators[url] = (response.getheader('ETag'), response.getheader('Last-Modified'), new_digest, len(body))
+		if new_digest == digest:
+			logging.debug('{0}: body is not changed, skipped parsing of {1} bytes'.format(url, len(body)))
+			return None
+		return body
+
 	def fetch_state(self, godname, token=None, custom_url=None):
+		""" Returns state as JSON bytes or None if state was not changed since the previous call. """
 		url = self.get_api_url(godname, token)
-		connection = urlopen(url, timeout=5)
-		if connection is None or connection.getcode() == 404:
+		try:
+			body = self._fetch_if_modified(url, timeout=5)
+		except urllib.error.HTTPError as e:
+			if e.code != 404:
+				raise
 			old_url = self.ROOT + '/gods/api/{0}.json'.format(self._quote_godname(godname))
 			logging.error(
 					'load_hero_state: new api url %s returned 404\n'
 					'                 will try old api url %s',
 					url, old_url)
-			connection = urlopen(old_url, timeout=5)
-		return connection.read().decode('utf-8')
+			body = self._fetch_if_modified(old_url, timeout=5)
+		return body
 
 class GodvilleNetMirror(GodvilleNet):
 	""" Mirror site, for cases when main site is not accessible directly. """
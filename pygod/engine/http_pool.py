@@ -0,0 +1,222 @@
+import sys
+import io
+import socket
+import threading
+import logging
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from . import resilience
+
+class Response:
+	""" Fully read HTTP response.
+	Mimics interface of urlopen() result that is used by engines.
+	"""
+	def __init__(self, url, status, reason, headers, body):
+		self.url = url
+		self.status = status
+		self.reason = reason
+		self.headers = headers
+		self.body = body
+	def getcode(self):
+		return self.status
+	def getheaders(self):
+		return self.headers.items()
+	def getheader(self, name, default=None):
+		return self.headers.get(name, default)
+	def read(self):
+		return self.body
+
+class ConnectionPool:
+	""" Keeps persistent (keep-alive) HTTP(S) connections per host
+	and reuses them between requests.
+	Stale connections (closed by server while idle) are re-established transparently.
+
+	Thread-safe: each request exclusively holds its connection,
+	so concurrent requests to the same host use separate connections.
+
+	Each host has circuit breaker (see resilience.CircuitBreaker),
+	so requests to the host that is down fail immediately without touching network.
+	Exceptions of failed requests have attribute 'breaker' with breaker of the host.
+	"""
+	MAX_IDLE_PER_HOST = 4
+	MAX_REDIRECTS = 5
+	USER_AGENT = 'Python-urllib/{0}.{1}'.format(*sys.version_info[:2])
+	# Errors that mean that idle keep-alive connection was dropped by the other side.
+	STALE_CONNECTION_ERRORS = (
+			http.client.RemoteDisconnected,
+			http.client.CannotSendRequest,
+			http.client.BadStatusLine,
+			ConnectionResetError,
+			BrokenPipeError,
+			)
+
+	def __init__(self, timeout=5, failure_threshold=3, reset_timeout=30, max_reset_timeout=900):
+		self.timeout = timeout
+		self.failure_threshold = failure_threshold
+		self.reset_timeout = reset_timeout
+		self.max_reset_timeout = max_reset_timeout
+		self._idle = {} # (scheme, host, port): [connection, ...]
+		self._breakers = {} # host: CircuitBreaker
+		self._lock = threading.Lock()
+		self.stats = {
+				'requests' : 0,
+				'reused' : 0,
+				'handshakes' : 0,
+				'reconnects' : 0,
+				'rejected' : 0,
+				}
+
+	def breaker(self, url):
+		""" Returns circuit breaker for the host of the given URL. """
+		host = urllib.parse.urlsplit(url).netloc.lower()
+		with self._lock:
+			if host not in self._breakers:
+				self._breakers[host] = resilience.CircuitBreaker(host,
+						failure_threshold=self.failure_threshold,
+						reset_timeout=self.reset_timeout,
+						max_reset_timeout=self.max_reset_timeout,
+						)
+			return self._breakers[host]
+
+	def _count(self, name):
+		with self._lock:
+			self.stats[name] += 1
+
+	def _connect(self, scheme, host, port, timeout):
+		proxy = urllib.request.getproxies().get(scheme)
+		if proxy and not urllib.request.proxy_bypass(host):
+			proxy = urllib.parse.urlsplit(proxy)
+			if scheme == 'https':
+				connection = http.client.HTTPSConnection(proxy.hostname, proxy.port, timeout=timeout)
+				connection.set_tunnel(host, port)
+			else:
+				connection = http.client.HTTPConnection(proxy.hostname, proxy.port, timeout=timeout)
+		elif scheme == 'https':
+			connection = http.client.HTTPSConnection(host, port, timeout=timeout)
+		else:
+			connection = http.client.HTTPConnection(host, port, timeout=timeout)
+		self._count('handshakes')
+		return connection
+
+	def _acquire(self, key, timeout):
+		with self._lock:
+			idle = self._idle.get(key)
+			if idle:
+				connection = idle.pop()
+				connection.timeout = timeout
+				if connection.sock is not None:
+					connection.sock.settimeout(timeout)
+				return connection, True
+		return self._connect(*key, timeout=timeout), False
+
+	def _release(self, key, connection):
+		with self._lock:
+			idle = self._idle.setdefault(key, [])
+			if len(idle) < self.MAX_IDLE_PER_HOST:
+				idle.append(connection)
+				return
+		connection.close()
+
+	def close(self):
+		""" Closes all idle connections. """
+		with self._lock:
+			idle, self._idle = self._idle, {}
+		for connections in idle.values():
+			for connection in connections:
+				connection.close()
+
+	def _request_once(self, url, method, headers, data, timeout):
+		parts = urllib.parse.urlsplit(url)
+		scheme = parts.scheme.lower()
+		port = parts.port or (443 if scheme == 'https' else 80)
+		key = (scheme, parts.hostname, port)
+		path = parts.path or '/'
+		if parts.query:
+			path += '?' + parts.query
+		if scheme == 'http' and urllib.request.getproxies().get(scheme) and not urllib.request.proxy_bypass(parts.hostname):
+			path = url
+
+		connection, reused = self._acquire(key, timeout)
+		while True:
+			try:
+				connection.request(method, path, body=data, headers=headers)
+				response = connection.getresponse()
+				body = response.read()
+				break
+			except self.STALE_CONNECTION_ERRORS as e:
+				connection.close()
+				if not reused:
+					raise urllib.error.URLError(e)
+				logging.debug('HTTP pool: stale connection to {0}, reconnecting: {1}'.format(parts.hostname, e))
+				self._count('reconnects')
+				connection, reused = self._connect(*key, timeout=timeout), False
+			except socket.timeout:
+				connection.close()
+				raise
+			except (OSError, http.client.HTTPException) as e:
+				connection.close()
+				raise urllib.error.URLError(e)
+		self._count('requests')
+		if reused:
+			self._count('reused')
+		if response.will_close:
+			connection.close()
+		else:
+			self._release(key, connection)
+		logging.debug('HTTP pool: {0} {1} -> {2} ({3} connection), stats: {4}'.format(
+			method, url, response.status, 'reused' if reused else 'new', self.stats,
+			))
+		return Response(url, response.status, response.reason, response.msg, body)
+
+	def request(self, url, method='GET', headers=None, data=None, timeout=None):
+		""" Performs request and returns fully read Response.
+		Follows redirects.
+		Raises urllib.error.HTTPError for HTTP error codes
+		and urllib.error.URLError for connection errors, just like urlopen().
+		If host is considered down, raises resilience.CircuitOpenError (subclass of URLError).
+		"""
+		breaker = self.breaker(url)
+		try:
+			breaker.before_request()
+		except resilience.CircuitOpenError as e:
+			self._count('rejected')
+			e.breaker = breaker
+			raise
+		try:
+			response = self._request(url, method, headers, data, timeout)
+		except Exception as e:
+			if resilience.is_transient(e):
+				breaker.record_failure(resilience.retry_after(e))
+			else:
+				breaker.record_answer()
+			e.breaker = breaker
+			raise
+		breaker.record_success()
+		return response
+
+	def _request(self, url, method, headers, data, timeout):
+		method = method.upper()
+		timeout = timeout or self.timeout
+		request_headers = {
+				'User-Agent' : self.USER_AGENT,
+				'Accept-Encoding' : 'identity',
+				}
+		request_headers.update(headers or {})
+		for _ in range(self.MAX_REDIRECTS + 1):
+			response = self._request_once(url, method, request_headers, data, timeout)
+			location = response.getheader('Location')
+			if response.status in (301, 302, 303, 307, 308) and location:
+				url = urllib.parse.urljoin(url, location)
+				if response.status == 303 or (response.status in (301, 302) and method == 'POST'):
+					method, data = 'GET', None
+				continue
+			break
+		if response.status >= 400:
+			raise urllib.error.HTTPError(response.url, response.status, response.reason, response.headers, io.BytesIO(response.body))
+		return response
+
+# Pool that is shared between all engine instances,
+# so monitoring several gods on the same server reuses the same connections.
+shared_pool = ConnectionPool()
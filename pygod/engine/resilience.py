@@ -0,0 +1,168 @@
+import time
+import random
+import logging
+import threading
+import urllib.error
+
+# HTTP codes that mean that server is overloaded or temporary unavailable.
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+
+def parse_retry_after(value):
+	""" Returns number of seconds from Retry-After header value (delay in seconds or HTTP date)
+	or None if value is missing or invalid.
+	"""
+	if not value:
+		return None
+	value = value.strip()
+	if value.isdigit():
+		return int(value)
+	import email.utils
+	try:
+		moment = email.utils.parsedate_to_datetime(value)
+	except (TypeError, ValueError):
+		return None
+	if moment is None:
+		return None
+	return max(0, moment.timestamp() - time.time())
+
+def retry_after(error):
+	""" Returns delay (seconds) requested by the server or circuit breaker for the failed request, or None. """
+	if isinstance(error, CircuitOpenError):
+		return error.retry_in
+	if isinstance(error, urllib.error.HTTPError) and error.code in RETRYABLE_CODES and error.headers is not None:
+		return parse_retry_after(error.headers.get('Retry-After'))
+	return None
+
+def is_transient(error):
+	""" Returns True if request could succeed when repeated later. """
+	if isinstance(error, CircuitOpenError):
+		return False
+	if isinstance(error, urllib.error.HTTPError):
+		return error.code in RETRYABLE_CODES
+	return isinstance(error, (urllib.error.URLError, OSError))
+
+class Backoff:
+	""" Exponential backoff with jitter:
+	delay is random within [limit/2, limit], where limit = min(max_delay, base * factor ** (attempt - 1)),
+	so clients that failed at the same moment do not retry at the same moment.
+	"""
+	def __init__(self, base=1.0, factor=2.0, max_delay=600, rng=None):
+		self.base = base
+		self.factor = factor
+		self.max_delay = max_delay
+		self.rng = rng or random.Random()
+	def delay(self, attempt):
+		""" Returns delay before given attempt (1 for the first retry). """
+		if attempt <= 0:
+			return 0
+		limit = min(self.max_delay, self.base * self.factor ** min(attempt - 1, 64))
+		return self.rng.uniform(limit / 2, limit)
+
+class CircuitOpenError(urllib.error.URLError):
+	""" Request was not sent because host is considered down. """
+	def __init__(self, host, retry_in):
+		super().__init__('{0} is not available, next attempt in {1:.0f} s'.format(host, retry_in))
+		self.host = host
+		self.retry_in = retry_in
+
+class CircuitBreaker:
+	""" Stops requests to the host after failure_threshold consequent failures.
+
+	States:
+	- closed: requests are allowed;
+	- open: requests fail immediately with CircuitOpenError until reset timeout is passed;
+	- half-open: single trial request is allowed, its result closes or opens the circuit again.
+	Reset timeout grows exponentially with each failed trial (up to max_reset_timeout).
+	Retry-After delay requested by the server opens the circuit immediately for that time.
+	"""
+	CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+	def __init__(self, host, failure_threshold=3, reset_timeout=30, max_reset_timeout=900):
+		self.host = host
+		self.failure_threshold = failure_threshold
+		self.backoff = Backoff(base=reset_timeout, max_delay=max_reset_timeout)
+		self.state = self.CLOSED
+		self.failures = 0
+		self.trips = 0
+		self.retry_at = None # Monotonic time when the next trial is allowed.
+		self._lock = threading.Lock()
+
+	def retry_in(self):
+		""" Returns number of seconds until requests are allowed again. """
+		if self.retry_at is None:
+			return 0
+		return max(0, self.retry_at - time.monotonic())
+
+	def before_request(self):
+		""" Raises CircuitOpenError if request should not be sent. """
+		with self._lock:
+			if self.state == self.CLOSED:
+				return
+			if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+				logging.info('Circuit breaker for {0}: trying to reconnect'.format(self.host))
+				self.state = self.HALF_OPEN
+				return
+			raise CircuitOpenError(self.host, self.retry_in())
+
+	def record_success(self):
+		with self._lock:
+			if self.state != self.CLOSED:
+				logging.info('Circuit breaker for {0}: host is available again'.format(self.host))
+			self.state = self.CLOSED
+			self.failures = 0
+			self.trips = 0
+			self.retry_at = None
+
+	def record_answer(self):
+		""" Host answered with error that is not transient (e.g. 404):
+		it is reachable, but request did not succeed, so consequent failures are still counted.
+		"""
+		with self._lock:
+			if self.state == self.HALF_OPEN:
+				# Trial request has reached the host.
+				logging.info('Circuit breaker for {0}: host is available again'.format(self.host))
+				self.state = self.CLOSED
+				self.retry_at = None
+
+	def record_failure(self, retry_after=None):
+		with self._lock:
+			self.failures += 1
+			if self.state != self.HALF_OPEN and self.failures < self.failure_threshold and retry_after is None:
+				return
+			if retry_after is not None:
+				# Server knows better when it is ready.
+				delay = retry_after
+			else:
+				self.trips += 1
+				delay = self.backoff.delay(self.trips)
+			self.state = self.OPEN
+			self.retry_at = time.monotonic() + delay
+			logging.warning('Circuit breaker for {0}: opened after {1} failures, next attempt in {2:.0f} s'.format(
+				self.host, self.failures, delay,
+				))
+
+class RateLimiter:
+	""" Token bucket: allows bursts of up to capacity requests,
+	otherwise no more than rate requests per second.
+	Thread-safe: concurrent callers reserve tokens in turn and wait for their own slot.
+	"""
+	def __init__(self, rate, capacity=1):
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.updated = time.monotonic()
+		self.waited = 0.0 # Total time spent waiting for tokens.
+		self._lock = threading.Lock()
+	def acquire(self):
+		""" Blocks until request is allowed. Returns time spent waiting. """
+		with self._lock:
+			now = time.monotonic()
+			self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+			self.updated = now
+			# Token could be borrowed from the future, so next callers will wait longer.
+			self.tokens -= 1
+			delay = -self.tokens / self.rate if self.tokens < 0 else 0
+			self.waited += delay
+		if delay:
+			time.sleep(delay)
+		return delay
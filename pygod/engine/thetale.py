@@ -1,13 +1,17 @@
 import os, sys, platform
 import time, datetime
-import urllib.request
+import urllib.error
 import urllib.parse
 import http.cookies
 import itertools
 import json
 import random, string
 import logging
+import concurrent.futures
 from collections import Counter
+from . import http_pool
+from . import resilience
+from . import cookie_store
 
 class API:
 	""" Very basic The Tale API wrapper (mostly for GET requests).
@@ -25,21 +29,53 @@ class API:
 	APP_NAME = 'PyGod'
 	BASE_URL = 'https://the-tale.org'
 	REQUEST_DELAY = 1.0 # seconds
+	# Shared by all API instances, as they talk to the same server.
+	# Short bursts are allowed, so independent requests of a single update could be sent at once.
+	rate_limiter = resilience.RateLimiter(rate=1.0 / REQUEST_DELAY, capacity=2)
+	MAX_WORKERS = 3
+	ACTION_IN_TOWN = 5
+	# Fields of the state that do not depend on the game data.
+	STATIC_FIELDS = {
+		"motto": "", # TODO Meaningless in The Tale.
+		"clan_position": "", # TODO Cannot be directly fetched in The Tale.
+		"bricks_cnt": 0, # TODO Meaningless in The Tale.
+		"wood_cnt": 0, # TODO Meaningless in The Tale.
+		"temple_completed_at": None, # TODO Meaningless in The Tale.
+		"ark_completed_at": None, # TODO Meaningless in The Tale.
+		"savings_completed_at": None, # TODO Meaningless in The Tale.
+		"ark_f": 0, # TODO Meaningless in The Tale.
+		"ark_m": 0, # TODO Meaningless in The Tale.
+		"arena_won": 0, # TODO Meaningless in The Tale.
+		"arena_lost": 0, # TODO Meaningless in The Tale.
+		"savings": "0", # TODO Meaningless in The Tale.
+		"t_level": None, # TODO Meaningless in The Tale.
+		"shop_name": None, # TODO Meaningless in The Tale.
+		"boss_name": None, # TODO Meaningless in The Tale.
+		"boss_power": None, # TODO Meaningless in The Tale.
+		"book_at": None, # TODO Meaningless in The Tale.
+		"souls_percent": None, # TODO Meaningless in The Tale.
+		"godpower": 0, # TODO Meaningless in The Tale.
+		"distance": 0, # TODO Meaningless in The Tale. Have cartesian coords instead.
+		"fight_type": None, # TODO Meaningless in The Tale.
+		}
+	MAX_ATTEMPTS = 3
+	MAX_RETRY_DELAY = 5.0 # seconds
 
-	def __init__(self):
+	def __init__(self, base_url=None):
+		if base_url:
+			self.BASE_URL = base_url.rstrip('/')
 		self.cookiefile = os.path.join(
 				os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
 				'pygod.cookie.json',
 				)
-		if os.path.exists(self.cookiefile):
-			with open(self.cookiefile) as f:
-				self.cookies = json.loads(f.read())
-		else:
-			self.cookies = {
-				'sessionid': None,
-				'csrftoken' : ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(32)),
-				}
+		self.cookies = cookie_store.CookieStore(self.cookiefile, defaults={
+			'sessionid': None,
+			'csrftoken' : ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(32)),
+			})
 		self.client_id = '{0}-{1}'.format(self.APP_NAME, '.'.join(map(str, self.VERSION)))
+		self.http = http_pool.shared_pool
+		self.retry_backoff = resilience.Backoff(base=1.0, max_delay=self.MAX_RETRY_DELAY)
+		self.workers = concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
 
 		self.account_id = None
 		self.last_turn = None
@@ -48,19 +84,15 @@ class API:
 		self.card_info = {}
 
 		self.old_state = None
-	def _dump_cookies(self):
-		try:
-			with open(self.cookiefile, 'w') as f:
-				f.write(json.dumps(self.cookies))
-		except:
-			logging.exception('Failed to dump cookies to {0}'.format(self.cookiefile))
+		self._state_key = None # Sources of the old state: (turn, game mode, account info update, card info update).
+		self._derived_fields = {} # Group of fields: (key of the sources, fields).
 	def _run_request(self, path, method='GET', api_version=None, post_params=None, **query_params):
 		method = method.upper()
 		api_version = api_version or '1.0'
 
 		headers = {
 				'X-CSRFToken' : self.cookies['csrftoken'],
-				'Referer': 'https://the-tale.org/',
+				'Referer': self.BASE_URL + '/',
 				'Cookie': '; '.join('='.join((k, v)) for k,v in self.cookies.items() if v is not None),
 				}
 		query_params = urllib.parse.urlencode({
@@ -69,28 +101,28 @@ class API:
 					})
 		if method == 'POST' and post_params:
 			post_params = urllib.parse.urlencode(list(post_params.items())).encode('ascii')
-		request = urllib.request.Request(self.BASE_URL + path + '?' + query_params,
-				data=post_params,
-				headers=headers,
-				method=method,
-				)
-		logging.debug('Full URL: {0}'.format(request.get_full_url()))
-		logging.debug('Request headers: {0}'.format(request.header_items()))
+		if post_params:
+			headers['Content-Type'] = 'application/x-www-form-urlencoded'
+		url = self.BASE_URL + path + '?' + query_params
+		logging.debug('Full URL: {0}'.format(url))
+		logging.debug('Request headers: {0}'.format(headers))
 
-		retries_left = 5
-		errors = []
-		while retries_left:
-			retries_left -= 1
+		attempt = 0
+		while True:
+			waited = self.rate_limiter.acquire()
+			if waited:
+				logging.debug('Rate limit: waited {0:.3f} s before {1}'.format(waited, path))
 			try:
-				response = urllib.request.urlopen(request, timeout=5)
+				response = self.http.request(url, method=method, headers=headers, data=post_params, timeout=5)
 				break
 			except Exception as e:
-				if retries_left > 0:
-					errors.append(e)
-					continue
-				for index, error in enumerate(errors):
-					logging.warning('Retry #{0}: {1}'.format(index, error))
-				raise
+				# Long outages are handled by caller's schedule, only short glitches are retried here.
+				attempt += 1
+				delay = max(self.retry_backoff.delay(attempt), resilience.retry_after(e) or 0)
+				if attempt >= self.MAX_ATTEMPTS or not resilience.is_transient(e) or delay > self.MAX_RETRY_DELAY:
+					raise
+				logging.warning('Retry #{0} in {1:.1f} s: {2}'.format(attempt, delay, e))
+				time.sleep(delay)
 
 		logging.debug('Response headers: {0}'.format(response.getheaders()))
 		new_cookies = {}
@@ -103,9 +135,9 @@ class API:
 					continue
 				new_cookies[c.key] = c.value
 		logging.debug('New cookies: {0}'.format(new_cookies))
-		self.cookies.update(new_cookies)
-		logging.debug('Updated cookies: {0}'.format(self.cookies))
-		self._dump_cookies()
+		# Cookie store is thread-safe and saves only changed cookies in background.
+		if self.cookies.update(new_cookies):
+			logging.debug('Updated cookies: {0}'.format(dict(self.cookies.items())))
 		response = json.loads(response.read())
 		logging.debug('Full response: {0}'.format(response))
 		if response.get('deprecated', False):
@@ -133,7 +165,6 @@ class API:
 			logging.debug('Authorization: Refused!')
 			raise self.Error('Authorisation refused by server.')
 		if auth_state['state'] == AUTH_WAS_NOT_REQUESTED:
-			time.sleep(self.REQUEST_DELAY)
 			auth_request = self._run_request('/accounts/third-party/tokens/api/request-authorisation', api_version='1.0', method='POST',
 					post_params={
 						'application_name' : self.APP_NAME,
@@ -159,77 +190,99 @@ class API:
 
 		ACCOUNT_INFO_REFRESH_RATE = 30 * 60 # sec
 		CARD_INFO_REFRESH_RATE = 10 * 60 # sec
-		ACTION_IN_TOWN = 5
 
+		# Sub-requests do not depend on each other, so they are sent in parallel
+		# (still limited by rate_limiter).
+		started = time.monotonic()
 		if not self.last_turn:
 			logging.debug('Last turn was not found, performing full refresh...')
-			game_info = self._run_request('/game/api/info', account=self.account_id,
+			game_info = self.workers.submit(self._run_request, '/game/api/info', account=self.account_id,
 					api_version='1.10')
 		else:
 			logging.debug('Performing refresh since last turn ({0})...'.format(self.last_turn))
-			game_info = self._run_request('/game/api/info', account=self.account_id,
+			game_info = self.workers.submit(self._run_request, '/game/api/info', account=self.account_id,
 					client_turns=self.last_turn,
 					api_version='1.10')
-		account = game_info['account']
-		if not account or not account['hero']:
-			logging.debug('Game account info is not present, performing authorization (force={0})...'.format(not bool(self.old_state)))
-			self.authorize(force=not bool(self.old_state))
-			return self.old_state
-		self.hero_info.update(account['hero'])
-		self.last_turn = game_info['turn']['number']
-
+		account_info, card_info = None, None
 		if not self.account_info or self.account_info['_last_update'] + ACCOUNT_INFO_REFRESH_RATE < now:
 			logging.debug('Refreshing account info...')
-			time.sleep(self.REQUEST_DELAY)
-			self.account_info = self._run_request('/accounts/{0}/api/show'.format(self.account_id),
+			account_info = self.workers.submit(self._run_request, '/accounts/{0}/api/show'.format(self.account_id),
 					api_version='1.0')
-			self.account_info['_last_update'] = now
-
 		if not self.card_info or self.card_info['_last_update'] + CARD_INFO_REFRESH_RATE < now:
 			logging.debug('Refreshing card info...')
-			time.sleep(self.REQUEST_DELAY)
-			self.card_info = self._run_request('/game/cards/api/get-cards',
+			card_info = self.workers.submit(self._run_request, '/game/cards/api/get-cards',
 					api_version='2.0')
-			self.card_info['_last_update'] = now
+		requests = len([future for future in (game_info, account_info, card_info) if future])
+
+		try:
+			game_info = game_info.result()
+			account = game_info['account']
+			if not account or not account['hero']:
+				logging.debug('Game account info is not present, performing authorization (force={0})...'.format(not bool(self.old_state)))
+				self.authorize(force=not bool(self.old_state))
+				return self.old_state
+			# New dict each turn, so previous states (which refer to hero info) stay intact.
+			self.hero_info = dict(self.hero_info, **account['hero'])
+			self.last_turn = game_info['turn']['number']
 
+			if account_info:
+				self.account_info = account_info.result()
+				self.account_info['_last_update'] = now
+			if card_info:
+				self.card_info = card_info.result()
+				self.card_info['_last_update'] = now
+		finally:
+			# Results are not needed if game info failed or authorization is requested.
+			for future in (account_info, card_info):
+				self._discard(future)
+		logging.debug('Hero state: {0} requests in {1:.3f} s'.format(requests, time.monotonic() - started))
+
+		# Derived fields are recomputed only when their source is changed:
+		# hero info is changed with game turn, account and card info - when they are refreshed.
+		state_key = (self.last_turn, game_info["mode"], self.account_info['_last_update'], self.card_info['_last_update'])
+		if self._state_key == state_key and self.old_state:
+			logging.debug('Turn {0}: nothing is changed, reusing previous state'.format(self.last_turn))
+			return self.old_state
 		state = {
 				"_hero_info" : self.hero_info,
 				"_account_info" : self.account_info,
 				"_card_info" : self.card_info,
+				}
+		state.update(self.STATIC_FIELDS)
+		state.update(self._derived('hero', (self.last_turn, game_info["mode"]), lambda: self._hero_fields(game_info["mode"])))
+		state.update(self._derived('account', self.account_info['_last_update'], self._account_fields))
+		state.update(self._derived('cards', self.card_info['_last_update'], self._card_fields))
+		self._state_key = state_key
+		self.old_state = state
+		return state
+	@staticmethod
+	def _discard(future):
+		""" Cancels request if it was not started yet, otherwise its result (or error) is consumed and ignored. """
+		if future is not None and not future.cancel():
+			future.add_done_callback(lambda future: future.exception())
+	def _derived(self, name, key, compute):
+		""" Returns fields computed by compute() if key was changed since the last call, otherwise cached ones. """
+		cached_key, fields = self._derived_fields.get(name, (None, None))
+		if fields is None or cached_key != key:
+			fields = compute()
+			self._derived_fields[name] = (key, fields)
+		return fields
+	def _hero_fields(self, game_mode):
+		fields = {
 			"name": self.hero_info['base']['name'],
-			"godname": self.account_info['name'],
 			"gender": ["male", "female"][self.hero_info['base']['gender']],
 			"level": self.hero_info['base']['level'],
 			"max_health": self.hero_info['base']['max_health'],
 			"inventory_max_num": self.hero_info['secondary']['max_bag_size'],
-			"motto": "", # TODO Meaningless in The Tale.
-			"clan": (self.account_info['clan'] or {}).get('name'),
-			"clan_position": "", # TODO Cannot be directly fetched in The Tale.
 			"alignment": ' '.join((
 				self.hero_info["habits"]["honor"]["verbose"],
 				self.hero_info["habits"]["peacefulness"]["verbose"],
 				)),
-			"bricks_cnt": 0, # TODO Meaningless in The Tale.
-			"wood_cnt": 0, # TODO Meaningless in The Tale.
-			"temple_completed_at": None, # TODO Meaningless in The Tale.
 			"pet": {
 				"pet_name": "",
 				"pet_class": self.hero_info['companion']['name'],
 				"pet_level": self.hero_info['companion']['experience'],
 			} if self.hero_info['companion'] else {},
-			"ark_completed_at": None, # TODO Meaningless in The Tale.
-			"savings_completed_at": None, # TODO Meaningless in The Tale.
-			"ark_f": 0, # TODO Meaningless in The Tale.
-			"ark_m": 0, # TODO Meaningless in The Tale.
-			"arena_won": 0, # TODO Meaningless in The Tale.
-			"arena_lost": 0, # TODO Meaningless in The Tale.
-			"savings": "0", # TODO Meaningless in The Tale.
-			"t_level": None, # TODO Meaningless in The Tale.
-			"shop_name": None, # TODO Meaningless in The Tale.
-			"boss_name": None, # TODO Meaningless in The Tale.
-			"boss_power": None, # TODO Meaningless in The Tale.
-			"book_at": None, # TODO Meaningless in The Tale.
-			"souls_percent": None, # TODO Meaningless in The Tale.
 			"health": self.hero_info['base']['health'],
 			"quest_progress": int(100/len(list(itertools.chain.from_iterable(
 				quest["line"]
@@ -238,13 +291,10 @@ class API:
 				if quest["line"][0]["type"] != "no-quest"
 				)))),
 			"exp_progress": int(100 * self.hero_info['base']['experience'] / self.hero_info['base']['experience_to_level']),
-			"godpower": 0, # TODO Meaningless in The Tale.
 			"gold_approx": str(self.hero_info['base']['money']),
 			"diary_last": (self.hero_info['messages'] or [(None, None, "...")])[-1][2],
-			"town_name": str((self.hero_info["action"]["data"], self.hero_info["action"]["description"])) if self.hero_info["action"]["type"] == ACTION_IN_TOWN else None,
-			"distance": 0, # TODO Meaningless in The Tale. Have cartesian coords instead.
-			"arena_fight": game_info["mode"] == 'pvp',
-			"fight_type": None, # TODO Meaningless in The Tale.
+			"town_name": str((self.hero_info["action"]["data"], self.hero_info["action"]["description"])) if self.hero_info["action"]["type"] == self.ACTION_IN_TOWN else None,
+			"arena_fight": game_mode == 'pvp',
 			"inventory_num": len(self.hero_info['bag']),
 			"quest": sorted([
 				quest["line"][-1]
@@ -253,6 +303,18 @@ class API:
 				if quest["line"][0]["type"] != "no-quest"
 				], key=lambda quest: 1 if quest["type"] == 'next-spending' else 0,
 				)[0]["name"],
+		}
+		if not self.hero_info['messages']:
+			logging.debug('No history messages. Considering expired.')
+			fields['expired'] = True
+		return fields
+	def _account_fields(self):
+		return {
+			"godname": self.account_info['name'],
+			"clan": (self.account_info['clan'] or {}).get('name'),
+		}
+	def _card_fields(self):
+		return {
 			"activatables": [
 					('{0} (x{1})' if amount > 1 else '{0}').format(name, amount)
 					for name, amount
@@ -265,18 +327,19 @@ class API:
 					],
 		}
 
-		if not self.hero_info['messages']:
-			logging.debug('No history messages. Considering expired.')
-			state['expired'] = True
-		self.old_state = state
-		return state
-
 class TheTale:
 	ROOT = 'https://the-tale.org'
-	def __init__(self):
-		self.api = API()
+	# Server processes hourly jobs at the beginning of each hour (minutes, local time),
+	# requests during that time are slow or fail.
+	CRON_WINDOW = (59, 6)
+	def __init__(self, root=None):
+		""" Root URL of the server could be overridden (e.g. for local mock server). """
+		if root:
+			self.ROOT = root.rstrip('/')
+		self.api = API(base_url=self.ROOT)
 		self.token_generation_url = None
 		self._prev_error = None
+		self._last_state = None
 	def id(self):
 		return 'thetale'
 	def name(self):
@@ -288,6 +351,18 @@ class TheTale:
 		return self.token_generation_url
 
 	def fetch_state(self, godname, token=None, custom_url=None):
+		""" Returns state as dict (shared with API, should not be modified)
+		or None if state was not changed since the previous call.
+		"""
+		state = self._fetch_state(godname)
+		if state is self._last_state:
+			# API returns the same object when game turn was not changed.
+			logging.debug('Game turn is not changed, state is not changed')
+			return None
+		self._last_state = state
+		return state
+	def _fetch_state(self, godname):
+		""" Returns state dict. """
 		# TODO Does not need godname actually,
 		# because API's session is automatically tied to the account
 		# once user is confirmed authorization for the informer app.
@@ -311,7 +386,7 @@ class TheTale:
 			# Otherwise fall back to the previous valid state.
 			if not self.api.old_state:
 				raise
-			return json.dumps(self.api.old_state)
+			return self.api.old_state
 		except API.AuthRequested as e:
 			self.token_generation_url = e.auth_page or self.token_generation_url
 			logging.warning('Token expired. Authorization requested: {0}'.format(self.token_generation_url))
@@ -323,4 +398,4 @@ class TheTale:
 					'alignment': '',
 					'gold_approx': '',
 					}
-		return json.dumps(state)
+		return state
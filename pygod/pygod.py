@@ -1,32 +1,41 @@
 #!/usr/bin/python3
 
 import sys, os
-import time, datetime
+import time
 import argparse
-import json
 import curses
 import logging
 import configparser
-import subprocess
-import urllib, socket
-from urllib.request import urlopen
-from urllib.parse import quote_plus
-import gettext
+import urllib.error, socket
+import concurrent.futures
+import selectors, signal
 
 from . import Colors
 from . import WarningWindow
 from . import MainWindow
+from . import SummaryWindow
 from . import Rule
 from . import utils
 from .core.utils import tr
+from .core import default_compositor
+from .core import default_wrap_cache
+from .core import default_metrics
+from .core import default_tracer
+from .core import StateHistory
+from .core.history import apply_delta
+from .core import backend
+from .core import Events, StateDiff, EventStream
+from .core import PollingScheduler
+from .core import NotificationDispatcher
+from .core import Diary
+from .core.scheduler import parse_cron_window
+from .windows import main_window
+from .windows import DiarySearchWindow
+from .windows import StatsWindow
+from .startup import StartupProfile
 
 from . import engine as pygod_engine
-KNOWN_ENGINES = { # TODO auto-detect available engines
-        'godvillenet' : pygod_engine.godvillenet.GodvilleNet,
-        'godvillemirror' : pygod_engine.godvillenet.GodvilleNetMirror,
-        'godvillegame' : pygod_engine.godvillegame.GodvilleGameCom,
-        'thetale' : pygod_engine.thetale.TheTale,
-        }
+from .engine import resilience
 
 def load_rule_module(module_filename):
     ''' Loading custom rules (see example rules.py for usage).
@@ -52,51 +61,129 @@ def load_rule_module(module_filename):
 # Basic custom rules.
 CUSTOM_DATA_RULE_MODULE = os.path.join(utils.get_data_dir(), "rules.py")
 CUSTOM_LOCAL_RULE_MODULE = os.path.join(utils.get_config_local_dir(), "rules.py")
-CUSTOM_RULES = load_rule_module(CUSTOM_DATA_RULE_MODULE) + load_rule_module(CUSTOM_LOCAL_RULE_MODULE)
+_custom_rules = None
+def custom_rules():
+    ''' Returns custom rules, modules are loaded on the first call. '''
+    global _custom_rules
+    if _custom_rules is None:
+        _custom_rules = load_rule_module(CUSTOM_DATA_RULE_MODULE) + load_rule_module(CUSTOM_LOCAL_RULE_MODULE)
+    return _custom_rules
 
 def load_hero_state(engine, godname, token=None, filename=None, custom_url=None):
+    ''' Returns parsed hero state
+    or None if engine reports that state was not changed since the previous fetch.
+    Engine may return state as JSON text (str or bytes) or as already parsed mapping.
+    '''
     state = None
     if filename:
         with open(filename, 'rb') as f:
-            state = f.read().decode('utf-8')
+            state = f.read()
     else:
         state = engine.fetch_state(godname, token, custom_url=custom_url)
-    state = json.loads(state)
+        if state is None:
+            default_metrics.count('fetches_not_modified')
+            return None
+    if isinstance(state, (str, bytes, bytearray)):
+        default_metrics.count('fetch_bytes', len(state))
+    with default_metrics.timer('parse'):
+        state = parse_hero_state(state)
     if 'health' not in state:
         if token:
             state['token_expired'] = True
         # Public API only, some keys might be not available.
-        default_state = {
-                'max_health': 1,
-                'health': 1,
-                'exp_progress': '...',
-                'distance': '...',
-                'level': 1,
-                'inventory_num': '...',
-                'quest': tr('Generate secret token on {token_url}').format(token_url=engine.get_token_generation_url()),
-                'quest_progress': '...',
-                'diary_last': '',
-                'arena_won': 0,
-                'arena_lost': 0,
-                'clan': '',
-                'clan_position': '',
-                'inventory_max_num': 0,
-                'inventory': [],
-                'motto': '',
-                }
+        default_state = default_hero_state(engine)
         default_state.update(state)
         state = default_state
     return state
 
-class Monitor:
-    def __init__(self, engine, args):
+def parse_hero_state(state):
+    ''' Returns new state dict from JSON text (str or bytes) or mapping.
+    Mapping is copied shallowly: state is updated in place later,
+    while nested values are shared with the engine and must not be modified.
+    '''
+    if isinstance(state, (str, bytes, bytearray)):
+        import json
+        return json.loads(state)
+    return dict(state)
+
+def default_hero_state(engine):
+    ''' Values for keys that are required to display hero state. '''
+    return {
+            'max_health': 1,
+            'health': 1,
+            'exp_progress': '...',
+            'distance': '...',
+            'level': 1,
+            'inventory_num': '...',
+            'quest': tr('Generate secret token on {token_url}').format(token_url=engine.get_token_generation_url()),
+            'quest_progress': '...',
+            'diary_last': '',
+            'arena_won': 0,
+            'arena_lost': 0,
+            'clan': '',
+            'clan_position': '',
+            'inventory_max_num': 0,
+            'inventory': [],
+            'motto': '',
+            }
+
+def load_god_list(filename):
+    ''' Loads list of gods to monitor from a text file.
+    One god per line, optionally followed by secret token: "God Name = TOKEN".
+    Empty lines and lines started with '#' are ignored.
+    Returns list of pairs (god_name, token).
+    '''
+    gods = []
+    with open(filename, 'rb') as f:
+        for line in f.read().decode('utf-8').splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            token = None
+            if '=' in line:
+                line, token = (part.strip() for part in line.rsplit('=', 1))
+            gods.append((line, token or None))
+    return gods
+
+class GodSession:
+    ''' State of a single monitored god: engine instance, last fetched state and rules. '''
+    def __init__(self, engine, godname, token=None, custom_url=None):
         self.engine = engine
+        self.godname = godname
+        self.token = token
+        self.custom_url = custom_url
+        self.state = {}
+        self.prev_state = None
+        self.error = None
+        self.rules = []
+        self.expired_on_start = False
+        self.processing_time = 0 # Time spent on rules and rendering for the last state change.
+        self.history = None
+        self.diary = Diary() # In-memory by default, see Diary.for_god().
+        self.inventory_order = main_window.InventoryOrder()
+        self.diff = None # StateDiff of the last fetch.
+        self.stable_fetches = 0 # Number of consequent fetches without changes.
+        self.next_update = 0 # Monotonic time of the next fetch (None if states are fetched by daemon).
+        self.poll_interval = 0
+        self.placeholder = False # State was not fetched yet, placeholder is displayed.
+        self.failures = 0 # Number of consequent failed fetches.
+        self.retry_after = None # Delay requested by server for the next attempt (seconds).
+        self.breaker = None # Circuit breaker of the host that failed.
+        self.pending = None # Future of the fetch that is in progress.
+
+class Monitor:
+    def __init__(self, sessions, args, stdscr=None):
+        ''' If stdscr is specified, it is used instead of real terminal (e.g. NullWindow for headless mode). '''
+        self.sessions = sessions
+        self.current = 0
+        self.show_summary = False
+        self._rendered_session = None # Session which state is currently shown on the main window.
+        self._rendered_diff = None # Last diff of that session that was applied to the main window.
         self.controls = {}
-        self.init_windows()
-        self.godname = args.god_name
+        self.init_windows(stdscr)
         self.dump_file = args.state
-        self.state = {}
-        self.notification_command = args.notification_command
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.max_requests))
+        self.notifier = NotificationDispatcher(args.notification_command, **args.notifications)
         self.report_connection_errors = args.report_connection_errors
         self.notify_only_when_active = args.notify_only_when_active
         self.notify_on_start = args.notify_on_start
@@ -105,13 +192,68 @@ class Monitor:
         self.refresh_command = args.refresh_command
         self.autorefresh = args.autorefresh
         self.open_browser_on_start = args.open_browser_on_start
-        self.token = args.token
-        self.custom_url = args.custom_url
-        self.rules = []
-        self.prev_state = None
-        self.error = None
+        self.compositor = default_compositor
+        self.compositor.max_fps = args.max_fps
+        self.events = EventStream()
+        self.events.subscribe(Events.DIARY_ENTRY, self.on_diary_entry)
+        self.events.subscribe(Events.CHANGED, self.on_state_changed)
+        self.events.subscribe(None, self.log_event)
+        self.scheduler = PollingScheduler(**args.scheduler)
+        self.startup_profile = None # If set, main loop stops after the first frame.
+        self.server = None # StateServer in daemon mode.
+        self.client = None # StateClient when attached to daemon.
+        self.metrics = default_metrics
+        self.metrics_file = args.prometheus_file
+        self.metrics_interval = args.prometheus_interval
+        self.init_metrics()
+
+    def init_metrics(self):
+        from .engine import http_pool
+        compositor = self.compositor
+        self.metrics.add_source('http', lambda: http_pool.shared_pool.stats)
+        self.metrics.add_source('compositor', lambda: {
+                'frames' : compositor.frames,
+                'windows_staged' : compositor.windows_staged,
+                'bytes_staged' : compositor.bytes_staged,
+                })
+        self.metrics.add_source('scheduler', lambda: self.scheduler.stats)
+        self.metrics.add_source('wrap_cache', lambda: default_wrap_cache.stats)
+        self.metrics.add_source('notifier', lambda: self.notifier.stats)
+        self.metrics.add_source('inventory_order', lambda: {
+                name : sum(session.inventory_order.stats[name] for session in self.sessions)
+                for name in ('hits', 'incremental', 'full')
+                })
+        # Only The Tale engine limits rate of requests (single limiter is shared by all API instances).
+        rate_limiters = {getattr(getattr(session.engine, 'api', None), 'rate_limiter', None) for session in self.sessions}
+        rate_limiters.discard(None)
+        if rate_limiters:
+            self.metrics.add_source('rate_limiter', lambda: {
+                    'waited' : sum(rate_limiter.waited for rate_limiter in rate_limiters),
+                    })
+        self.metrics.add_source('daemon', lambda: self.server.stats if self.server is not None else {})
+
+    def write_metrics(self):
+        try:
+            self.metrics.write_prometheus(self.metrics_file)
+        except OSError as e:
+            logging.error('%s: failed to write metrics to %s: %s',
+                          self.write_metrics.__name__,
+                          self.metrics_file, e)
+
+    @property
+    def session(self):
+        return self.sessions[self.current]
+
+    @property
+    def engine(self):
+        return self.session.engine
+
+    @property
+    def state(self):
+        return self.session.state
 
     def init_curses(self):
+        self.init_event_sources()
         curses.noecho()
         try:
             curses.cbreak()
@@ -121,31 +263,143 @@ class Monitor:
 
         self.init_colors()
         self.init_keys()
-        self.init_status_checkers()
+        if self.client is None:
+            # Otherwise rules are checked by daemon.
+            self.init_status_checkers()
 
     def finalize(self):
-        curses.echo()
+        if not self.headless:
+            curses.echo()
+            try:
+                curses.nocbreak()
+            except curses.error:
+                logging.error('curses error: cbreak returned ERR, probably invalid terminal. Try screen or tmux.')
+                pass
+            curses.endwin()
+        self.executor.shutdown(wait=False)
+        if self.metrics_file:
+            self.write_metrics()
+        if self.server is not None:
+            self.server.close()
+        if self.client is not None:
+            self.client.close()
+        self.notifier.close()
+        for session in self.sessions:
+            if session.history is not None:
+                session.history.close()
+            session.diary.close()
+        self.finalize_event_sources()
+
+    def init_event_sources(self, read_keys=True):
+        ''' Main loop sleeps on selector until user input,
+        terminal resize (SIGWINCH, delivered through self-pipe)
+        or the next scheduled deadline.
+        '''
+        self.selector = selectors.DefaultSelector()
+        if read_keys:
+            self.selector.register(sys.stdin.fileno(), selectors.EVENT_READ, self.handle_keys)
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        self.selector.register(self._wakeup_read, selectors.EVENT_READ, self.handle_wakeup)
+        self._resized = False
+        self._prev_wakeup_fd = signal.set_wakeup_fd(self._wakeup_write)
+        self._prev_sigwinch_handler = None
+        if not self.headless:
+            # Headless monitor (daemon) has no terminal to resize.
+            self._prev_sigwinch_handler = signal.signal(signal.SIGWINCH, self._on_sigwinch)
+
+    def finalize_event_sources(self):
+        if self._prev_sigwinch_handler is not None:
+            signal.signal(signal.SIGWINCH, self._prev_sigwinch_handler)
+        signal.set_wakeup_fd(self._prev_wakeup_fd)
+        self.selector.close()
+        wakeup_write, self._wakeup_write = self._wakeup_write, None
+        os.close(self._wakeup_read)
+        os.close(wakeup_write)
+
+    def _on_sigwinch(self, signum, frame):
+        # Actual handling is performed in main loop when wakeup fd is read.
+        self._resized = True
+
+    def handle_wakeup(self):
         try:
-            curses.nocbreak()
-        except curses.error:
-            logging.error('curses error: cbreak returned ERR, probably invalid terminal. Try screen or tmux.')
+            while os.read(self._wakeup_read, 512):
+                pass
+        except BlockingIOError:
             pass
-        curses.endwin()
+        if self._resized:
+            self.handle_resize()
+        self.handle_fetched_states()
+
+    def handle_resize(self):
+        self._resized = False
+        if self.headless:
+            return
+        try:
+            width, height = os.get_terminal_size(sys.stdout.fileno())
+        except OSError:
+            return
+        if (height, width) == self._screen_size:
+            return # Also filters out KEY_RESIZE that is pushed by resizeterm() itself.
+        self._screen_size = (height, width)
+        logging.debug('Terminal is resized to %sx%s', width, height)
+        curses.resizeterm(height, width)
+        self.stdscr.clear()
+        # Text is wrapped for new window widths now.
+        default_wrap_cache.clear()
+        try:
+            self.main_window = MainWindow(self.stdscr)
+            self.summary_window = SummaryWindow(self.stdscr)
+        except curses.error as e:
+            logging.error('Failed to resize windows to %sx%s: %s', width, height, e)
+            return
+        self.warning_windows = [WarningWindow(self.stdscr, window.message) for window in self.warning_windows]
+        self.redraw()
+        if len(self.warning_windows) != 0:
+            self.warning_windows[-1].update({})
+            self.warning_windows[-1].show()
+        if self.stats_window is not None:
+            self.stats_window = StatsWindow(self.stdscr, self.metrics)
+            self.refresh_stats()
+        if self.search_window is not None:
+            self.search_window = DiarySearchWindow(self.stdscr, self.search_window.diary, self.search_window.query)
+            self.search_window.refresh()
 
     def init_keys(self):
         self.controls['q'] = self.quit
         self.controls['f'] = self.open_browser
         self.controls['F'] = self.refresh_session
         self.controls[' '] = self.remove_warning
-
-    def init_windows(self):
-        self.stdscr = curses.initscr()
+        self.controls['KEY_RESIZE'] = self.handle_resize
+        self.controls['/'] = self.open_diary_search
+        self.controls['s'] = self.toggle_stats
+        self.controls['T'] = self.dump_trace
+        if len(self.sessions) > 1:
+            self.controls['\t'] = self.next_hero
+            self.controls['n'] = self.next_hero
+            self.controls['p'] = self.prev_hero
+            self.controls['g'] = self.toggle_summary
+
+    def init_windows(self, stdscr=None):
+        self.headless = stdscr is not None
+        self.stdscr = stdscr or curses.initscr()
         self.stdscr.clear()
         self.stdscr.nodelay(True)
-        curses.start_color()
+        self._screen_size = self.stdscr.getmaxyx()
+        # getkey() implicitly refreshes the window it is called on,
+        # so keys are read from dedicated window that is never modified.
+        self.input_window = backend.current.newwin(1, 1, 0, 0)
+        self.input_window.nodelay(True)
+        self.input_window.untouchwin()
+        if stdscr is None:
+            curses.start_color()
 
         self.main_window = MainWindow(self.stdscr)
+        self.summary_window = SummaryWindow(self.stdscr)
         self.warning_windows = []
+        self.stats_window = None
+        self.search_window = None
 
     def init_colors(self):
         curses.use_default_colors()
@@ -172,30 +426,137 @@ class Monitor:
                          curses.COLOR_GREEN,
                          COLOR_TRANSPARENT)
 
-    def post_warning(self, warning_message, check_active=False):
+    def post_warning(self, warning_message, check_active=False, session=None, notify=True):
         if self.quiet:
             return
-        if check_active and self.state.get('expired', False):
+        session = session or self.session
+        if check_active and session.state.get('expired', False):
             logging.debug('Session is expired, do not show notifications.')
             return
-        if self.notification_command:
-            os.system(self.notification_command.format(warning_message,
-                message=warning_message,
-                engine=self.engine.id(),
-                game=self.engine.name(),
-                )) # FIXME: Highly insecure!
+        if self.server is not None:
+            self.server.publish_warning(session, warning_message)
+        if len(self.sessions) > 1:
+            warning_message = '{0}: {1}'.format(session.godname, warning_message)
+        if notify:
+            self.notifier.post(warning_message,
+                    engine=session.engine.id(),
+                    game=session.engine.name(),
+                    )
+        if self.server is not None:
+            return # Daemon has no terminal, warnings are displayed by clients.
         self.warning_windows.append(WarningWindow(self.stdscr, warning_message))
+        self.warning_windows[-1].update({})
+        self.warning_windows[-1].show()
+
+    def dump_trace(self):
+        if not default_tracer.enabled:
+            self.post_warning(tr('Tracing is disabled, run with --trace option.'), notify=False)
+            return
+        try:
+            filename = default_tracer.dump(tr('Dumped on request'))
+        except OSError as e:
+            logging.error('%s: failed to dump trace: %s',
+                          self.dump_trace.__name__,
+                          e)
+            return
+        self.post_warning(tr('Trace is saved to {0}').format(filename), notify=False)
 
     def remove_warning(self):
         if len(self.warning_windows) != 0:
             del self.warning_windows[-1]
 
-        self.main_window.update(self.state)
+        self.current_window().show()
+        self.redraw()
+        self.show_popups()
 
-    def handle_expired_session(self):
+    def show_popups(self):
+        ''' Puts pop-up windows over the current window again (in the order they overlap each other). '''
+        if self.stats_window is not None:
+            self.stats_window.show()
+        if len(self.warning_windows) != 0:
+            self.warning_windows[-1].show()
+        if self.search_window is not None:
+            self.search_window.show()
+
+    def open_diary_search(self):
+        self.search_window = DiarySearchWindow(self.stdscr, self.session.diary)
+        self.search_window.refresh()
+
+    def close_diary_search(self):
+        self.search_window = None
+        self.current_window().show()
+        self.redraw()
+        self.show_popups()
+
+    def toggle_stats(self):
+        if self.stats_window is None:
+            self.stats_window = StatsWindow(self.stdscr, self.metrics)
+            self.refresh_stats()
+            return
+        self.stats_window = None
+        self.current_window().show()
+        self.redraw()
+        self.show_popups()
+
+    def refresh_stats(self):
+        if self.stats_window.refresh():
+            # Stats window is under other pop-ups.
+            if len(self.warning_windows) != 0:
+                self.warning_windows[-1].show()
+            if self.search_window is not None:
+                self.search_window.show()
+
+    def next_hero(self):
+        self.current = (self.current + 1) % len(self.sessions)
+        self.redraw()
+
+    def prev_hero(self):
+        self.current = (self.current - 1) % len(self.sessions)
+        self.redraw()
+
+    def toggle_summary(self):
+        self.show_summary = not self.show_summary
+        # Both windows occupy the same screen area.
+        self.current_window().invalidate()
+        self.redraw()
+
+    def current_window(self):
+        return self.summary_window if self.show_summary else self.main_window
+
+    def redraw(self, extra_keys=()):
+        ''' Updates currently displayed window.
+        Keys of state that were changed in place (not as a result of fetch) should be passed as extra_keys.
+        '''
+        if self.server is not None:
+            return # Daemon has no terminal, states are rendered by clients.
+        if self.show_summary:
+            changed = self.summary_window.update({
+                'heroes' : [(session.godname, session.state) for session in self.sessions],
+                'current' : self.current,
+                })
+            self._rendered_session = None
+        else:
+            if len(self.sessions) > 1:
+                self.main_window.set_caption('[{0}/{1}]'.format(self.current + 1, len(self.sessions)))
+            # Main window already shows previous state of the session,
+            # so only entries that depend on changed keys should be updated.
+            changed_keys = None
+            if self._rendered_session is self.session and self.session.diff is not None:
+                if self._rendered_diff is self.session.diff:
+                    changed_keys = set(extra_keys)
+                elif self.session.diff.changed_keys is not None:
+                    changed_keys = self.session.diff.changed_keys | set(extra_keys)
+            self.main_window.set_session(self.session)
+            changed = self.main_window.update(self.state, changed_keys=changed_keys)
+            self._rendered_session = self.session
+            self._rendered_diff = self.session.diff
+        if changed:
+            self.show_popups()
+
+    def handle_expired_session(self, session):
         if self.autorefresh:
-            if self.expired_on_start:
-                self.expired_on_start = False
+            if session.expired_on_start:
+                session.expired_on_start = False
                 if self.open_browser_on_start:
                     self.open_browser()
                 else:
@@ -203,89 +564,209 @@ class Monitor:
             else:
                 self.refresh_session()
         else:
-            self.post_warning(tr('Session is expired. Please reconnect.'))
+            self.post_warning(tr('Session is expired. Please reconnect.'), session=session)
 
     def init_status_checkers(self):
-        self.rules.append(Rule(
-            lambda info: 'expired' in info and info['expired'],
-            self.handle_expired_session
-            ))
-        for custom_rule in CUSTOM_RULES:
-            action = custom_rule(None)
-            if isinstance(action, str) or isinstance(action, unicode):
-                # Trick to bind message text at the creation time, not call time.
-                action = lambda action=action, args=self: self.post_warning(action, check_active=args.notify_only_when_active)
-            self.rules.append(Rule(custom_rule, action, check_active=self.notify_only_when_active, ignore_first_result=not self.notify_on_start))
-
-    def read_state(self):
-        logging.debug('%s: reading state',
-                      self.read_state.__name__)
+        for session in self.sessions:
+            session.rules.append(Rule(
+                lambda info: 'expired' in info and info['expired'],
+                lambda session=session: self.handle_expired_session(session)
+                ))
+            for custom_rule in custom_rules():
+                action = custom_rule(None)
+                if isinstance(action, str) or isinstance(action, unicode):
+                    # Trick to bind message text at the creation time, not call time.
+                    action = lambda action=action, args=self, session=session: self.post_warning(action, check_active=args.notify_only_when_active, session=session)
+                session.rules.append(Rule(custom_rule, action, check_active=self.notify_only_when_active, ignore_first_result=not self.notify_on_start,
+                    always_check=getattr(custom_rule, 'always_check', False)))
+
+    def load_state(self, session):
+        ''' Fetches state for the given god. Runs in worker thread, so should not touch UI. '''
+        if self.dump_file != None:
+            return self.read_dump(session, self.dump_file)
+        with self.metrics.timer('fetch'):
+            return load_hero_state(session.engine, session.godname, session.token, custom_url=session.custom_url)
+
+    def start_fetching(self, sessions):
+        ''' Starts fetching states of given gods in background
+        (no more than max_requests in flight at once).
+        Main loop is woken up via wakeup pipe when fetch is done.
+        '''
+        for session in sessions:
+            if session.pending is not None:
+                continue
+            session.pending = self.executor.submit(self.load_state, session)
+            session.pending.add_done_callback(self._on_fetch_done)
+
+    def _on_fetch_done(self, future):
+        # Called from worker thread, so should not touch anything but the pipe.
+        if self._wakeup_write is None:
+            return # Monitor is already finalized.
+        try:
+            os.write(self._wakeup_write, b'\0')
+        except OSError:
+            pass # Pipe is full (so main loop will be woken up anyway) or closed.
+
+    def finish_fetching(self):
+        ''' Stores results of finished fetches in corresponding sessions.
+        Returns pair of lists: sessions with finished fetches and sessions which states were changed.
+        '''
+        finished_sessions, changed_sessions = [], []
+        for session in self.sessions:
+            if session.pending is None or not session.pending.done():
+                continue
+            future, session.pending = session.pending, None
+            with self.metrics.timer('read_state'):
+                session.state, changed = self.read_state(session, future)
+            finished_sessions.append(session)
+            if changed:
+                changed_sessions.append(session)
+        return finished_sessions, changed_sessions
+
+    def fetch_states(self, sessions):
+        ''' Fetches states of all given gods concurrently and waits for results.
+        Returns list of sessions which states were changed.
+        '''
+        self.start_fetching(sessions)
+        concurrent.futures.wait([session.pending for session in sessions if session.pending is not None])
+        return self.finish_fetching()[1]
+
+    def handle_fetched_states(self):
+        finished_sessions, changed_sessions = self.finish_fetching()
+        if not finished_sessions:
+            return
+        self.schedule_updates(finished_sessions)
+        self.process_states(changed_sessions)
+
+    def read_state(self, session, future):
+        ''' Returns pair (state, changed). '''
+        logging.debug('%s: reading state for %s',
+                      self.read_state.__name__, session.godname)
 
         state = None
+        changed = True
+        # Changes from placeholder state are not real changes.
+        old_state = None if session.placeholder else session.prev_state
+        old_error = session.error
 
         try:
-            if self.dump_file != None:
-                state = self.read_dump(self.dump_file)
-            else:
-                state = load_hero_state(self.engine, self.godname, self.token, custom_url=self.custom_url)
-            self.error = None
+            state = future.result()
+            if state is None:
+                logging.debug('%s: state of %s is not changed, skipped processing (saved ~%.1f ms)',
+                              self.read_state.__name__, session.godname,
+                              session.processing_time * 1000)
+                state = session.prev_state
+                # Still should redraw to clear previous error.
+                changed = session.error is not None
+            elif session.history is not None:
+                self.record_history(session, state)
+            if state is not None:
+                session.placeholder = False
+            session.error = None
+            session.failures = 0
+            session.retry_after = None
+            session.breaker = None
         except urllib.error.URLError as e:
-            state = self._handle_read_state_exception(e,
+            state = self._handle_read_state_exception(session, e,
                     e.url if hasattr(e, 'url') else '<unknown url>',
                     )
         except socket.timeout as e:
-            state = self._handle_read_state_exception(e,
+            state = self._handle_read_state_exception(session, e,
                     '',
                     )
         except ConnectionError as e:
-            state = self._handle_read_state_exception(e,
+            state = self._handle_read_state_exception(session, e,
                     '',
                     )
         except Exception as e:
             logging.exception('%s: reading state error \n %s %s %s',
                           self.read_state.__name__,
                           str(type(e)), repr(e), str(e))
+            if default_tracer.enabled:
+                default_tracer.dump(repr(e))
             self.post_warning(tr('Error occured, please see the pygod.log'))
 
             sys.exit(1)
-        if state and 'token_expired' in state:
+        session.prev_state = state
+        if session.error:
+            state['error'] = session.error
+        elif 'error' in state:
+            del state['error']
+        diff = StateDiff(old_state, state)
+        if state is old_state and session.error != old_error:
+            diff.add_change('error', old_error, session.error)
+        session.stable_fetches = 0 if diff else session.stable_fetches + 1
+        self.publish_changes(session, diff)
+        return state, changed
+
+    def publish_changes(self, session, diff):
+        ''' Dispatches difference between previous and new state of the session to subscribers. '''
+        session.diff = diff
+        self.events.publish(session, diff)
+
+    def on_state_changed(self, session, event):
+        if self.client is not None:
+            return # Warnings are sent by daemon.
+        if event.path == ('token_expired',) and event.new:
             self.post_warning(tr('Token is expired.\n'
                     'Visit user profile page to generate a new one:\n'
                     '{token_url}'
-                    ).format(token_url=self.engine.get_token_generation_url()))
-        self.prev_state = state
-        if self.error:
-            self.state['error'] = self.error
-        elif 'error' in self.state:
-            del self.state['error']
-        return state
+                    ).format(token_url=session.engine.get_token_generation_url()), session=session)
+
+    def on_diary_entry(self, session, event):
+        session.diary.append(event.new)
+
+    def log_event(self, session, event):
+        if event.kind != Events.CHANGED:
+            logging.info('%s: %s: %s (%s -> %s)',
+                         self.log_event.__name__,
+                         session.godname, event.kind, event.old, event.new)
+
+    def record_history(self, session, state):
+        try:
+            session.history.append(state)
+        except (OSError, ValueError, TypeError) as e:
+            logging.error('%s: failed to write history for %s: %s',
+                          self.record_history.__name__,
+                          session.godname, e)
 
-    def _handle_read_state_exception(self, e, url):
+    def _handle_read_state_exception(self, session, e, url):
         logging.error('%s: reading state error \n %s : %s',
                       self.read_state.__name__,
                       url,
                       str(e))
+        self.metrics.count('fetch_errors')
 
         do_notify = True
         if self.report_connection_errors == "false":
             do_notify = False
         elif self.report_connection_errors == "once":
-            if self.error:
+            if session.error:
                 do_notify = False
         if do_notify:
-            self.post_warning(tr('Connection error: {0}').format(e))
-
-        if self.prev_state is None:
-            print(tr('Error occured, please see the pygod.log'))
-            sys.exit(1)
-        self.error = str(e)
-        return self.prev_state
-
-    def read_dump(self, dumpfile):
+            self.post_warning(tr('Connection error: {0}').format(e), session=session)
+
+        session.error = str(e)
+        session.failures += 1
+        session.retry_after = resilience.retry_after(e)
+        session.breaker = getattr(e, 'breaker', None)
+        if session.prev_state is None:
+            # Keep trying until the first state is fetched.
+            session.placeholder = True
+            placeholder = default_hero_state(session.engine)
+            placeholder.update({
+                'godname' : session.godname,
+                'quest' : '',
+                'inventory' : {},
+                })
+            return placeholder
+        return session.prev_state
+
+    def read_dump(self, session, dumpfile):
         state = None
 
         try:
-            state = load_hero_state(self.engine, self.godname, filename=dumpfile)
+            state = load_hero_state(session.engine, session.godname, filename=dumpfile)
         except IOError:
             logging.error('%s: Error reading file %s',
                           self.read_dump.__name__,
@@ -293,19 +774,29 @@ class Monitor:
 
         return state
 
-    def handle_key(self):
-        try:
-            key = self.stdscr.getkey()
+    def handle_keys(self):
+        ''' Processes all pending keys. '''
+        while True:
+            try:
+                key = self.input_window.getkey()
+            except curses.error as e:
+                if not 'no input' in e.args:
+                    raise
+                return
+            if self.search_window is not None and key != 'KEY_RESIZE':
+                # Search window takes all keys while it is open.
+                if not self.search_window.handle_key(key):
+                    self.close_diary_search()
+                continue
             if key in self.controls:
-                self.controls[key]()
-        except curses.error as e:
-            if not 'no input' in e.args:
-                raise
+                with self.metrics.timer('handle_key'):
+                    self.controls[key]()
 
     def quit(self):
         sys.exit(0)
 
     def run_command(self, args):
+        import subprocess
         try:
             subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         except Exception as e:
@@ -321,38 +812,157 @@ class Monitor:
         if self.refresh_command:
             self.run_command(str(self.refresh_command).split())
 
-    def check_status(self, state):
+    def check_status(self, session):
+        if session.placeholder:
+            return
         state_to_check = {
-                'engine' : self.engine.id(),
+                'engine' : session.engine.id(),
                 }
-        state_to_check.update(state)
-        for rule in self.rules:
-            rule.check(state_to_check)
+        state_to_check.update(session.state)
+        changed_keys = session.diff.changed_keys if session.diff is not None else None
+        skipped = 0
+        for rule in session.rules:
+            if not rule.is_affected_by(changed_keys):
+                skipped += 1
+                continue
+            rule.check(state_to_check, changed_keys)
+        logging.debug('%s: %s rules checked, %s skipped as not affected by changes',
+                      self.check_status.__name__,
+                      len(session.rules) - skipped, skipped)
+
+    def process_states(self, sessions):
+        ''' Checks rules and redraws windows for changed sessions. '''
+        if not sessions:
+            return
+        started = time.time()
+        for session in sessions:
+            with self.metrics.timer('check_status'):
+                self.check_status(session)
+        with self.metrics.timer('redraw'):
+            self.redraw()
+        processing_time = (time.time() - started) / len(sessions)
+        for session in sessions:
+            session.processing_time = processing_time
+        if self.server is not None:
+            for session in sessions:
+                self.server.publish(session)
+        logging.debug('%s: wrap cache stats: %s',
+                      self.process_states.__name__,
+                      default_wrap_cache.report())
+
+    def schedule_updates(self, sessions):
+        now = time.monotonic()
+        for session in sessions:
+            session.next_update = self.scheduler.schedule(session, now)
+            old_connection = session.state.get('connection')
+            if session.error:
+                # Displayed in the Session window until the next attempt.
+                session.state['connection'] = {
+                        'breaker' : session.breaker.state if session.breaker else None,
+                        'retry_at' : time.time() + session.next_update - now,
+                        }
+            else:
+                session.state.pop('connection', None)
+            if session.diff is not None and old_connection != session.state.get('connection'):
+                session.diff.add_change('connection', old_connection, session.state.get('connection'))
+        logging.debug('%s: scheduler stats: %s',
+                      self.schedule_updates.__name__,
+                      ', '.join('{0}={1}'.format(name, value) for name, value in sorted(self.scheduler.stats.items())))
+
+    def handle_daemon_messages(self):
+        ''' Applies states and warnings received from daemon. '''
+        try:
+            messages = self.client.read()
+        except (OSError, ValueError) as e:
+            logging.error('%s: connection to daemon is lost: %s',
+                          self.handle_daemon_messages.__name__,
+                          str(e))
+            self.selector.unregister(self.client.fileno())
+            self.post_warning(tr('Connection to daemon is lost: {0}').format(e))
+            return
+        sessions = {session.godname: session for session in self.sessions}
+        for message in messages:
+            session = sessions.get(message.get('god'))
+            if session is None:
+                continue
+            if message['type'] == 'warning':
+                self.post_warning(message['message'], session=session)
+                continue
+            if message['type'] == 'diary':
+                for timestamp, text in message['entries']:
+                    session.diary.append(text, timestamp=timestamp)
+                if session is self.session:
+                    self.redraw(extra_keys={'diary_last'})
+                continue
+            if message['type'] == 'state':
+                state = message['state']
+            elif message['type'] == 'delta' and session.prev_state is not None:
+                state = apply_delta(dict(session.prev_state), message['delta'])
+            else:
+                continue
+            old_state, session.state = session.prev_state, state
+            session.prev_state = state
+            self.publish_changes(session, StateDiff(old_state, state))
+            # Each message is rendered separately, as main window is updated only by keys of the last diff.
+            self.redraw()
 
     def main_loop(self):
-        UPDATE_INTERVAL = 61
-        last_update_time = time.time()
-
-        self.state = self.read_state()
-        self.expired_on_start = 'expired' in self.state and self.state['expired']
-        self.check_status(self.state)
-        self.main_window.update(self.state)
+        if self.client is not None:
+            # States are fetched by daemon.
+            for session in self.sessions:
+                session.next_update = None
+            self.selector.register(self.client.fileno(), selectors.EVENT_READ, self.handle_daemon_messages)
+            self.handle_daemon_messages()
+            if self.startup_profile is not None:
+                # States that were received along with hello message.
+                self.startup_profile.mark('first fetch')
+                self.redraw()
+        else:
+            self.fetch_states(self.sessions)
+            if self.startup_profile is not None:
+                self.startup_profile.mark('first fetch')
+            for session in self.sessions:
+                session.expired_on_start = 'expired' in session.state and session.state['expired']
+            # Deadlines are on monotonic clock, so they are not affected by system time changes.
+            self.schedule_updates(self.sessions)
+            self.process_states(self.sessions)
+        if self.startup_profile is not None:
+            self.compositor.present(force=True)
+            self.startup_profile.mark('first frame')
+            return
 
-        prev_hour = datetime.datetime.now().hour
+        next_tick = time.monotonic() + 1
+        next_metrics_write = time.monotonic() if self.metrics_file else None
         while(True):
-            new_hour = datetime.datetime.now().hour
-            if (last_update_time + UPDATE_INTERVAL < time.time()) or new_hour != prev_hour:
-                last_update_time = time.time()
-                self.state = self.read_state()
-                self.check_status(self.state)
-                self.main_window.update(self.state)
-            prev_hour = new_hour
-
-            if len(self.warning_windows) != 0:
-                self.warning_windows[-1].update({})
-
-            self.handle_key()
-            time.sleep(0.1)
+            now = time.monotonic()
+            # Fetching is performed in background, so UI stays responsive.
+            # Results are processed in handle_wakeup().
+            due_sessions = [session for session in self.sessions if session.pending is None and session.next_update is not None and now >= session.next_update]
+            self.start_fetching(due_sessions)
+            countdown = any('connection' in session.state for session in self.sessions)
+            ticking = countdown or self.stats_window is not None
+            if ticking and now >= next_tick:
+                # Time until the next attempt is changed every second.
+                if countdown:
+                    self.redraw(extra_keys={'connection'})
+                if self.stats_window is not None:
+                    self.refresh_stats()
+                next_tick = now + 1
+            if next_metrics_write is not None and now >= next_metrics_write:
+                self.write_metrics()
+                next_metrics_write = now + self.metrics_interval
+
+            self.compositor.present()
+            deadlines = [session.next_update for session in self.sessions if session.pending is None]
+            deadlines.append(self.compositor.next_frame_time())
+            deadlines.append(next_metrics_write)
+            if ticking:
+                deadlines.append(next_tick)
+            deadlines = [deadline for deadline in deadlines if deadline is not None]
+            # Without deadlines (all fetches are in progress) wait until one of them is done.
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            for key, _ in self.selector.select(timeout):
+                key.data()
 
 def load_config_value(parser, category, name, default_value=None):
     if category not in parser:
@@ -362,18 +972,29 @@ def load_config_value(parser, category, name, default_value=None):
     return utils.unquote_string(parser[category][name])
 
 def main():
+    startup_profile = StartupProfile()
+
     # Parsing arguments
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('god_name', nargs='?',
-                        help = 'Name of the god to me monitored. Overrides value from config file.')
+    parser.add_argument('god_name', nargs='*',
+                        help = 'Name(s) of the god(s) to be monitored. Overrides value from config file.')
+
+    parser.add_argument('-g',
+                        '--gods-file',
+                        type = str,
+                        help = 'file with list of gods to monitor, one per line (optionally "name = token")')
+
+    parser.add_argument('-j',
+                        '--max-requests',
+                        type = int,
+                        help = 'max number of simultaneous requests when monitoring several gods (default is 4)')
 
     parser.add_argument('-e',
                         '--engine',
                         type = str,
                         default = 'godvillenet',
-                        choices = sorted(KNOWN_ENGINES.keys()),
-                        help = 'Game engine.')
+                        help = 'Game engine: {0} or engine from plugins (default is godvillenet).'.format(', '.join(sorted(pygod_engine.BUILTIN_ENGINES))))
 
     parser.add_argument('-c',
                         '--config',
@@ -394,6 +1015,27 @@ def main():
                         '--dump',
                         action = 'store_true',
                         help = 'dump state to file and exit (debug option)')
+    parser.add_argument('--server',
+                        type = str,
+                        help = 'root URL of the game server, e.g. local mock server (debug option)')
+    parser.add_argument('--replay',
+                        type = str,
+                        help = 'replay recorded states (history file, directory with dumps or single dump) without terminal and report processing speed (benchmark option)')
+    parser.add_argument('--startup-profile',
+                        action = 'store_true',
+                        help = 'exit after the first frame and report time spent on imports and startup phases (benchmark option)')
+    parser.add_argument('--daemon',
+                        action = 'store_true',
+                        help = 'run without terminal: fetch states, check rules, send notifications and publish states for monitors started with --attach')
+    parser.add_argument('--attach',
+                        action = 'store_true',
+                        help = 'display states published by daemon instead of fetching them')
+    parser.add_argument('--socket',
+                        type = str,
+                        help = 'socket of the daemon (default is XDG_RUNTIME_DIR/pygod-<uid>/<engine>.sock)')
+    parser.add_argument('--trace',
+                        action = 'store_true',
+                        help = 'record rendering events in memory and dump them to XDG_LOG_HOME/pygod/pygod.trace on crash, SIGUSR1 or \'T\' key (debug option)')
     parser.add_argument('-q',
                         '--quiet',
                         action = 'store_true',
@@ -420,18 +1062,65 @@ def main():
         config_files.append(args.config)
     settings = configparser.ConfigParser()
     settings.read(config_files)
-    if args.god_name is None:
-        args.god_name = load_config_value(settings, 'auth', 'god_name') or load_config_value(settings, 'main', 'god_name')
+    args.gods_file = args.gods_file or load_config_value(settings, 'main', 'gods_file')
+    gods = [(god_name, None) for god_name in args.god_name]
+    if args.gods_file:
+        gods += load_god_list(os.path.expanduser(args.gods_file))
+    if not gods:
+        god_name = load_config_value(settings, 'auth', 'god_name') or load_config_value(settings, 'main', 'god_name')
+        if god_name:
+            gods.append((god_name, None))
+    if args.max_requests is None:
+        args.max_requests = int(load_config_value(settings, 'main', 'max_requests', '4'))
     args.browser = load_config_value(settings, 'main', 'browser')
     args.autorefresh = load_config_value(settings, 'main', 'autorefresh', default_value="false").lower() == "true"
     args.refresh_command = load_config_value(settings, 'main', 'refresh_command')
     args.token = load_config_value(settings, 'auth', 'token')
     args.custom_url = load_config_value(settings, 'auth', 'custom_url')
+    args.server = args.server or load_config_value(settings, 'network', 'server')
 
     args.notification_command = load_config_value(settings, 'notifications', 'command') or load_config_value(settings, 'main', 'notification_command')
     args.notify_only_when_active = load_config_value(settings, 'notifications', 'only_when_active')
     args.notify_on_start = load_config_value(settings, 'notifications', 'notify_on_start', "true").lower() == "true"
     args.report_connection_errors = load_config_value(settings, 'notifications', 'report_connection_errors', "true").lower()
+    args.notifications = {
+            'timeout' : float(load_config_value(settings, 'notifications', 'timeout', '10')),
+            'coalesce_window' : float(load_config_value(settings, 'notifications', 'coalesce_window', '60')),
+            'max_per_minute' : int(load_config_value(settings, 'notifications', 'max_per_minute', '6')),
+            'queue_size' : int(load_config_value(settings, 'notifications', 'queue_size', '16')),
+            }
+    args.max_fps = float(load_config_value(settings, 'main', 'max_fps', '10'))
+    args.history = load_config_value(settings, 'history', 'enabled', "true").lower() == "true"
+    args.history_snapshot_interval = int(load_config_value(settings, 'history', 'snapshot_interval', '100'))
+    args.diary_size = int(load_config_value(settings, 'diary', 'size', '1000'))
+    args.scheduler = {
+            'interval' : float(load_config_value(settings, 'scheduler', 'interval', '61')),
+            'fast_interval' : float(load_config_value(settings, 'scheduler', 'fast_interval', '20')),
+            'slow_interval' : float(load_config_value(settings, 'scheduler', 'slow_interval', '300')),
+            'low_health' : float(load_config_value(settings, 'scheduler', 'low_health', '30')) / 100.0,
+            'stable_after' : int(load_config_value(settings, 'scheduler', 'stable_after', '10')),
+            'jitter' : float(load_config_value(settings, 'scheduler', 'jitter', '5')),
+            'hourly_jitter' : float(load_config_value(settings, 'scheduler', 'hourly_jitter', '120')),
+            'cron_window' : parse_cron_window(load_config_value(settings, 'scheduler', 'cron_window')),
+            'backoff_base' : float(load_config_value(settings, 'scheduler', 'backoff_base', '15')),
+            'backoff_max' : float(load_config_value(settings, 'scheduler', 'backoff_max', '900')),
+            }
+    args.prometheus_interval = float(load_config_value(settings, 'stats', 'prometheus_interval', '15'))
+    args.prometheus_file = None
+    if load_config_value(settings, 'stats', 'prometheus', 'false').lower() == 'true':
+        args.prometheus_file = os.path.expanduser(load_config_value(settings, 'stats', 'prometheus_file',
+            os.path.join(utils.get_data_dir(), 'pygod.{0}.prom'.format(args.engine))))
+    args.trace_size = int(load_config_value(settings, 'trace', 'size', '10000'))
+    args.startup_budget = float(load_config_value(settings, 'main', 'startup_budget', '1000')) / 1000.0
+    from .engine.http_pool import shared_pool
+    shared_pool.failure_threshold = int(load_config_value(settings, 'network', 'failure_threshold', '3'))
+    shared_pool.reset_timeout = float(load_config_value(settings, 'network', 'reset_timeout', '30'))
+    shared_pool.max_reset_timeout = float(load_config_value(settings, 'network', 'max_reset_timeout', '900'))
+
+    args.socket = args.socket or load_config_value(settings, 'daemon', 'socket')
+    if args.daemon or args.attach:
+        from . import daemon
+        args.socket = os.path.expanduser(args.socket) if args.socket else daemon.default_socket_path(args.engine)
 
     # Configuring logs
     log_level = logging.WARNING
@@ -443,33 +1132,85 @@ def main():
                         filename=os.path.join(utils.get_log_dir(), 'pygod.log'),
                         filemode='a+',
                         level=log_level)
-
-    if args.god_name is None:
+    if args.trace:
+        default_tracer.enable(os.path.join(utils.get_log_dir(), 'pygod.trace'), size=args.trace_size)
+        default_tracer.dump_on_signal(signal.SIGUSR1)
+
+    if not gods and args.replay:
+        gods.append(('replay', None))
+    client = None
+    if args.attach:
+        try:
+            client = daemon.StateClient(args.socket)
+        except (OSError, ValueError) as e:
+            print(tr('Cannot connect to daemon at {0}: {1}').format(args.socket, e))
+            sys.exit(1)
+        # Gods and engine are defined by daemon, notifications are sent by it as well.
+        args.engine = client.hello['engine']
+        gods = [(god_name, None) for god_name in client.hello['gods']]
+        args.notification_command = None
+    if not gods:
         print(tr('God name must be specified either via command line or using config file!'))
         sys.exit(1)
 
-    if args.engine not in KNOWN_ENGINES:
+    startup_profile.mark('config')
+    try:
+        engine_class = pygod_engine.get_engine(args.engine)
+    except KeyError:
         print('Unknown pygod engine: {0}'.format(args.engine))
-        print('Should be one of the: {0}'.format(', '.join(sorted(KNOWN_ENGINES.keys()))))
+        print('Should be one of the: {0}'.format(', '.join(pygod_engine.engine_ids())))
         sys.exit(1)
-    engine = KNOWN_ENGINES[args.engine]()
-
-    logging.debug('Starting %s with username %s', args.engine, args.god_name)
-
-    if args.dump:
-        state = load_hero_state(engine, args.god_name, args.token, filename=args.state, custom_url=args.custom_url)
-        prettified_state = json.dumps(state, indent=4, ensure_ascii=False)
-        dump_file = '{0}.json'.format(args.god_name)
-        with open(dump_file, 'wb') as f:
-            f.write(prettified_state.encode('utf-8'))
-        print(tr('Dumped current state to {0}.'.format(dump_file)))
+    engine_options = {'root' : args.server} if args.server else {}
+    sessions = []
+    # Only states fetched from server are recorded (by daemon, if monitor is attached to it).
+    recording = not (args.state or args.dump or args.replay or args.attach)
+    for god_name, token in gods:
+        if token is None and len(gods) == 1:
+            token = args.token
+        # Each god gets its own engine instance, as engines may keep per-account data.
+        sessions.append(GodSession(engine_class(**engine_options), god_name, token, custom_url=args.custom_url))
+        if args.history and recording:
+            sessions[-1].history = StateHistory.for_god(utils.get_data_dir(), args.engine, god_name,
+                    snapshot_interval=args.history_snapshot_interval)
+        if recording:
+            sessions[-1].diary = Diary.for_god(utils.get_data_dir(), args.engine, god_name, size=args.diary_size)
+
+    logging.debug('Starting %s with username(s) %s', args.engine, ', '.join(session.godname for session in sessions))
+    startup_profile.mark('engine and sessions')
+
+    if args.replay:
+        from . import replay
+        replay.run(sessions[0], args)
+    elif args.dump:
+        import json
+        for session in sessions:
+            state = load_hero_state(session.engine, session.godname, session.token, filename=args.state, custom_url=session.custom_url)
+            prettified_state = json.dumps(state, indent=4, ensure_ascii=False)
+            dump_file = '{0}.json'.format(session.godname)
+            with open(dump_file, 'wb') as f:
+                f.write(prettified_state.encode('utf-8'))
+            print(tr('Dumped current state to {0}.'.format(dump_file)))
+    elif args.daemon:
+        try:
+            server = daemon.StateServer(args.socket, args.engine, sessions)
+        except (OSError, RuntimeError) as e:
+            print(tr('Cannot start daemon at {0}: {1}').format(args.socket, e))
+            sys.exit(1)
+        daemon.run(sessions, server, args)
     else:
-        monitor = Monitor(engine, args)
+        monitor = Monitor(sessions, args)
+        monitor.client = client
+        if args.startup_profile:
+            monitor.startup_profile = startup_profile
         try:
             monitor.init_curses()
+            startup_profile.mark('terminal')
             monitor.main_loop()
         finally:
             monitor.finalize()
+        if args.startup_profile:
+            print(startup_profile.report(budget=args.startup_budget))
+            sys.exit(0 if startup_profile.within_budget(args.startup_budget) else 1)
 
 
 if __name__ == '__main__':
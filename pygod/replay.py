@@ -0,0 +1,115 @@
+''' Headless replay of recorded states through the whole processing pipeline.
+Used to measure throughput of parsing, rules and rendering without network and terminal.
+'''
+import os
+import json
+import time
+import logging
+
+from .core import backend
+from .core import StateHistory
+from .core import StateDiff
+from .core import default_wrap_cache
+
+class ReplayEngine:
+    ''' Wraps real engine, but returns recorded states instead of fetching them. '''
+    def __init__(self, engine):
+        self.engine = engine
+        self._pending = None
+
+    def feed(self, raw_state):
+        self._pending = raw_state
+
+    def fetch_state(self, godname, token=None, custom_url=None):
+        state, self._pending = self._pending, None
+        return state
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+def recorded_states(path):
+    ''' Yields recorded states as raw JSON text from:
+    - state history file (see StateHistory);
+    - directory with state dumps (*.json), in order of file names;
+    - single state dump file.
+    '''
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.json'):
+                with open(os.path.join(path, name), 'rb') as f:
+                    yield f.read().decode('utf-8')
+    elif os.path.exists(path + '.idx'):
+        history = StateHistory(path, readonly=True)
+        try:
+            for timestamp, state in history.iter_states():
+                yield json.dumps(state, ensure_ascii=False)
+        finally:
+            history.close()
+    else:
+        with open(path, 'rb') as f:
+            yield f.read().decode('utf-8')
+
+class ReplayStats:
+    PHASES = ('load', 'diff', 'rules', 'render')
+
+    def __init__(self):
+        self.states = 0
+        self.total = 0
+        self.phases = {phase: 0 for phase in self.PHASES}
+
+    def report(self):
+        lines = []
+        rate = self.states / self.total if self.total else 0
+        lines.append('Replayed {0} states in {1:.3f} s: {2:.1f} states/s'.format(self.states, self.total, rate))
+        for phase in self.PHASES:
+            spent = self.phases[phase]
+            lines.append('  {0:<8} {1:10.3f} ms total {2:10.1f} us/state {3:6.1f}%'.format(
+                phase,
+                spent * 1000,
+                spent * 1000000 / self.states if self.states else 0,
+                100 * spent / self.total if self.total else 0,
+                ))
+        return '\n'.join(lines)
+
+def replay(monitor, session, states):
+    ''' Streams raw states through load_hero_state, state diff, Monitor.check_status and window updates.
+    Returns ReplayStats.
+    '''
+    from .pygod import load_hero_state
+    stats = ReplayStats()
+    clock = time.perf_counter
+    for raw_state in states:
+        session.engine.feed(raw_state)
+        started = clock()
+        state = load_hero_state(session.engine, session.godname, session.token)
+        loaded = clock()
+        monitor.publish_changes(session, StateDiff(session.prev_state, state))
+        session.state = session.prev_state = state
+        diffed = clock()
+        monitor.check_status(session)
+        checked = clock()
+        monitor.redraw()
+        monitor.compositor.present(force=True)
+        rendered = clock()
+
+        stats.states += 1
+        stats.phases['load'] += loaded - started
+        stats.phases['diff'] += diffed - loaded
+        stats.phases['rules'] += checked - diffed
+        stats.phases['render'] += rendered - checked
+        stats.total += rendered - started
+    return stats
+
+def run(session, args, height=40, width=120):
+    ''' Replays states from args.replay for the given session using headless monitor. '''
+    from .pygod import Monitor
+    backend.use_null_backend()
+    args.notification_command = None
+    session.engine = ReplayEngine(session.engine)
+    monitor = Monitor([session], args, stdscr=backend.NullWindow(height, width))
+    monitor.init_status_checkers()
+    logging.debug('Replaying states from %s', args.replay)
+    stats = replay(monitor, session, recorded_states(args.replay))
+    print(stats.report())
+    print('Wrap cache: {0}'.format(default_wrap_cache.report()))
+    return stats
@@ -0,0 +1,73 @@
+''' Profiling of startup time (see --startup-profile).
+Time-to-first-frame consists of imports of the application modules
+(measured in separate interpreter with -X importtime, as they are already imported here)
+and startup phases of main() up to the first presented frame.
+'''
+import sys
+import time
+
+def import_times(module):
+    ''' Imports module in separate interpreter and returns list of tuples
+    (module name, self time, cumulative time) in seconds, in order of import completion.
+    Module itself is the last item.
+    '''
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    times = []
+    for line in result.stderr.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        if not self_time.strip().isdigit():
+            continue # Header.
+        times.append((name.strip(), int(self_time) / 1000000.0, int(cumulative) / 1000000.0))
+    return times
+
+class StartupProfile:
+    ''' Collects durations of startup phases. '''
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = [] # (name, seconds)
+        self._imports = None # See import_times().
+
+    def mark(self, phase):
+        ''' Marks the end of the phase (which started at the end of the previous one). '''
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self.started
+
+    def time_to_first_frame(self, module='pygod.pygod'):
+        if self._imports is None:
+            self._imports = import_times(module)
+        imports = self._imports[-1][2] if self._imports else 0
+        return imports + self.total()
+
+    def within_budget(self, budget):
+        return not budget or self.time_to_first_frame() <= budget
+
+    def report(self, budget=None, top=10):
+        self.time_to_first_frame()
+        lines = []
+        if self._imports:
+            module, _, imports = self._imports[-1]
+            lines.append('Import of {0}: {1:.1f} ms'.format(module, imports * 1000))
+            lines.append('  Application modules (cumulative):')
+            for name, self_time, cumulative in sorted(self._imports, key=lambda item: -item[2]):
+                if name.startswith(module.split('.')[0] + '.') and name != module:
+                    lines.append('    {0:<40} {1:8.1f} ms'.format(name, cumulative * 1000))
+            lines.append('  Slowest modules (self):')
+            for name, self_time, cumulative in sorted(self._imports, key=lambda item: -item[1])[:top]:
+                lines.append('    {0:<40} {1:8.1f} ms'.format(name, self_time * 1000))
+        lines.append('Startup phases:')
+        for phase, spent in self.phases:
+            lines.append('  {0:<42} {1:8.1f} ms'.format(phase, spent * 1000))
+        total = self.time_to_first_frame()
+        lines.append('Time to first frame: {0:.1f} ms (without interpreter startup)'.format(total * 1000))
+        if budget:
+            lines.append('Budget: {0:.1f} ms, {1}'.format(budget * 1000, 'OK' if total <= budget else 'EXCEEDED'))
+        return '\n'.join(lines)
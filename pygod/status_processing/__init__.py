@@ -1 +1,2 @@
 from .rule import Rule
+from .rule import TrackingState
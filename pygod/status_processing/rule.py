@@ -1,24 +1,76 @@
 import logging
+from ..core.events import TrackingState
+from ..core.metrics import default_metrics
 
 class Rule:
     '''
     Class describing how to process dictinary item
+
+    Remembers which keys of the state the condition has read,
+    so the condition is not evaluated again until one of those keys is changed.
+    Conditions that depend on anything besides the state (e.g. current time)
+    should be created with always_check=True, otherwise they are not re-evaluated
+    while the state stays the same.
     '''
 
-    def __init__(self, condition, action, check_active=False, ignore_first_result=False):
+    def __init__(self, condition, action, check_active=False, ignore_first_result=False, always_check=False):
         self.condition = condition
         self.action = action
         self.ignore_first_result = ignore_first_result
         self.check_active = check_active
+        self.always_check = always_check
         self._last_result = False
+        self._dependencies = None # None means that rule should be checked unconditionally.
+        self._trackable = True
+
+    def is_affected_by(self, changed_keys):
+        if changed_keys is None or self._dependencies is None or self.always_check:
+            return True
+        return not self._dependencies.isdisjoint(changed_keys)
+
+    @staticmethod
+    def _is_caused_by_view(error, view):
+        # E.g. "Object of type TrackingState is not JSON serializable"
+        # or "'TrackingState' object has no attribute 'copy'".
+        return isinstance(error, (TypeError, AttributeError)) and type(view).__name__ in str(error)
 
-    def check(self, hero_state):
+    def _evaluate(self, hero_state):
+        if not self._trackable:
+            return self.condition(hero_state)
+        tracking_state = TrackingState(hero_state)
+        try:
+            result = self.condition(tracking_state)
+        except Exception as e:
+            if not self._is_caused_by_view(e, tracking_state):
+                # Failure of the condition itself: it is re-checked when keys it has read are changed.
+                self._update_dependencies(tracking_state)
+                raise
+            # Condition expects real dict (e.g. to serialize it).
+            # Retry without tracking, such rule will be checked every time.
+            self._dependencies = None
+            self._trackable = False
+            return self.condition(hero_state)
+        self._update_dependencies(tracking_state)
+        return result
+
+    def _update_dependencies(self, tracking_state):
+        self._dependencies = tracking_state.dependencies()
+        if self._dependencies is not None and self.check_active:
+            self._dependencies.add('expired')
+
+    def check(self, hero_state, changed_keys=None):
+        ''' If set of changed keys since the previous check is specified,
+        condition is evaluated only when it depends on any of them.
+        '''
         if self.check_active and hero_state.get('expired', False):
             logging.debug('Hero state is expired, will not check rule.')
             return
 
+        if not self.is_affected_by(changed_keys):
+            return None
+
         try:
-            result = self.condition(hero_state)
+            result = self._evaluate(hero_state)
         except Exception as e:
             logging.error('%s: exception in condition: %s',
                           self.check.__name__,
@@ -34,6 +86,7 @@ class Rule:
         if self._last_result != result:
             self._last_result = result
             if result and run_action:
+                default_metrics.count('rule_firings')
                 try:
                     self.action()
                 except Exception as e:
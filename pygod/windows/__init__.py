@@ -1 +1,4 @@
 from .main_window import MainWindow
+from .summary_window import SummaryWindow
+from .diary_window import DiarySearchWindow
+from .stats_window import StatsWindow
@@ -0,0 +1,51 @@
+import datetime
+from ..core import MonitorWindowBase
+from ..core.utils import tr
+
+def search_results(search):
+    for timestamp, entry in search['results']:
+        yield '{0}  {1}'.format(datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M'), entry), None
+
+class DiarySearchWindow(MonitorWindowBase):
+    ''' Pop-up window with search through the whole stored diary of the hero.
+    Results are updated on each typed key, ENTER or ESC closes the window.
+    '''
+    OVERLAY = True
+
+    def __init__(self, parent_window, diary, query=''):
+        self.diary = diary
+        self.query = query
+
+        (max_y, max_x) = parent_window.getmaxyx()
+        width = max(1, max_x - 4)
+        height = max(1, max_y - 2)
+        super(DiarySearchWindow, self).__init__(parent_window, tr('Diary search'), 2, 1, width, height)
+
+    def init_text_entries(self):
+        self.add_text_entry(tr('Search: '), lambda search: search['query'] + '_')
+        self.add_text_entry(tr('Diary entries: '), 'total')
+        self.add_text_entry('', '')
+        self.add_list_entry(search_results)
+
+    def refresh(self):
+        ''' Runs the search for the current query and shows results. '''
+        self.update({
+            'query' : self.query,
+            # Only results that could fit the window are needed.
+            'results' : self.diary.search(self.query, limit=self.height),
+            'total' : len(self.diary),
+            })
+        self.show()
+
+    def handle_key(self, key):
+        ''' Returns False if window should be closed. '''
+        if key in ('\x1b', '\n', 'KEY_ENTER'):
+            return False
+        if key in ('KEY_BACKSPACE', '\x7f', '\b'):
+            self.query = self.query[:-1]
+        elif len(key) == 1 and key.isprintable():
+            self.query += key
+        else:
+            return True
+        self.refresh()
+        return True
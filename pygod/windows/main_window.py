@@ -2,10 +2,17 @@ import curses
 from ..core import MonitorWindowBase
 from ..core import TextEntry
 from ..core import Colors
+import time
+import bisect
 import datetime
 from ..core.utils import tr
 
 def _session_state(state):
+    if 'connection' in state:
+        retry_in = max(0, int(state['connection']['retry_at'] - time.time()))
+        if state['connection']['breaker'] == 'open':
+            return tr('Offline, {0}s').format(retry_in), Colors.ATTENTION
+        return tr('Retry in {0}s').format(retry_in), Colors.ATTENTION
     if 'error' in state:
         return state['error'], Colors.ATTENTION
     if 'token_expired' in state:
@@ -29,41 +36,109 @@ def item_priority(item):
         return 1
     return 0
 
-def inventory_list(state):
+def item_color(item):
+    if 'activate_by_user' in item and item['activate_by_user']:
+        return Colors.POWER_POINTS
+    if 'type' in item and item['type'] == 'heal_potion':
+        return Colors.HEALING
+    if item['price'] > 0:
+        return Colors.MONEY
+    return None
+
+def item_line(name, item):
+    if item['cnt'] > 1:
+        return '- {0} (x{1})'.format(name, item['cnt']), item_color(item)
+    return '- {0}'.format(name), item_color(item)
+
+class InventoryOrder:
+    '''
+    Ordered lines of inventory items: most important items first (see item_priority), then by position.
+
+    Lines are cached and rebuilt only when inventory is changed.
+    Fingerprint of the inventory is its shallow copy (items are compared by value),
+    so equal inventory from the new state is detected without rebuilding lines.
+    When only few items are added, removed or changed, they are moved within the sorted list
+    instead of sorting the whole inventory again.
+    Items of the state are not modified.
+    '''
+    # Max ratio of changed items that are updated incrementally.
+    INCREMENTAL_RATIO = 0.25
+
+    def __init__(self):
+        self._inventory = None # Inventory the lines were built for.
+        self._items = {} # Fingerprint: name: item
+        self._keys = {} # name: sort key
+        self._order = [] # Sorted list of sort keys.
+        self._lines = {} # name: (text, color)
+        self._ordered_lines = []
+        self.stats = {
+                'hits' : 0,
+                'incremental' : 0,
+                'full' : 0,
+                }
+
+    @staticmethod
+    def _sort_key(name, item):
+        # Name is the last element, so it could be taken from the key.
+        return (-item_priority(item), item['pos'], name)
+
+    def lines(self, inventory):
+        ''' Returns list of pairs (line, color) for the inventory. Should not be modified. '''
+        if inventory is self._inventory or inventory == self._items:
+            self.stats['hits'] += 1
+            self._inventory = inventory
+            return self._ordered_lines
+        items = self._items
+        changed = [name for name, item in inventory.items() if items.get(name) != item]
+        removed = [name for name in items if name not in inventory]
+        if len(changed) + len(removed) <= self.INCREMENTAL_RATIO * len(self._order):
+            self._update(inventory, changed, removed)
+            self.stats['incremental'] += 1
+        else:
+            self._rebuild(inventory)
+            self.stats['full'] += 1
+        self._items = dict(inventory)
+        self._inventory = inventory
+        self._ordered_lines = [self._lines[key[-1]] for key in self._order]
+        return self._ordered_lines
+
+    def _rebuild(self, inventory):
+        self._keys = {name: self._sort_key(name, item) for name, item in inventory.items()}
+        self._order = sorted(self._keys.values())
+        self._lines = {name: item_line(name, item) for name, item in inventory.items()}
+
+    def _update(self, inventory, changed, removed):
+        for name in changed + removed:
+            if name in self._keys:
+                del self._order[bisect.bisect_left(self._order, self._keys.pop(name))]
+                del self._lines[name]
+        for name in changed:
+            item = inventory[name]
+            self._keys[name] = self._sort_key(name, item)
+            bisect.insort(self._order, self._keys[name])
+            self._lines[name] = item_line(name, item)
+
+def inventory_list(state, inventory_order=None):
+    ''' Inventory order keeps lines of the previous state of the same god (see InventoryOrder). '''
     # New api replaced inventory with 'activatables' list.
     if 'activatables' in state:
         for item in state['activatables']:
             yield '- {0}'.format(item), Colors.POWER_POINTS
         return
-    inventory = state['inventory']
-    item_list = []
-    for item_name in inventory:
-        item_state = inventory[item_name]
-        item_state['name'] = item_name
-        item_list.append(item_state)
-    item_list.sort(key=lambda item: item['pos'])
-    item_list.sort(key=item_priority, reverse=True)
-    for item in item_list:
-        color = None
-        if 'activate_by_user' in item and item['activate_by_user']:
-            color = Colors.POWER_POINTS
-        elif 'type' in item and item['type'] == 'heal_potion':
-            color = Colors.HEALING
-        elif item['price'] > 0:
-            color = Colors.MONEY
-        if item['cnt'] > 1:
-            yield '- {0} (x{1})'.format(item['name'], item['cnt']), color
-        else:
-            yield '- {0}'.format(item['name']), color
+    inventory = state.get('inventory')
+    # Default state (public API, placeholders) has no inventory or empty list instead of dict.
+    if not isinstance(inventory, dict):
+        inventory = {}
+    yield from (inventory_order or InventoryOrder()).lines(inventory)
+
+DIARY_LINES = 10 # Number of the latest diary entries displayed in the log.
 
-DIARY_EVENTS = [] # (timestamp, text)
-def diary_events(state):
-    global DIARY_EVENTS
-    last_entry = state['diary_last']
-    if not DIARY_EVENTS or last_entry != DIARY_EVENTS[0][1]:
-        DIARY_EVENTS.insert(0, (datetime.datetime.now(), last_entry))
-    DIARY_EVENTS = DIARY_EVENTS[:10]
-    return [('{0}  {1}'.format(timestamp.strftime('%H:%M'), entry), None) for (timestamp, entry) in DIARY_EVENTS]
+def diary_events(state, diary=None):
+    ''' Diary is recorded from the event stream (Events.DIARY_ENTRY), not from the state. '''
+    if diary is None:
+        return []
+    return [('{0}  {1}'.format(datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M'), entry), None)
+            for (timestamp, entry) in diary.latest(DIARY_LINES)]
 
 def hero_location(state):
     if 'arena_fight' in state and state['arena_fight']:
@@ -117,6 +192,7 @@ class MainWindow(MonitorWindowBase):
         super(MainWindow, self).__init__(stdscr, '')
 
         self._subwindows = []
+        self._session = None
 
         # TODO: t_level and savings_completed_at
         # Column 1: Main hero stats.
@@ -182,7 +258,7 @@ class MainWindow(MonitorWindowBase):
         wnd = MonitorWindowBase(self.window, tr('Inventory'), 22, 0, 30, None)
         wnd.add_text_entry(tr('Gold:'), 'gold_approx')
         wnd.add_text_entry(tr('Items:'), lambda state: '{0}/{1}'.format(state['inventory_num'], state['inventory_max_num']))
-        wnd.add_list_entry(inventory_list)
+        wnd.add_list_entry(lambda state: inventory_list(state, self._session.inventory_order if self._session else None))
         self._subwindows.append(wnd)
 
         # Column 3: Quest, diary etc.
@@ -191,13 +267,29 @@ class MainWindow(MonitorWindowBase):
         wnd.add_text_entry('', '')
         wnd.add_text_entry('', lambda state: '"{0}"'.format(state['motto']))
         wnd.add_text_entry('', lambda x: '* * *')
-        wnd.add_list_entry(diary_events)
+        # New diary entry arrives along with the change of 'diary_last'.
+        wnd.add_list_entry(lambda state: diary_events(state, self._session.diary if self._session else None),
+                depends_on=('diary_last',))
         self._subwindows.append(wnd)
 
-    def update(self, state):
-        super(MainWindow, self).update(state)
+    def set_session(self, session):
+        ''' Session which state is displayed: its diary and inventory order are used for rendering. '''
+        self._session = session
+
+    def set_caption(self, caption):
+        ''' Additional caption for the top window (e.g. index of currently displayed hero). '''
+        self._subwindows[0].title = '{0} {1}'.format(tr('Session'), caption)
+
+    def invalidate(self):
+        # Subwindows share buffer with the main one, so they are erased too.
+        super(MainWindow, self).invalidate()
+        for window in self._subwindows:
+            window.invalidate()
+
+    def update(self, state, changed_keys=None):
+        changed = super(MainWindow, self).update(state, changed_keys=changed_keys)
         for window in self._subwindows:
-            window.update(state)
+            changed = window.update(state, changed_keys=changed_keys) or changed
 
-        self.window.refresh()
+        return changed
 
@@ -0,0 +1,29 @@
+from ..core import MonitorWindowBase
+from ..core.utils import tr
+
+def stats_lines(stats):
+    for line in stats['lines']:
+        yield line, None
+
+class StatsWindow(MonitorWindowBase):
+    ''' Pop-up window with timings of processing phases, counters and stats of components.
+    Refreshed by monitor every second while it is open.
+    '''
+    OVERLAY = True
+
+    def __init__(self, parent_window, metrics):
+        self.metrics = metrics
+
+        (max_y, max_x) = parent_window.getmaxyx()
+        width = max(1, max_x - 4)
+        height = max(1, max_y - 2)
+        super(StatsWindow, self).__init__(parent_window, tr('Stats'), 2, 1, width, height)
+
+    def init_text_entries(self):
+        self.add_list_entry(stats_lines)
+
+    def refresh(self):
+        ''' Returns True if window was repainted. '''
+        return self.update({
+            'lines' : self.metrics.report_lines(),
+            })
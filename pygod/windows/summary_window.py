@@ -0,0 +1,32 @@
+from ..core import MonitorWindowBase
+from ..core import Colors
+from ..core.utils import tr
+from .main_window import session_state, session_state_color
+
+def hero_summary(state):
+    ''' Compact one-line description of hero's state. '''
+    if 'health' not in state:
+        return tr('N/A')
+    return tr('{name}: HP {health}/{max_health}, Lvl {level}').format(
+            name=state.get('name', ''),
+            health=state['health'],
+            max_health=state.get('max_health', ''),
+            level=state.get('level', ''),
+            )
+
+def hero_summary_lines(summary):
+    for index, (godname, state) in enumerate(summary['heroes']):
+        marker = '>' if index == summary['current'] else ' '
+        color = session_state_color(state)
+        if color is None and 'health' in state and 'max_health' in state:
+            if 0 < state['max_health'] and state['health'] < 0.3 * state['max_health']:
+                color = Colors.HEALTH_POINTS
+        yield '{0} {1} | {2} | {3}'.format(marker, godname, session_state(state), hero_summary(state)), color
+
+class SummaryWindow(MonitorWindowBase):
+    ''' Grid of all monitored heroes, one hero per line. '''
+    def __init__(self, stdscr):
+        super(SummaryWindow, self).__init__(stdscr, tr('Summary'))
+
+    def init_text_entries(self):
+        self.add_list_entry(hero_summary_lines)
@@ -9,6 +9,13 @@
 # If string is returned, Monitor.post_warning() will be used as action as the string is used as text of the warning.
 #
 # All exceptions from checks or actions are caught and logged to pygod.log file.
+#
+# Rule is checked again only when any of state keys it has read is changed.
+# If condition depends on anything else (e.g. current time), mark it to be checked on every update:
+#
+#     def night_time(state):
+#         ...
+#     night_time.always_check = True
 # 
 # This file is not translated along with the main application as most of the strings here are custom user-defined ones.
 # It should to be translated manually if needed.
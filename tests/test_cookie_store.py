@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from pygod.engine.cookie_store import CookieStore
+
+class TestCookieStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.filename = os.path.join(self.dir, 'cookies', 'thetale.json')
+
+    def open_store(self, **kwargs):
+        kwargs.setdefault('flush_delay', 60)
+        kwargs.setdefault('max_staleness', 60)
+        return CookieStore(self.filename, **kwargs)
+
+    def read_file(self):
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def test_only_changes_are_written(self):
+        store = self.open_store(defaults={'csrftoken' : 'default'})
+        self.assertTrue(store.flush())
+        self.assertEqual(self.read_file(), {'csrftoken' : 'default'})
+        self.assertFalse(store.update({'csrftoken' : 'default'}))
+        self.assertFalse(store.flush())
+        self.assertTrue(store.update({'sessionid' : 'abc'}))
+        self.assertTrue(store.flush())
+        self.assertEqual(store.writes, 2)
+        self.assertEqual(self.read_file(), {'csrftoken' : 'default', 'sessionid' : 'abc'})
+
+    def test_defaults_do_not_override_saved_cookies(self):
+        store = self.open_store()
+        store.update({'sessionid' : 'saved'})
+        store.flush()
+        store = self.open_store(defaults={'sessionid' : 'default', 'csrftoken' : 'default'})
+        self.assertEqual(store['sessionid'], 'saved')
+        self.assertEqual(store.get('csrftoken'), 'default')
+
+    def test_processes_do_not_overwrite_cookies_of_each_other(self):
+        first, second = self.open_store(), self.open_store()
+        first.update({'sessionid' : 'first'})
+        second.update({'csrftoken' : 'second'})
+        first.flush()
+        second.flush()
+        self.assertEqual(self.read_file(), {'sessionid' : 'first', 'csrftoken' : 'second'})
+        first.update({'sessionid' : 'first, again'})
+        first.flush()
+        self.assertEqual(dict(first.items()), {'sessionid' : 'first, again', 'csrftoken' : 'second'})
+        self.assertFalse([name for name in os.listdir(os.path.dirname(self.filename)) if name.startswith('.pygod.cookie.')])
+
+    def test_corrupted_file_is_ignored(self):
+        os.makedirs(os.path.dirname(self.filename))
+        with open(self.filename, 'w') as f:
+            f.write('{"sessionid" : ')
+        with self.assertLogs(level='WARNING'):
+            store = self.open_store(defaults={'csrftoken' : 'default'})
+        self.assertIsNone(store.get('sessionid'))
+        store.flush()
+        self.assertEqual(self.read_file(), {'csrftoken' : 'default'})
+
+    def test_background_flush(self):
+        store = self.open_store(flush_delay=0.01)
+        store.update({'sessionid' : 'abc'})
+        deadline = time.monotonic() + 5
+        while store.writes == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.read_file(), {'sessionid' : 'abc'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from pygod import daemon
+from pygod.pygod import GodSession
+
+def connect(server):
+    ''' Connects client to the server (client waits for hello that is sent on accept). '''
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(client=daemon.StateClient(server.path)))
+    thread.start()
+    while thread.is_alive():
+        server.accept()
+        thread.join(0.01)
+    return result['client']
+
+def receive(client, count, timeout=5):
+    messages = []
+    deadline = time.monotonic() + timeout
+    while len(messages) < count and time.monotonic() < deadline:
+        messages += client.read()
+        time.sleep(0.001)
+    return messages
+
+class TestStateServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'pygod', 'godvillenet.sock')
+        self.session = GodSession(None, 'God')
+        self.server = daemon.StateServer(self.path, 'godvillenet', [self.session])
+        self.addCleanup(self.server.close)
+
+    def test_hello_and_states(self):
+        self.session.state = {'godname' : 'God', 'health' : 10}
+        self.server.publish(self.session)
+        client = connect(self.server)
+        self.addCleanup(client.close)
+        self.assertEqual(client.hello, {'type' : 'hello', 'engine' : 'godvillenet', 'gods' : ['God']})
+        self.assertEqual(receive(client, 1), [{'type' : 'state', 'god' : 'God', 'state' : {'godname' : 'God', 'health' : 10}}])
+
+        self.session.state['health'] = 5
+        self.server.publish(self.session)
+        self.server.publish(self.session) # Nothing is changed.
+        self.server.publish_warning(self.session, 'Low health')
+        self.assertEqual(receive(client, 2), [
+            {'type' : 'delta', 'god' : 'God', 'delta' : {'set' : {'health' : 5}, 'del' : []}},
+            {'type' : 'warning', 'god' : 'God', 'message' : 'Low health'},
+            ])
+
+    def test_raw_engine_data_is_not_sent(self):
+        client = connect(self.server)
+        self.addCleanup(client.close)
+        self.session.state = {'health' : 10, '_hero_info' : {'turn' : 1}}
+        self.server.publish(self.session)
+        self.session.state = {'health' : 10, '_hero_info' : {'turn' : 2}}
+        self.server.publish(self.session)
+        self.session.state = {'health' : 9, '_hero_info' : {'turn' : 3}}
+        self.server.publish(self.session)
+        self.assertEqual(receive(client, 2), [
+            {'type' : 'state', 'god' : 'God', 'state' : {'health' : 10}},
+            {'type' : 'delta', 'god' : 'God', 'delta' : {'set' : {'health' : 9}, 'del' : []}},
+            ])
+
+    def test_diary_backlog_is_sent_on_connect(self):
+        self.session.diary.append('First', timestamp=1)
+        self.session.diary.append('Second', timestamp=2)
+        self.session.state = {'diary_last' : 'Second'}
+        self.server.publish(self.session)
+        client = connect(self.server)
+        self.addCleanup(client.close)
+        messages = receive(client, 2)
+        self.assertEqual(messages[1], {'type' : 'diary', 'god' : 'God', 'entries' : [[1, 'First'], [2, 'Second']]})
+
+    def test_second_daemon_is_refused(self):
+        with self.assertRaises(RuntimeError):
+            daemon.StateServer(self.path, 'godvillenet', [self.session])
+
+    def test_socket_is_private(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(os.path.dirname(self.path)).st_mode & 0o777, 0o700)
+
+    def test_socket_dir_is_checked(self):
+        home = os.path.join(self.dir, 'home')
+        os.mkdir(home, 0o755)
+        os.chmod(home, 0o755)
+        server = daemon.StateServer(os.path.join(home, 'pygod.sock'), 'godvillenet', [self.session])
+        server.close()
+
+        shared = os.path.join(self.dir, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+        with self.assertRaises(RuntimeError):
+            daemon.StateServer(os.path.join(shared, 'pygod.sock'), 'godvillenet', [self.session])
+
+        os.symlink(home, os.path.join(self.dir, 'link'))
+        with self.assertRaises(RuntimeError):
+            daemon.StateServer(os.path.join(self.dir, 'link', 'pygod.sock'), 'godvillenet', [self.session])
+
+    def test_stale_socket_is_replaced(self):
+        self.server.sock.close() # Killed daemon leaves socket file behind.
+        server = daemon.StateServer(self.path, 'godvillenet', [self.session])
+        self.addCleanup(server.close)
+        client = connect(server)
+        client.close()
+
+    def test_closed_daemon(self):
+        client = connect(self.server)
+        self.addCleanup(client.close)
+        self.server.close()
+        with self.assertRaises(ConnectionError):
+            receive(client, 1)
+
+if __name__ == '__main__':
+    unittest.main()
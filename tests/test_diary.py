@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pygod.core.diary import Diary
+
+class TestDiary(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.filename = os.path.join(self.dir, 'God')
+
+    def open_diary(self, **kwargs):
+        diary = Diary(self.filename, **kwargs)
+        self.addCleanup(diary.close)
+        return diary
+
+    def test_search(self):
+        diary = Diary()
+        diary.append('Found a golden brick', timestamp=1)
+        diary.append('Fought a monster', timestamp=2)
+        diary.append('Found a monster', timestamp=3)
+        self.assertEqual(diary.search('found'), [(3, 'Found a monster'), (1, 'Found a golden brick')])
+        self.assertEqual(diary.search('monster fo'), [(3, 'Found a monster'), (2, 'Fought a monster')])
+        self.assertEqual(diary.search('fou'), [(3, 'Found a monster'), (2, 'Fought a monster'), (1, 'Found a golden brick')])
+        self.assertEqual(diary.search('golden mon'), [])
+
+    def test_repeated_entry_is_skipped(self):
+        diary = Diary()
+        self.assertTrue(diary.append('Entry', timestamp=1))
+        self.assertFalse(diary.append('Entry', timestamp=2))
+        self.assertEqual(diary.latest(), [(1, 'Entry')])
+
+    def test_oldest_entries_are_dropped(self):
+        diary = Diary(size=10)
+        for number in range(35):
+            diary.append('Entry {0} word{0}'.format(number), timestamp=number)
+        self.assertEqual(len(diary), 10)
+        self.assertEqual(diary.latest(2), [(34, 'Entry 34 word34'), (33, 'Entry 33 word33')])
+        self.assertEqual(diary.latest()[-1], (25, 'Entry 25 word25'))
+        self.assertEqual(diary.search('word25'), [(25, 'Entry 25 word25')])
+        self.assertEqual(diary.search('word24'), [])
+        self.assertEqual(len(diary.search('entry')), 10)
+        self.assertEqual(diary._words, sorted(diary._index))
+
+    def test_persistence_and_compaction(self):
+        diary = self.open_diary(size=10)
+        for number in range(25):
+            diary.append('Entry {0}'.format(number), timestamp=number)
+        diary.close()
+        with open(self.filename) as f:
+            self.assertLessEqual(len(f.readlines()), 20)
+        with open(self.filename, 'a') as f:
+            f.write('[100, "Incomplete')
+        diary = self.open_diary(size=10)
+        self.assertEqual(diary.latest(), [(number, 'Entry {0}'.format(number)) for number in reversed(range(15, 25))])
+        diary.append('Entry 25', timestamp=25)
+        self.assertEqual(self.open_diary(size=10).latest(1), [(25, 'Entry 25')])
+
+    def test_entries_are_not_lost_after_compaction_by_another_process(self):
+        first = self.open_diary(size=10)
+        second = self.open_diary(size=10)
+        for number in range(20):
+            first.append('First {0}'.format(number), timestamp=number)
+        # File was compacted and replaced by the first diary.
+        second.append('Second', timestamp=100)
+        first.append('First 20', timestamp=101)
+        self.assertEqual(self.open_diary(size=10).latest(2), [(101, 'First 20'), (100, 'Second')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from pygod.core.events import Events, StateEvent, StateDiff, EventStream, TrackingState, diff_paths
+
+class TestStateDiff(unittest.TestCase):
+    def test_diff_paths(self):
+        old = {'health' : 10, 'pet' : {'name' : 'Cat', 'level' : 1}, 'gone' : 1}
+        new = {'health' : 10, 'pet' : {'name' : 'Cat', 'level' : 2}, 'added' : [1]}
+        self.assertEqual(sorted(diff_paths(old, new)), [('added',), ('gone',), ('pet', 'level')])
+
+    def test_first_state(self):
+        diff = StateDiff(None, {'health' : 10, 'diary_last' : 'Entry'})
+        self.assertIsNone(diff.changed_keys)
+        self.assertTrue(diff)
+        self.assertEqual(diff.events, [StateEvent(Events.DIARY_ENTRY, ('diary_last',), None, 'Entry')])
+
+    def test_unchanged_state(self):
+        state = {'health' : 10}
+        self.assertFalse(StateDiff(state, dict(state)))
+        self.assertEqual(StateDiff(state, state).events, [])
+
+    def test_high_level_events(self):
+        old = {'level' : 5, 'health' : 10, 'quest' : 'Find a cat', 'inventory' : {'sword' : {}, 'shield' : {}},
+               'arena_fight' : False, 'diary_last' : 'Old entry'}
+        new = {'level' : 6, 'health' : 0, 'quest' : 'Find a dog', 'inventory' : {'sword' : {}, 'bow' : {}},
+               'arena_fight' : True, 'fight_type' : 'arena', 'diary_last' : 'New entry'}
+        diff = StateDiff(old, new)
+        self.assertEqual(diff.changed_keys, set(new))
+        events = [event for event in diff.events if event.kind != Events.CHANGED]
+        self.assertEqual(events, [
+            StateEvent(Events.LEVEL_UP, ('level',), 5, 6),
+            StateEvent(Events.DEATH, ('health',), 10, 0),
+            StateEvent(Events.QUEST_COMPLETED, ('quest',), 'Find a cat', 'Find a dog'),
+            StateEvent(Events.ITEM_ADDED, ('inventory', 'bow'), None, 'bow'),
+            StateEvent(Events.ITEM_REMOVED, ('inventory', 'shield'), 'shield', None),
+            StateEvent(Events.ARENA_ENTERED, ('arena_fight',), None, 'arena'),
+            StateEvent(Events.DIARY_ENTRY, ('diary_last',), 'Old entry', 'New entry'),
+            ])
+        self.assertEqual(sorted(event.path[0] for event in diff.events if event.kind == Events.CHANGED), sorted(new))
+
+    def test_dead_hero_does_not_die_again(self):
+        diff = StateDiff({'health' : 0, 'level' : 5}, {'health' : 0, 'level' : 'unknown'})
+        self.assertEqual([event.kind for event in diff.events], [Events.CHANGED])
+
+    def test_add_change(self):
+        diff = StateDiff({'health' : 10}, {'health' : 10})
+        diff.add_change('diary', 1, 2)
+        self.assertTrue(diff)
+        self.assertEqual(diff.changed_keys, {'diary'})
+        self.assertEqual(diff.events, [StateEvent(Events.CHANGED, ('diary',), 1, 2)])
+
+class TestEventStream(unittest.TestCase):
+    def test_publish(self):
+        stream = EventStream()
+        received = []
+        def failing(source, event):
+            raise ValueError('Subscriber error')
+        stream.subscribe(Events.LEVEL_UP, failing)
+        stream.subscribe(Events.LEVEL_UP, lambda source, event: received.append(('level', source, event.new)))
+        stream.subscribe(None, lambda source, event: received.append(('all', source, event.kind)))
+        with self.assertLogs(level='ERROR'):
+            stream.publish('God', StateDiff({'level' : 1}, {'level' : 2}))
+        self.assertEqual(received, [
+            ('all', 'God', Events.CHANGED),
+            ('level', 'God', 2),
+            ('all', 'God', Events.LEVEL_UP),
+            ])
+
+class TestTrackingState(unittest.TestCase):
+    def test_dependencies(self):
+        state = TrackingState({'health' : 10, 'level' : 5})
+        self.assertEqual(state['health'], 10)
+        self.assertNotIn('quest', state)
+        self.assertIsNone(state.get('pet'))
+        self.assertEqual(state.dependencies(), {'health', 'quest', 'pet'})
+        dict(state)
+        self.assertIsNone(state.dependencies())
+
+if __name__ == '__main__':
+    unittest.main()
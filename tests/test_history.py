@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pygod.core import StateHistory
+from pygod.core.history import make_delta, apply_delta
+
+class TestDelta(unittest.TestCase):
+    def test_make_and_apply(self):
+        old = {'a' : 1, 'b' : 2, 'c' : [1]}
+        new = {'a' : 1, 'c' : [1, 2], 'd' : 4}
+        delta = make_delta(old, new)
+        self.assertEqual(delta, {'set' : {'c' : [1, 2], 'd' : 4}, 'del' : ['b']})
+        self.assertEqual(apply_delta(dict(old), delta), new)
+
+    def test_equal_states(self):
+        self.assertIsNone(make_delta({'a' : 1}, {'a' : 1}))
+
+class TestStateHistory(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'god')
+        self.histories = []
+
+    def tearDown(self):
+        for history in self.histories:
+            history.close()
+        shutil.rmtree(self.dir)
+
+    def open(self, **kwargs):
+        history = StateHistory(self.filename, **kwargs)
+        self.histories.append(history)
+        return history
+
+    def test_append_and_replay(self):
+        history = self.open(snapshot_interval=3)
+        states = [{'health' : health, 'godname' : 'God'} for health in range(10)]
+        for number, state in enumerate(states):
+            self.assertTrue(history.append(state, timestamp=100 + number))
+        self.assertEqual(len(history), 10)
+        self.assertEqual([state for _, state in history.iter_states()], states)
+        self.assertEqual(history.state_at(104.5), states[4])
+        self.assertIsNone(history.state_at(99))
+        self.assertEqual([timestamp for timestamp, _ in history.iter_states(start=107)], [107, 108, 109])
+
+    def test_same_state_is_not_recorded(self):
+        history = self.open()
+        self.assertTrue(history.append({'health' : 1}, timestamp=1))
+        self.assertFalse(history.append({'health' : 1}, timestamp=2))
+        self.assertEqual(len(history), 1)
+
+    def test_raw_engine_data_is_not_recorded(self):
+        history = self.open()
+        history.append({'health' : 1, '_hero_info' : {'turn' : 1}}, timestamp=1)
+        self.assertFalse(history.append({'health' : 1, '_hero_info' : {'turn' : 2}}, timestamp=2))
+        self.assertEqual(history.state_at_record(0), {'health' : 1})
+
+    def test_reopen_continues_history(self):
+        history = self.open(snapshot_interval=2)
+        for health in range(3):
+            history.append({'health' : health}, timestamp=health)
+        history.close()
+        self.histories.remove(history)
+        history = self.open(snapshot_interval=2)
+        history.append({'health' : 3}, timestamp=3)
+        self.assertEqual([state['health'] for _, state in history.iter_states()], [0, 1, 2, 3])
+
+    def test_recover_incomplete_record(self):
+        history = self.open()
+        for health in range(3):
+            history.append({'health' : health}, timestamp=health)
+        history.close()
+        self.histories.remove(history)
+        # Crash in the middle of writing the last record.
+        with open(self.filename, 'r+b') as f:
+            f.truncate(os.path.getsize(self.filename) - 2)
+        with self.assertLogs(level='WARNING'):
+            history = self.open()
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history.state_at_record(1), {'health' : 1})
+        history.append({'health' : 5}, timestamp=5)
+        self.assertEqual([state['health'] for _, state in history.iter_states()], [0, 1, 5])
+
+    def test_recover_missing_index_entries(self):
+        history = self.open()
+        for health in range(3):
+            history.append({'health' : health}, timestamp=health)
+        history.close()
+        self.histories.remove(history)
+        # Crash after record is written, but before it is indexed.
+        with open(self.filename + '.idx', 'r+b') as f:
+            f.truncate(StateHistory.INDEX_ENTRY.size + 3)
+        with self.assertLogs(level='WARNING'):
+            history = self.open()
+        self.assertEqual([state['health'] for _, state in history.iter_states()], [0, 1, 2])
+
+    def test_concurrent_writers(self):
+        ''' Two monitors of the same god append to the same history. '''
+        first = self.open(snapshot_interval=100)
+        second = self.open(snapshot_interval=100)
+        expected = []
+        for number in range(6):
+            state = {'health' : number, 'writer' : number % 2}
+            (first if number % 2 == 0 else second).append(state, timestamp=number)
+            expected.append(state)
+        self.assertEqual([state for _, state in first.iter_states()], expected)
+        for number, state in enumerate(expected):
+            self.assertEqual(first.state_at_record(number), state)
+        reader = self.open(readonly=True)
+        self.assertEqual([state for _, state in reader.iter_states()], expected)
+        # Files are consistent, so reopening does not need recovery.
+        with self.assertNoLogs(level='WARNING'):
+            self.open()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from pygod.core import Colors
+from pygod.windows.main_window import InventoryOrder, inventory_list, item_line
+
+def make_inventory(count, **overrides):
+    inventory = {'item {0}'.format(pos) : {'pos' : pos, 'cnt' : 1, 'price' : 0} for pos in range(count)}
+    for name, item in overrides.items():
+        inventory[name.replace('_', ' ')] = item
+    return inventory
+
+def sorted_lines(inventory):
+    ''' Lines in the expected order, built from scratch. '''
+    def priority(item):
+        if item.get('activate_by_user'):
+            return 3
+        if item['price'] > 0:
+            return 2
+        if item.get('type') == 'heal_potion':
+            return 1
+        return 0
+    names = sorted(inventory, key=lambda name: (-priority(inventory[name]), inventory[name]['pos'], name))
+    return [item_line(name, inventory[name]) for name in names]
+
+class TestInventoryOrder(unittest.TestCase):
+    def test_empty_inventory(self):
+        order = InventoryOrder()
+        self.assertEqual(order.lines({}), [])
+        self.assertEqual(order.lines({}), [])
+        # Nothing to sort, lines are not rebuilt.
+        self.assertEqual(order.stats['hits'], 2)
+        self.assertEqual(order.stats['full'], 0)
+
+    def test_full_rebuild(self):
+        order = InventoryOrder()
+        inventory = make_inventory(10, item_7={'pos' : 7, 'cnt' : 2, 'price' : 10})
+        self.assertEqual(order.lines(inventory), sorted_lines(inventory))
+        self.assertEqual(order.lines(inventory)[0], ('- item 7 (x2)', Colors.MONEY))
+        self.assertEqual(order.stats['full'], 1)
+
+        replaced = make_inventory(3)
+        self.assertEqual(order.lines(replaced), sorted_lines(replaced))
+        self.assertEqual(order.stats['full'], 2)
+        self.assertEqual(order.stats['incremental'], 0)
+
+    def test_cache_hit(self):
+        order = InventoryOrder()
+        inventory = make_inventory(10)
+        lines = order.lines(inventory)
+        self.assertIs(order.lines(inventory), lines)
+        # Equal inventory from the new state.
+        self.assertIs(order.lines(make_inventory(10)), lines)
+        self.assertEqual(order.stats['hits'], 2)
+        self.assertEqual(order.stats['full'], 1)
+
+    def test_incremental_update(self):
+        order = InventoryOrder()
+        inventory = make_inventory(20)
+        order.lines(inventory)
+
+        inventory = dict(inventory)
+        del inventory['item 3']
+        inventory['item 5'] = {'pos' : 5, 'cnt' : 1, 'price' : 0, 'type' : 'heal_potion'}
+        inventory['new item'] = {'pos' : 20, 'cnt' : 1, 'price' : 0, 'activate_by_user' : True}
+        self.assertEqual(order.lines(inventory), sorted_lines(inventory))
+        self.assertEqual(order.stats['incremental'], 1)
+        self.assertEqual(order.stats['full'], 1)
+
+    def test_inventory_is_not_modified(self):
+        order = InventoryOrder()
+        inventory = make_inventory(5)
+        original = {name : dict(item) for name, item in inventory.items()}
+        order.lines(inventory)
+        self.assertEqual(inventory, original)
+
+class TestInventoryList(unittest.TestCase):
+    def test_default_state_without_inventory(self):
+        self.assertEqual(list(inventory_list({'godname' : 'god', 'inventory' : []})), [])
+        self.assertEqual(list(inventory_list({'godname' : 'god'}, InventoryOrder())), [])
+
+    def test_order_of_session_is_used(self):
+        order = InventoryOrder()
+        inventory = make_inventory(3)
+        self.assertEqual(list(inventory_list({'inventory' : inventory}, order)), sorted_lines(inventory))
+        list(inventory_list({'inventory' : inventory}, order))
+        self.assertEqual(order.stats['hits'], 1)
+
+    def test_activatables(self):
+        self.assertEqual(list(inventory_list({'activatables' : ['box']})), [('- box', Colors.POWER_POINTS)])
+
+if __name__ == '__main__':
+    unittest.main()
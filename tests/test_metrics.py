@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pygod.core.metrics import Timing, Metrics
+
+class TestTiming(unittest.TestCase):
+    def test_stats(self):
+        timing = Timing()
+        self.assertEqual(timing.percentile(50), 0.0)
+        for seconds in (1.0, 2.0, 0.5):
+            timing.add(seconds)
+        self.assertEqual((timing.count, timing.total, timing.last, timing.max), (3, 3.5, 0.5, 2.0))
+        self.assertAlmostEqual(timing.ewma, 1.0 + 0.2 * (2.0 - 1.0) + 0.2 * (0.5 - 1.2))
+
+    def test_percentiles_of_latest_samples(self):
+        timing = Timing()
+        for seconds in range(1, 101):
+            timing.add(float(seconds))
+        self.assertEqual(timing.percentile(50), 50.0)
+        self.assertEqual(timing.percentile(95), 95.0)
+        self.assertEqual(timing.percentile(0), 1.0)
+        self.assertEqual(timing.percentile(100), 100.0)
+        for _ in range(Timing.SAMPLES):
+            timing.add(0.5)
+        self.assertEqual(timing.percentile(95), 0.5)
+        self.assertEqual(timing.max, 100.0)
+
+class TestMetrics(unittest.TestCase):
+    def make_metrics(self):
+        metrics = Metrics()
+        metrics.observe('fetch', 0.25)
+        metrics.count('errors')
+        metrics.count('bytes', 100)
+        metrics.add_source('pool', lambda: {'connections' : 2, 'host' : 'example.com'})
+        return metrics
+
+    def test_prometheus_text(self):
+        lines = self.make_metrics().prometheus_text().splitlines()
+        self.assertIn('# TYPE pygod_phase_seconds summary', lines)
+        self.assertIn('pygod_phase_seconds{phase="fetch",quantile="0.95"} 0.25', lines)
+        self.assertIn('pygod_phase_seconds_count{phase="fetch"} 1.0', lines)
+        self.assertIn('pygod_phase_ewma_seconds{phase="fetch"} 0.25', lines)
+        self.assertIn('pygod_events_total{event="bytes"} 100.0', lines)
+        self.assertIn('pygod_component_stat{component="pool",stat="connections"} 2.0', lines)
+        self.assertFalse([line for line in lines if 'example.com' in line])
+
+    def test_report_lines(self):
+        lines = self.make_metrics().report_lines()
+        self.assertTrue(lines[1].startswith('fetch'))
+        self.assertIn('Counters: bytes=100, errors=1', lines)
+        self.assertIn('pool: connections=2', lines)
+
+    def test_write_prometheus_creates_directory(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        filename = os.path.join(root, 'textfile', 'pygod.prom')
+        self.make_metrics().write_prometheus(filename)
+        with open(filename) as f:
+            self.assertIn('pygod_events_total{event="errors"} 1.0\n', f.read())
+        self.assertEqual(os.listdir(os.path.dirname(filename)), ['pygod.prom'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import signal
+import unittest
+import unittest.mock
+import argparse
+from pygod.core import backend
+from pygod.core.text_entry import ListEntry
+from pygod import engine as pygod_engine
+from pygod.pygod import Monitor, GodSession, default_hero_state
+
+def make_args(**overrides):
+    ''' Options of monitor with default values (as if config file is empty). '''
+    args = argparse.Namespace(
+            state=None,
+            max_requests=1,
+            notification_command=None,
+            notifications={},
+            report_connection_errors='true',
+            notify_only_when_active=None,
+            notify_on_start=False,
+            quiet=True,
+            browser=None,
+            refresh_command=None,
+            autorefresh=False,
+            open_browser_on_start=False,
+            max_fps=10,
+            scheduler={},
+            prometheus_file=None,
+            prometheus_interval=15,
+            )
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    return args
+
+def make_headless_monitor():
+    backend.use_null_backend()
+    session = GodSession(pygod_engine.get_engine('godvillenet')(), 'God')
+    return Monitor([session], make_args(), stdscr=backend.NullWindow(40, 120))
+
+class TestHeadlessMonitor(unittest.TestCase):
+    def test_sigwinch_does_not_resize_terminal(self):
+        monitor = make_headless_monitor()
+        monitor.init_event_sources(read_keys=False)
+        try:
+            self.assertIsNot(signal.getsignal(signal.SIGWINCH), monitor._on_sigwinch)
+            # Terminal of the test process (if any) has nothing to do with headless monitor.
+            with unittest.mock.patch('os.get_terminal_size', return_value=os.terminal_size((150, 50))):
+                os.kill(os.getpid(), signal.SIGWINCH)
+                monitor.handle_wakeup()
+                monitor.handle_resize()
+            self.assertEqual(monitor._screen_size, (40, 120))
+        finally:
+            monitor.finalize()
+
+    def test_persisted_diary_is_shown_at_start(self):
+        monitor = make_headless_monitor()
+        monitor.init_event_sources(read_keys=False)
+        self.addCleanup(monitor.finalize)
+        session = monitor.session
+        # Diary loaded from file before any new entry arrives.
+        session.diary.append('Entry from the previous run')
+        session.state = default_hero_state(session.engine)
+        session.state.update({'godname' : 'God', 'inventory' : {'sword' : {'pos' : 0, 'cnt' : 1, 'price' : 5}}})
+        monitor.redraw()
+        lines = [text for window in monitor.main_window._subwindows
+                for entry in window.text_entries if isinstance(entry, ListEntry)
+                for text, _ in entry.text]
+        self.assertIn('- sword', lines)
+        self.assertTrue(any(line.endswith('Entry from the previous run') for line in lines))
+        self.assertEqual(session.inventory_order.stats['full'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import io
+import time
+import random
+import unittest
+import unittest.mock
+import urllib.error
+from pygod.engine import resilience
+from pygod.engine.http_pool import ConnectionPool
+
+def http_error(code, retry_after=None):
+    headers = {'Retry-After' : retry_after} if retry_after is not None else {}
+    return urllib.error.HTTPError('http://host/', code, 'Error', headers, io.BytesIO(b''))
+
+class TestErrors(unittest.TestCase):
+    def test_is_transient(self):
+        self.assertTrue(resilience.is_transient(http_error(503)))
+        self.assertTrue(resilience.is_transient(urllib.error.URLError('refused')))
+        self.assertTrue(resilience.is_transient(ConnectionResetError()))
+        self.assertFalse(resilience.is_transient(http_error(404)))
+        self.assertFalse(resilience.is_transient(resilience.CircuitOpenError('host', 10)))
+
+    def test_retry_after(self):
+        self.assertEqual(resilience.retry_after(http_error(429, '120')), 120)
+        self.assertIsNone(resilience.retry_after(http_error(404, '120')))
+        self.assertIsNone(resilience.parse_retry_after('soon'))
+        self.assertAlmostEqual(resilience.parse_retry_after('Thu, 01 Jan 2099 00:00:00 GMT'),
+                4070908800 - time.time(), delta=5)
+
+class TestBackoff(unittest.TestCase):
+    def test_delay_grows_exponentially_up_to_max(self):
+        backoff = resilience.Backoff(base=10, max_delay=100, rng=random.Random(1))
+        self.assertEqual(backoff.delay(0), 0)
+        for attempt, limit in ((1, 10), (2, 20), (3, 40), (4, 80), (5, 100), (50, 100)):
+            for _ in range(20):
+                self.assertTrue(limit / 2 <= backoff.delay(attempt) <= limit)
+
+class TestCircuitBreaker(unittest.TestCase):
+    def make_breaker(self):
+        breaker = resilience.CircuitBreaker('host', failure_threshold=3, reset_timeout=10, max_reset_timeout=100)
+        breaker.backoff.rng = random.Random(1)
+        return breaker
+
+    def elapse(self, breaker):
+        breaker.retry_at = time.monotonic() - 1
+
+    def test_opens_after_consequent_failures(self):
+        breaker = self.make_breaker()
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        with self.assertRaises(resilience.CircuitOpenError) as e:
+            breaker.before_request()
+        self.assertTrue(5 <= e.exception.retry_in <= 10)
+
+    def test_trial_request(self):
+        breaker = self.make_breaker()
+        for _ in range(3):
+            breaker.record_failure()
+        self.elapse(breaker)
+        breaker.before_request()
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        # Only single trial request is allowed.
+        with self.assertRaises(resilience.CircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertTrue(10 <= breaker.retry_in() <= 20)
+        self.elapse(breaker)
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_retry_after_opens_immediately(self):
+        breaker = self.make_breaker()
+        breaker.record_failure(retry_after=60)
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertAlmostEqual(breaker.retry_in(), 60, delta=1)
+
+    def test_answer_does_not_reset_failures(self):
+        breaker = self.make_breaker()
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_answer()
+        self.assertEqual(breaker.failures, 2)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+    def test_answer_to_trial_request_closes_circuit(self):
+        breaker = self.make_breaker()
+        breaker.record_failure(retry_after=60)
+        self.elapse(breaker)
+        breaker.before_request()
+        breaker.record_answer()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        breaker.before_request()
+
+class TestConnectionPoolBreaker(unittest.TestCase):
+    def test_not_found_is_not_success(self):
+        pool = ConnectionPool(failure_threshold=3)
+        errors = [urllib.error.URLError('refused'), urllib.error.URLError('refused'), http_error(404), urllib.error.URLError('refused')]
+        with unittest.mock.patch.object(pool, '_request', side_effect=errors):
+            for error in errors:
+                with self.assertRaises(type(error)):
+                    pool.request('http://host/api')
+        with self.assertRaises(resilience.CircuitOpenError):
+            pool.request('http://host/api')
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_rate(self):
+        limiter = resilience.RateLimiter(rate=50, capacity=2)
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(limiter.acquire(), 0)
+        started = time.monotonic()
+        delay = limiter.acquire()
+        self.assertTrue(0.01 < delay <= 0.02)
+        self.assertGreaterEqual(time.monotonic() - started, delay * 0.9)
+        self.assertEqual(limiter.waited, delay)
+
+if __name__ == '__main__':
+    unittest.main()
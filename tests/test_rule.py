@@ -0,0 +1,93 @@
+import json
+import unittest
+from pygod.core.events import TrackingState
+from pygod.status_processing import Rule
+
+class TestTrackingState(unittest.TestCase):
+    def test_keys_read(self):
+        state = TrackingState({'health' : 10, 'level' : 2, 'gold' : 5})
+        state['health']
+        state.get('missing')
+        'level' in state
+        self.assertEqual(state.dependencies(), {'health', 'missing', 'level'})
+
+    def test_iteration_reads_everything(self):
+        state = TrackingState({'health' : 10})
+        dict(state)
+        self.assertIsNone(state.dependencies())
+
+class ConditionCalls:
+    ''' Condition that counts its calls. '''
+    def __init__(self, condition):
+        self.condition = condition
+        self.calls = 0
+
+    def __call__(self, state):
+        self.calls += 1
+        return self.condition(state)
+
+class TestRule(unittest.TestCase):
+    def setUp(self):
+        self.fired = 0
+
+    def action(self):
+        self.fired += 1
+
+    def test_skipped_when_dependencies_are_not_changed(self):
+        condition = ConditionCalls(lambda state: state['health'] < 40)
+        rule = Rule(condition, self.action)
+        self.assertTrue(rule.check({'health' : 30, 'gold' : 1}))
+        self.assertEqual(self.fired, 1)
+        self.assertFalse(rule.is_affected_by({'gold'}))
+        self.assertIsNone(rule.check({'health' : 30, 'gold' : 2}, changed_keys={'gold'}))
+        self.assertEqual(condition.calls, 1)
+        self.assertFalse(rule.check({'health' : 50, 'gold' : 2}, changed_keys={'health'}))
+        self.assertEqual(condition.calls, 2)
+
+    def test_first_state_is_always_checked(self):
+        rule = Rule(lambda state: state['health'] < 40, self.action)
+        self.assertTrue(rule.is_affected_by(None))
+
+    def test_check_active_depends_on_expired(self):
+        rule = Rule(lambda state: state['health'] < 40, self.action, check_active=True)
+        rule.check({'health' : 30})
+        self.assertTrue(rule.is_affected_by({'expired'}))
+
+    def test_condition_that_needs_real_dict(self):
+        condition = ConditionCalls(lambda state: len(json.dumps(state)) > 0)
+        rule = Rule(condition, self.action)
+        self.assertTrue(rule.check({'health' : 30}))
+        self.assertEqual(condition.calls, 2)
+        # Falls back to plain dict and is checked every time.
+        self.assertTrue(rule.is_affected_by({'gold'}))
+        rule.check({'health' : 30}, changed_keys={'gold'})
+        self.assertEqual(condition.calls, 3)
+
+    def test_failing_condition_is_called_once(self):
+        condition = ConditionCalls(lambda state: state['temple_completed_at'] is not None)
+        rule = Rule(condition, self.action)
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(rule.check({'health' : 30}))
+        self.assertEqual(condition.calls, 1)
+        # Still tracked: re-checked only when the missing key appears.
+        self.assertFalse(rule.is_affected_by({'health'}))
+        self.assertTrue(rule.check({'health' : 30, 'temple_completed_at' : 1}, changed_keys={'temple_completed_at'}))
+        self.assertEqual(condition.calls, 2)
+
+    def test_always_check(self):
+        condition = ConditionCalls(lambda state: state['health'] < 40)
+        rule = Rule(condition, self.action, always_check=True)
+        rule.check({'health' : 30})
+        rule.check({'health' : 30}, changed_keys=set())
+        self.assertEqual(condition.calls, 2)
+
+    def test_ignore_first_result(self):
+        rule = Rule(lambda state: state['health'] < 40, self.action, ignore_first_result=True)
+        rule.check({'health' : 30})
+        self.assertEqual(self.fired, 0)
+        rule.check({'health' : 50}, changed_keys={'health'})
+        rule.check({'health' : 30}, changed_keys={'health'})
+        self.assertEqual(self.fired, 1)
+
+if __name__ == '__main__':
+    unittest.main()
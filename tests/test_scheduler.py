@@ -0,0 +1,86 @@
+import types
+import random
+import datetime
+import unittest
+import unittest.mock
+from pygod.core.scheduler import PollingScheduler, parse_cron_window
+
+def make_session(engine=None, **state):
+    return types.SimpleNamespace(godname='God', engine=engine, state=state,
+                                 stable_fetches=0, failures=0, retry_after=None, breaker=None,
+                                 poll_interval=None)
+
+def local_time(minute, second=0):
+    ''' Returns wall time of the moment within an hour (local time). '''
+    return datetime.datetime(2026, 1, 1, 12, minute, second).timestamp()
+
+class CronEngine:
+    CRON_WINDOW = (59, 6)
+
+class TestCronWindow(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_cron_window('59-6'), (59, 6))
+        self.assertEqual(parse_cron_window('0-2'), (0, 2))
+        self.assertIsNone(parse_cron_window(''))
+        self.assertIsNone(parse_cron_window(None))
+
+    def test_window_wraps_around_the_hour(self):
+        scheduler = PollingScheduler()
+        engine = CronEngine()
+        self.assertEqual(scheduler._cron_delay(engine, 58 * 60 + 59), 0)
+        self.assertEqual(scheduler._cron_delay(engine, 59 * 60 + 30), 390)
+        self.assertEqual(scheduler._cron_delay(engine, 0), 360)
+        self.assertEqual(scheduler._cron_delay(engine, 3 * 60), 180)
+        self.assertEqual(scheduler._cron_delay(engine, 6 * 60), 0)
+        self.assertEqual(scheduler._cron_delay(None, 0), 0)
+
+    def test_window_from_config_overrides_engine(self):
+        scheduler = PollingScheduler(cron_window=(0, 2))
+        self.assertEqual(scheduler._cron_delay(CronEngine(), 60), 60)
+        self.assertEqual(scheduler._cron_delay(CronEngine(), 59 * 60 + 30), 0)
+
+class TestPollingScheduler(unittest.TestCase):
+    def make_scheduler(self, hourly_offset=0):
+        scheduler = PollingScheduler(jitter=0, rng=random.Random(1))
+        scheduler.hourly_offset = hourly_offset
+        return scheduler
+
+    def schedule(self, scheduler, session, wall_time):
+        with unittest.mock.patch('time.time', return_value=wall_time):
+            return scheduler.schedule(session, now=1000) - 1000
+
+    def test_interval_depends_on_activity(self):
+        scheduler = self.make_scheduler()
+        wall_time = local_time(30)
+        self.assertEqual(self.schedule(scheduler, make_session(health=100, max_health=100), wall_time), 61)
+        self.assertEqual(self.schedule(scheduler, make_session(health=20, max_health=100), wall_time), 20)
+        self.assertEqual(self.schedule(scheduler, make_session(arena_fight=True), wall_time), 20)
+        self.assertEqual(self.schedule(scheduler, make_session(expired=True), wall_time), 300)
+        session = make_session()
+        session.stable_fetches = 10
+        self.assertEqual(self.schedule(scheduler, session, wall_time), 300)
+        self.assertEqual(scheduler.stats, {'fast' : 2, 'normal' : 1, 'slow' : 2, 'hourly' : 0, 'cron_skipped' : 0, 'backoff' : 0})
+
+    def test_hourly_check(self):
+        scheduler = self.make_scheduler(hourly_offset=60)
+        self.assertEqual(self.schedule(scheduler, make_session(), local_time(0, 30)), 30)
+        self.assertEqual(scheduler.stats['hourly'], 1)
+
+    def test_fetch_is_postponed_until_end_of_cron_window(self):
+        scheduler = self.make_scheduler(hourly_offset=1800)
+        self.assertEqual(self.schedule(scheduler, make_session(CronEngine()), local_time(58, 30)), 61 + 389)
+        self.assertEqual(scheduler.stats['cron_skipped'], 1)
+
+    def test_backoff_after_failures(self):
+        scheduler = self.make_scheduler()
+        session = make_session()
+        session.failures = 2
+        self.assertTrue(0 < self.schedule(scheduler, session, local_time(30)) <= 30)
+        session.retry_after = 100
+        self.assertEqual(self.schedule(scheduler, session, local_time(30)), 100)
+        session.breaker = unittest.mock.Mock(**{'retry_in.return_value' : 500})
+        self.assertEqual(self.schedule(scheduler, session, local_time(30)), 500)
+        self.assertEqual(scheduler.stats['backoff'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
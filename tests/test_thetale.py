@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import concurrent.futures
+from pygod.engine import thetale
+
+class FakeAPI(thetale.API):
+    ''' Requests are answered by handlers instead of the server. '''
+    def __init__(self, handlers):
+        super(FakeAPI, self).__init__(base_url='http://127.0.0.1:1')
+        # Sub-requests wait in queue while game info is being fetched.
+        self.workers = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.account_id = 1
+        self.handlers = handlers
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def _run_request(self, path, **params):
+        with self._lock:
+            self.requested.append(path)
+        return self.handlers[path]()
+
+    def authorize(self, force=False):
+        pass
+
+class TestHeroStateRequests(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        patcher = unittest.mock.patch.dict(os.environ, {'XDG_CACHE_HOME' : cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_api(self, game_info):
+        return FakeAPI({
+            '/game/api/info' : game_info,
+            '/accounts/1/api/show' : lambda: {'might' : 0},
+            '/game/cards/api/get-cards' : lambda: {'cards' : []},
+            })
+
+    def test_sub_requests_are_cancelled_when_game_info_fails(self):
+        def game_info():
+            raise thetale.API.Error('server error')
+        api = self.make_api(game_info)
+        with self.assertRaises(thetale.API.Error):
+            api.get_hero_state()
+        api.workers.shutdown(wait=True)
+        self.assertEqual(api.requested, ['/game/api/info'])
+
+    def test_sub_requests_are_cancelled_when_authorization_is_requested(self):
+        api = self.make_api(lambda: {'account' : None})
+        api.old_state = {'token_expired' : True}
+        self.assertIs(api.get_hero_state(), api.old_state)
+        api.workers.shutdown(wait=True)
+        self.assertEqual(api.requested, ['/game/api/info'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+from pygod.core import utils
+
+class TestDirectories(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        patcher = unittest.mock.patch.dict(os.environ, {
+            'XDG_CONFIG_HOME' : os.path.join(self.dir, 'config'),
+            'XDG_DATA_HOME' : os.path.join(self.dir, 'data'),
+            'XDG_LOG_HOME' : os.path.join(self.dir, 'log'),
+            })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_directories_are_created(self):
+        self.assertEqual(utils.get_config_file(engine='thetale'), os.path.join(self.dir, 'config', 'pygod', 'pygod.thetale.ini'))
+        for directory in (
+                os.path.dirname(utils.get_config_file()),
+                utils.get_config_local_dir(),
+                utils.get_data_dir(),
+                utils.get_log_dir(),
+                ):
+            self.assertTrue(directory.startswith(self.dir))
+            self.assertTrue(os.path.isdir(directory))
+
+if __name__ == '__main__':
+    unittest.main()